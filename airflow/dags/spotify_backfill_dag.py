@@ -0,0 +1,67 @@
+from airflow import DAG
+from airflow.models.param import Param
+from airflow.operators.python import PythonOperator
+from datetime import timedelta, datetime
+import sys
+
+sys.path.append('/opt/airflow/src')
+
+# The pipeline modules are imported and the settings read inside the callables to keep DAG parsing cheap.
+
+# Airflow pool bounding the concurrent API-bound tasks of the daily and backfill DAGs.
+SPOTIFY_API_POOL = 'spotify_api'
+
+def plan_chunks(params, **_):
+    """
+    Splits the requested range into the kwargs of one mapped `backfill_chunk` task per chunk.
+    """
+    from settings.config import Config
+    from pipeline.backfill import parse_utc, split_range
+    users = params["users"] or Config.USER_IDS
+    chunks = split_range(parse_utc(params["start"]), parse_utc(params["end"]), params["chunk_days"])
+    return [{"start": chunk.start.isoformat(), "end": chunk.end.isoformat(), "user_ids": users} for chunk in chunks]
+
+def backfill_chunk(start, end, user_ids):
+    from settings.config import Config
+    from pipeline.backfill import run_chunk
+    # Chunks share the `spotify_api` pool with the daily shards, so they take the same share of the rate budget.
+    # The returned dataclass is not JSON serializable, so only the counts are pushed to XCom.
+    return vars(run_chunk(start, end, user_ids, active_chunks=Config.MAX_ACTIVE_SHARDS))
+
+default_args = {
+    'owner': 'airflow',
+    'start_date': datetime(2025, 6, 27),
+    'retries': 2,
+    'retry_delay': timedelta(minutes=5),
+}
+
+with DAG(
+    dag_id='spotify_playlog_backfill',
+    default_args=default_args,
+    description='Backfill of the Spotify playlog over a date range, one mapped task per chunk.',
+    schedule=None,
+    catchup=False,
+    max_active_runs=1,
+    params={
+        'start': Param(type='string', description='ISO start date (inclusive, UTC).'),
+        'end': Param(type='string', description='ISO end date (exclusive, UTC).'),
+        'users': Param([], type='array', description='Users to backfill; empty means SPOTIFY_USER_IDS.'),
+        'chunk_days': Param(None, type=['null', 'integer'], minimum=1,
+                            description='Days per chunk; empty means BACKFILL_CHUNK_DAYS.'),
+    },
+    tags=['spotify_playlog']
+
+) as dag:
+    plan_task = PythonOperator(
+        task_id='plan_chunks',
+        python_callable=plan_chunks
+    )
+
+    # Airflow keeps the state of every mapped task, so clearing the failed ones resumes the backfill.
+    backfill_tasks = PythonOperator.partial(
+        task_id='backfill_chunk',
+        python_callable=backfill_chunk,
+        pool=SPOTIFY_API_POOL
+    ).expand(op_kwargs=plan_task.output)
+
+    plan_task >> backfill_tasks
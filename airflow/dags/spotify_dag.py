@@ -1,13 +1,40 @@
 from airflow import DAG
+from airflow.decorators import task_group
 from airflow.operators.python import PythonOperator
 from datetime import timedelta, datetime
 import sys
 
 sys.path.append('/opt/airflow/src')
 
-from pipeline.extract import extract
-from pipeline.transform import transform
-from pipeline.load import load
+# The scheduler re-parses this file every few seconds, so the pipeline modules (and pandas, SQLAlchemy
+# and requests behind them) are only imported inside the callables, when a task actually runs. Settings
+# are read there too, since the first read of a `Config` setting searches for and loads the `.env` file.
+# Every mapped task group derives its shard's run-scoped artifact paths from the run date, run id and
+# shard number, so only the small shard list travels through XCom, never the data itself.
+
+# Airflow pool bounding the concurrent API-bound tasks of the daily and backfill DAGs.
+SPOTIFY_API_POOL = 'spotify_api'
+
+def plan_shards():
+    from settings.config import Config
+    from pipeline.shards import shard_users
+    return [{"shard": shard, "user_ids": user_ids} for shard, user_ids in enumerate(shard_users(Config.USER_IDS))]
+
+def extract_data(shard, user_ids, ds, run_id):
+    from pipeline.shards import extract_shard, shard_artifacts
+    return extract_shard(user_ids, shard_artifacts(ds, run_id, shard))
+
+def enrich_data(shard, user_ids, ds, run_id):
+    from pipeline.shards import enrich_shard, shard_artifacts
+    return enrich_shard(shard_artifacts(ds, run_id, shard))
+
+def transform_data(shard, user_ids, ds, run_id):
+    from pipeline.shards import shard_artifacts, transform_shard
+    return transform_shard(user_ids, shard_artifacts(ds, run_id, shard))
+
+def load_data(shard, user_ids, ds, run_id):
+    from pipeline.shards import load_shard, shard_artifacts
+    return load_shard(shard_artifacts(ds, run_id, shard))
 
 default_args = {
     'owner': 'airflow',
@@ -23,22 +50,48 @@ with DAG(
     description='Pipeline to retrieve recently played tracks from Spotify.',
     schedule='0 16 * * *',
     catchup=False,
+    max_active_runs=1,
     tags=['spotify_playlog']
 
 ) as dag:
-    extract_task = PythonOperator(
-        task_id='extract_data',
-        python_callable=extract
+    plan_task = PythonOperator(
+        task_id='plan_shards',
+        python_callable=plan_shards
     )
 
-    transform_task = PythonOperator(
-        task_id='transform_data',
-        python_callable=transform
-    )
+    # One group instance per shard, so a shard moves on to its next task as soon as its own previous
+    # task is done instead of waiting for that stage to finish for every shard.
+    @task_group(group_id='shard')
+    def process_shard(shard_kwargs):
+        # API-bound tasks share the `spotify_api` pool; each process gets 1/MAX_ACTIVE_SHARDS of
+        # HTTP_RATE_LIMIT, so the pool size should not exceed MAX_ACTIVE_SHARDS.
+        extract_task = PythonOperator(
+            task_id='extract_data',
+            python_callable=extract_data,
+            op_kwargs=shard_kwargs,
+            pool=SPOTIFY_API_POOL
+        )
 
-    load_task = PythonOperator(
-        task_id='load_data',
-        python_callable=load
-    )
+        # Whether to enrich is decided when the task runs, by `enrichment_enabled()`; otherwise it returns at once.
+        enrich_task = PythonOperator(
+            task_id='enrich_data',
+            python_callable=enrich_data,
+            op_kwargs=shard_kwargs,
+            pool=SPOTIFY_API_POOL
+        )
+
+        transform_task = PythonOperator(
+            task_id='transform_data',
+            python_callable=transform_data,
+            op_kwargs=shard_kwargs
+        )
+
+        load_task = PythonOperator(
+            task_id='load_data',
+            python_callable=load_data,
+            op_kwargs=shard_kwargs
+        )
+
+        extract_task >> enrich_task >> transform_task >> load_task
 
-    extract_task >> transform_task >> load_task
\ No newline at end of file
+    plan_task >> process_shard.expand(shard_kwargs=plan_task.output)
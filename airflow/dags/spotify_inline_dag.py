@@ -0,0 +1,34 @@
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+from datetime import timedelta, datetime
+import sys
+
+sys.path.append('/opt/airflow/src')
+
+# The pipeline modules are imported inside the callable to keep DAG parsing cheap.
+
+def run_pipeline():
+    from pipeline.run import run_pipeline
+    return vars(run_pipeline())
+
+default_args = {
+    'owner': 'airflow',
+    'start_date': datetime(2025, 6, 27),
+    'retries': 2,
+    'retry_delay': timedelta(minutes=5),
+}
+
+with DAG(
+    dag_id='spotify_playlog_inline',
+    default_args=default_args,
+    description='Single-task, in-memory run of the Spotify playlog pipeline.',
+    schedule=None,
+    catchup=False,
+    max_active_runs=1,
+    tags=['spotify_playlog']
+
+) as dag:
+    run_task = PythonOperator(
+        task_id='run_pipeline',
+        python_callable=run_pipeline
+    )
@@ -14,6 +14,28 @@ else
   exit 1
 fi
 
+if [ "$1" == "--poll" ]; then
+  echo "poller.py running..."
+  # Poll the users continuously and load new plays in micro-batches until stopped
+  $PYTHON src/pipeline/poller.py "${@:2}"
+  exit $?
+fi
+
+if [ "$1" == "--in-memory" ]; then
+  echo "run.py running..."
+  # Run extract, transform and load in a single process without intermediate files
+  $PYTHON src/pipeline/run.py "${@:2}"
+
+  # Check for errors after running run.py
+  if [ $? -ne 0 ]; then
+    echo "run.py failed. Execution stopped."
+    exit 1
+  fi
+
+  echo "All steps completed successfully."
+  exit 0
+fi
+
 echo "extract.py running..."
 # Run extract.py to get data from APIs
 $PYTHON src/pipeline/extract.py
@@ -24,6 +46,16 @@ if [ $? -ne 0 ]; then
   exit 1
 fi
 
+echo "enrich.py running..."
+# Run enrich.py to fetch and cache track and artist metadata (no-op unless ENRICH_METADATA=true)
+$PYTHON src/pipeline/enrich.py
+
+# Check for errors after running enrich.py
+if [ $? -ne 0 ]; then
+  echo "enrich.py failed. Execution stopped."
+  exit 1
+fi
+
 echo "transform.py running..."
 # Run transform.py to clean and convert the data
 $PYTHON src/pipeline/transform.py
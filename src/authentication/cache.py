@@ -0,0 +1,154 @@
+import time
+import sqlite3
+from pathlib import Path
+from dataclasses import dataclass
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+from settings.config import Config
+
+@dataclass
+class AccessToken:
+    """
+    Access token issued by Spotify together with its refresh token and absolute expiry (Unix seconds).
+    """
+    access_token: str
+    refresh_token: str
+    expires_at: float
+
+    def is_valid(self, margin: float) -> bool:
+        return self.expires_at - margin > time.time()
+
+class TokenCache:
+    """
+    Per-user access token cache stored in SQLite, safe to share between threads and worker processes.
+
+    A still-valid access token is reused until it is within `refresh_margin` seconds of expiry.
+    Refreshing a user is guarded by a short lease row, so concurrent workers wait for the token
+    another worker is fetching instead of refreshing the same user twice. Rotated refresh tokens
+    are persisted with the access token.
+    """
+    def __init__(self, path: Path, refresh_margin: Optional[float] = None,
+                 lease_seconds: float = 30.0, poll_interval: float = 0.1):
+        refresh_margin = Config.TOKEN_REFRESH_MARGIN if refresh_margin is None else refresh_margin
+        self.path = path
+        self.refresh_margin = refresh_margin
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tokens (
+                    user_id TEXT PRIMARY KEY,
+                    access_token TEXT,
+                    refresh_token TEXT,
+                    expires_at REAL NOT NULL DEFAULT 0,
+                    lease_until REAL NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL DEFAULT 0
+                )
+            """)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def get(self, user_id: str) -> Optional[AccessToken]:
+        """
+        Returns the cached token of a user, valid or not.
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT access_token, refresh_token, expires_at FROM tokens WHERE user_id = ?",
+                               (user_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return AccessToken(access_token=row[0], refresh_token=row[1], expires_at=row[2])
+
+    def store(self, user_id: str, token: AccessToken) -> None:
+        """
+        Persists a freshly issued token and releases the user's refresh lease.
+        """
+        with self._transaction() as conn:
+            conn.execute("""
+                INSERT INTO tokens (user_id, access_token, refresh_token, expires_at, lease_until, updated_at)
+                VALUES (?, ?, ?, ?, 0, ?)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    access_token = excluded.access_token,
+                    refresh_token = excluded.refresh_token,
+                    expires_at = excluded.expires_at,
+                    lease_until = 0,
+                    updated_at = excluded.updated_at
+            """, (user_id, token.access_token, token.refresh_token, token.expires_at, time.time()))
+
+    def _release(self, user_id: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("UPDATE tokens SET lease_until = 0 WHERE user_id = ?", (user_id,))
+
+    def get_access_token(self, user_id: str, refresh: Callable[[str], AccessToken],
+                         token_path: Path, load_refresh_token: Callable[[Path], str]) -> str:
+        """
+        Returns a valid access token for the user, refreshing it only when it is close to expiry.
+
+        Args:
+            user_id (str): User the token belongs to.
+            refresh (Callable[[str], AccessToken]): Exchanges a refresh token for a new access token.
+            token_path (Path): JSON file holding the user's refresh token from the authorization step.
+            load_refresh_token (Callable[[Path], str]): Reads the refresh token from `token_path`.
+
+        Returns:
+            str: An access token valid for at least `refresh_margin` seconds.
+        """
+        while True:
+            with self._transaction() as conn:
+                row = conn.execute("""
+                    SELECT access_token, refresh_token, expires_at, lease_until, updated_at
+                    FROM tokens WHERE user_id = ?
+                """, (user_id,)).fetchone()
+                now = time.time()
+
+                if row is not None and row[0] is not None and row[2] - self.refresh_margin > now:
+                    return row[0]
+
+                if row is None or row[3] <= now:
+                    conn.execute("""
+                        INSERT INTO tokens (user_id, lease_until) VALUES (?, ?)
+                        ON CONFLICT (user_id) DO UPDATE SET lease_until = excluded.lease_until
+                    """, (user_id, now + self.lease_seconds))
+                    break
+
+            time.sleep(self.poll_interval)
+
+        try:
+            refresh_token = row[1] if row is not None else None
+            file_is_newer = token_path.exists() and (row is None or token_path.stat().st_mtime > row[4])
+            if not refresh_token or file_is_newer:
+                refresh_token = load_refresh_token(token_path)
+
+            token = refresh(refresh_token)
+        except BaseException:
+            self._release(user_id)
+            raise
+
+        self.store(user_id, token)
+        return token.access_token
+
+_cache: Optional[TokenCache] = None
+
+def get_token_cache() -> TokenCache:
+    """
+    Returns the process-wide token cache stored at `Config.TOKEN_CACHE_PATH`.
+    """
+    global _cache
+    if _cache is None:
+        _cache = TokenCache(Config.TOKEN_CACHE_PATH)
+    return _cache
@@ -4,6 +4,7 @@ import requests
 from pathlib import Path
 from dataclasses import dataclass
 from settings.config import Config
+from pipeline.client import get_client
 
 @dataclass
 class TokenRequestPayload:
@@ -63,10 +64,11 @@ def get_refresh_token(payload: TokenRequestPayload) -> AuthResponse:
         RuntimeError: If the request fails or the response cannot be parsed.
         ValueError: If no refresh token is found in the response.
     """
-    url = "https://accounts.spotify.com/api/token"
+    url = f"{Config.SPOTIFY_ACCOUNTS_URL}/api/token"
 
+    # The authorization code is single-use: a retry after a lost success would only fail with invalid_grant.
     try:
-        response = requests.post(url, headers = payload.headers, data = payload.data)
+        response = get_client().post(url, retry = False, headers = payload.headers, data = payload.data)
         response.raise_for_status()
     except requests.RequestException as error:
         raise RuntimeError("Failed to get token from Spotify.") from error
@@ -0,0 +1,302 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import subprocess
+import tempfile
+from pathlib import Path
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from benchmarks.generator import user_ids, write_raw_events
+from benchmarks.stand_in import StandInServer
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+BASELINES_PATH = Path(__file__).resolve().parent / "baselines.json"
+STAGES = ("extract", "transform", "load")
+BENCH_TABLE = "bench_playlog"
+
+@dataclass
+class BenchmarkResult:
+    """
+    Measurements of one benchmark run. Throughput counts events per second for extract and transform and
+    rows per second for load; latencies are per request (extract) or per batch (transform, load).
+    """
+    stage: str
+    backend: str
+    events: int
+    users: int
+    seconds: float = 0.0
+    throughput: float = 0.0
+    p50_ms: float = 0.0
+    p99_ms: float = 0.0
+    peak_rss_mb: float = 0.0
+    details: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def key(self) -> str:
+        return f"{self.stage}:{self.backend}:{self.events}:{self.users}"
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Returns the nearest-rank percentile of `values` (0.0 for no values).
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def timed_batches(batches: Iterable[Any], latencies: List[float]) -> Iterator[Any]:
+    """
+    Yields the batches and records the time the consumer spends on each one (including reading the next).
+    """
+    started = time.perf_counter()
+    for batch in batches:
+        yield batch
+        now = time.perf_counter()
+        latencies.append(now - started)
+        started = now
+
+def isolate(workdir: Path) -> None:
+    """
+    Points every file the pipeline writes at `workdir`, before the pipeline modules are imported.
+    """
+    from settings.config import Config
+
+    Config.LOGGER_PATH = workdir / "logs" / "bench.log"
+    Config.STATE_PATH = workdir / "state" / "pipeline_state.sqlite"
+    Config.TOKEN_DIR = workdir / "token"
+    Config.REFRESH_TOKEN_PATH = Config.TOKEN_DIR / "refresh_token.json"
+    Config.TOKEN_CACHE_PATH = Config.TOKEN_DIR / "token_cache.sqlite"
+    Config.METADATA_CACHE_PATH = workdir / "cache" / "metadata.sqlite"
+    Config.ARCHIVE_DIR = workdir / "archive"
+
+def bench_extract(params: Dict[str, Any], workdir: Path) -> BenchmarkResult:
+    """
+    Extracts every user's plays from the stand-in, measuring per-request latency.
+    """
+    from settings.config import Config
+    from pipeline.client import get_client
+    from pipeline.extract import extract_users
+
+    users = user_ids(params["users"])
+    Config.TOKEN_DIR.mkdir(parents=True, exist_ok=True)
+    for user_id in users:
+        Config.refresh_token_path(user_id).write_text(json.dumps({"refresh_token": f"rt-{user_id}"}), encoding="utf-8")
+
+    latencies: List[float] = []
+    get_client().session.hooks["response"].append(lambda response, *args, **kwargs: latencies.append(response.elapsed.total_seconds()))
+
+    started = time.perf_counter()
+    result = extract_users(users, {user_id: 0 for user_id in users})
+    seconds = time.perf_counter() - started
+
+    events = sum(payload["total"] for payload in result.payloads.values())
+    return BenchmarkResult("extract", "http", params["events"], params["users"], seconds, events / seconds,
+                           percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000, peak_rss_mb(),
+                           {"requests": len(latencies), "extracted": events, "failed_users": len(result.failed_users)})
+
+def bench_transform(params: Dict[str, Any], workdir: Path) -> BenchmarkResult:
+    """
+    Transforms the generated raw events file into Parquet staging, measuring per-batch latency.
+    """
+    from pipeline.transform import iter_raw_batches, transform_track_batches
+
+    latencies: List[float] = []
+    started = time.perf_counter()
+    rows = transform_track_batches(timed_batches(iter_raw_batches(Path(params["raw_path"]), params["batch_size"]), latencies),
+                                   workdir / "staged.parquet")
+    seconds = time.perf_counter() - started
+
+    return BenchmarkResult("transform", "parquet", params["events"], params["users"], seconds, params["events"] / seconds,
+                           percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000, peak_rss_mb(),
+                           {"rows": rows, "batches": len(latencies)})
+
+def bench_load(params: Dict[str, Any], workdir: Path) -> BenchmarkResult:
+    """
+    Loads transformed rows into a fresh table in batches, measuring per-batch latency.
+    """
+    from sqlalchemy import text
+    from pipeline.transform import iter_raw_batches, transform_items
+    from pipeline.load import get_database_engine, load_dataframe
+
+    engine = get_database_engine(params["database_url"])
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {BENCH_TABLE}" + (" CASCADE" if engine.dialect.name == "postgresql" else "")))
+
+    frames = [transform_items(batch) for batch in iter_raw_batches(Path(params["raw_path"]), params["batch_size"])]
+    latencies: List[float] = []
+    inserted = 0
+    started = time.perf_counter()
+    for df in frames:
+        batch_started = time.perf_counter()
+        inserted += load_dataframe(df, BENCH_TABLE, engine)
+        latencies.append(time.perf_counter() - batch_started)
+    seconds = time.perf_counter() - started
+
+    rows = sum(len(df) for df in frames)
+    return BenchmarkResult("load", engine.dialect.name, params["events"], params["users"], seconds, rows / seconds,
+                           percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000, peak_rss_mb(),
+                           {"rows": rows, "inserted": inserted, "batches": len(latencies)})
+
+WORKERS: Dict[str, Callable[[Dict[str, Any], Path], BenchmarkResult]] = {
+    "extract": bench_extract,
+    "transform": bench_transform,
+    "load": bench_load,
+}
+
+def run_worker(params: Dict[str, Any]) -> None:
+    """
+    Entry point of the child process running a single stage benchmark; writes the result as JSON.
+    """
+    workdir = Path(params["workdir"])
+    isolate(workdir)
+    result = WORKERS[params["stage"]](params, workdir)
+    Path(params["result_path"]).write_text(json.dumps(asdict(result)), encoding="utf-8")
+
+def run_stage(params: Dict[str, Any], env: Dict[str, str]) -> BenchmarkResult:
+    """
+    Runs one stage benchmark in a fresh interpreter, so imports, caches and peak RSS do not leak between runs.
+    """
+    result_path = Path(params["workdir"]) / f"{params['stage']}.json"
+    completed = subprocess.run([sys.executable, "-m", "benchmarks.bench", "--worker", json.dumps({**params, "result_path": str(result_path)})],
+                               cwd=SRC_DIR, env={**os.environ, **env, "PYTHONPATH": str(SRC_DIR)},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{params['stage']} benchmark failed:\n{completed.stderr}")
+    return BenchmarkResult(**json.loads(result_path.read_text(encoding="utf-8")))
+
+def run_benchmarks(stages: List[str], events: int, users: int, repeat: int = 3, batch_size: int = 50_000,
+                   database_url: Optional[str] = None, latency: float = 0.0, rate_429: float = 0.0,
+                   rate_limit: float = 1000.0, seed: int = 0) -> List[BenchmarkResult]:
+    """
+    Runs the selected stage benchmarks `repeat` times and keeps the run with the median throughput.
+
+    Args:
+        stages (List[str]): Any of "extract", "transform" and "load".
+        events (int): Number of generated play events (spread evenly over the users).
+        users (int): Number of generated users.
+        repeat (int): Runs per stage.
+        batch_size (int): Events per transform batch and rows per load batch.
+        database_url (Optional[str]): Load target; defaults to a fresh SQLite file.
+        latency (float): Stand-in latency per request in seconds (extract).
+        rate_429 (float): Probability of a 429 response from the stand-in (extract).
+        rate_limit (float): Client rate limit in requests per second (extract).
+        seed (int): Seed of the generated data.
+
+    Returns:
+        List[BenchmarkResult]: One result per stage.
+    """
+    results = []
+    workdir = Path(tempfile.mkdtemp(prefix="playlog-bench-"))
+    try:
+        raw_path = write_raw_events(workdir / "raw.ndjson", events, users, seed) if {"transform", "load"} & set(stages) else None
+        for stage in stages:
+            runs = []
+            for run in range(repeat):
+                run_dir = workdir / f"{stage}-{run}"
+                params = {"stage": stage, "events": events, "users": users, "batch_size": batch_size,
+                          "raw_path": str(raw_path), "workdir": str(run_dir),
+                          "database_url": database_url or f"sqlite:///{run_dir / 'bench.db'}"}
+                run_dir.mkdir()
+                if stage == "extract":
+                    with StandInServer(max(1, events // max(1, users)), latency=latency, rate_429=rate_429, seed=seed) as server:
+                        env = {"SPOTIFY_API_URL": f"{server.url}/v1", "SPOTIFY_ACCOUNTS_URL": server.url,
+                               "EXTRACT_MAX_PAGES": str(events // max(1, users) // 50 + 2),
+                               "HTTP_RATE_LIMIT": str(rate_limit), "HTTP_RATE_BURST": str(rate_limit)}
+                        runs.append(run_stage(params, env))
+                        runs[-1].details["throttled"] = server.throttled
+                else:
+                    runs.append(run_stage(params, {}))
+            results.append(sorted(runs, key=lambda result: result.throughput)[len(runs) // 2])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def load_baselines(path: Path = BASELINES_PATH) -> Dict[str, Dict[str, Any]]:
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+
+def save_baselines(results: List[BenchmarkResult], path: Path = BASELINES_PATH) -> None:
+    """
+    Stores the results as the new baselines of their (stage, backend, events, users) keys.
+    """
+    baselines = load_baselines(path)
+    baselines.update({result.key: asdict(result) for result in results})
+    path.write_text(json.dumps(baselines, indent=4, sort_keys=True) + "\n", encoding="utf-8")
+
+def find_regressions(results: List[BenchmarkResult], baselines: Dict[str, Dict[str, Any]],
+                     tolerance: float = 0.2) -> List[str]:
+    """
+    Compares results with their baselines; throughput may drop and p99 latency and peak RSS
+    may grow by at most `tolerance` before a result counts as a regression.
+
+    Returns:
+        List[str]: One description per regressed metric.
+    """
+    regressions = []
+    for result in results:
+        baseline = baselines.get(result.key)
+        if baseline is None:
+            continue
+        if result.throughput < baseline["throughput"] * (1 - tolerance):
+            regressions.append(f"{result.key} throughput {result.throughput:,.0f}/s < baseline {baseline['throughput']:,.0f}/s")
+        for metric in ("p99_ms", "peak_rss_mb"):
+            if getattr(result, metric) > baseline[metric] * (1 + tolerance):
+                regressions.append(f"{result.key} {metric} {getattr(result, metric):,.1f} > baseline {baseline[metric]:,.1f}")
+    return regressions
+
+def format_results(results: List[BenchmarkResult]) -> str:
+    lines = [f"{'benchmark':<40} {'seconds':>9} {'per second':>12} {'p50 ms':>9} {'p99 ms':>9} {'peak MB':>9}"]
+    for result in results:
+        lines.append(f"{result.key:<40} {result.seconds:>9.3f} {result.throughput:>12,.0f} "
+                     f"{result.p50_ms:>9.2f} {result.p99_ms:>9.2f} {result.peak_rss_mb:>9.1f}")
+    return "\n".join(lines)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the extract, transform and load stages on synthetic data.")
+    parser.add_argument("stages", nargs="*", help=f"Stages to benchmark: {', '.join(STAGES)} (default: all).")
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--database-url", help="Load target (defaults to a temporary SQLite file).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Stand-in latency per request in seconds.")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Probability of a 429 from the stand-in.")
+    parser.add_argument("--rate-limit", type=float, default=1000.0, help="Client rate limit (requests/s).")
+    parser.add_argument("--save", action="store_true", help="Store the results as baselines.")
+    parser.add_argument("--compare", action="store_true", help="Fail if results regress against the baselines.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(json.loads(args.worker))
+        return
+
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    results = run_benchmarks(args.stages or list(STAGES), args.events, args.users, args.repeat, args.batch_size,
+                             args.database_url, args.latency, args.rate_429, args.rate_limit)
+    print(format_results(results))
+
+    if args.compare:
+        regressions = find_regressions(results, load_baselines(), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+    if args.save:
+        save_baselines(results)
+        print(f"Baselines saved to {BASELINES_PATH}.")
+
+if __name__ == "__main__":
+    main()
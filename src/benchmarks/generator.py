@@ -0,0 +1,168 @@
+import random
+import string
+from pathlib import Path
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+MARKETS = ["AD", "AR", "AT", "AU", "BE", "BG", "BO", "BR", "CA", "CH", "CL", "CO", "CR", "CY", "CZ", "DE", "DK", "DO",
+           "EC", "EE", "ES", "FI", "FR", "GB", "GR", "GT", "HK", "HN", "HU", "ID", "IE", "IS", "IT", "JP", "LI", "LT",
+           "LU", "LV", "MC", "MT", "MX", "MY", "NI", "NL", "NO", "NZ", "PA", "PE", "PH", "PL", "PT", "PY", "SE", "SG",
+           "SK", "SV", "TR", "TW", "US", "UY"]
+ID_ALPHABET = string.ascii_letters + string.digits
+
+def spotify_id(rng: random.Random) -> str:
+    return "".join(rng.choices(ID_ALPHABET, k=22))
+
+def user_ids(users: int) -> List[str]:
+    return [f"user{index:05d}" for index in range(users)]
+
+def format_played_at(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{moment.microsecond // 1000:03d}Z"
+
+@dataclass
+class Catalog:
+    """
+    Synthetic catalog of artists, albums and tracks shared by all generated listeners.
+    """
+    artists: List[Dict[str, Any]]
+    tracks: List[Dict[str, Any]]
+
+    @classmethod
+    def build(cls, tracks: int, seed: int = 0) -> "Catalog":
+        """
+        Builds a catalog of `tracks` tracks on roughly one album per 10 tracks and one artist per 3 albums.
+        """
+        rng = random.Random(seed)
+        artists = []
+        for index in range(max(1, tracks // 30)):
+            artist_id = spotify_id(rng)
+            artists.append({
+                "external_urls": {"spotify": f"https://open.spotify.com/artist/{artist_id}"},
+                "href": f"https://api.spotify.com/v1/artists/{artist_id}",
+                "id": artist_id,
+                "name": f"Artist {index}",
+                "type": "artist",
+                "uri": f"spotify:artist:{artist_id}",
+            })
+
+        catalog = []
+        album = None
+        for index in range(tracks):
+            if index % 10 == 0:
+                album_id = spotify_id(rng)
+                album = {
+                    "album_type": "album",
+                    "artists": [rng.choice(artists)],
+                    "available_markets": MARKETS,
+                    "external_urls": {"spotify": f"https://open.spotify.com/album/{album_id}"},
+                    "href": f"https://api.spotify.com/v1/albums/{album_id}",
+                    "id": album_id,
+                    "images": [{"height": size, "width": size, "url": f"https://i.scdn.co/image/{spotify_id(rng)}"}
+                               for size in (640, 300, 64)],
+                    "name": f"Album {index // 10}",
+                    "release_date": f"{rng.randint(1970, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                    "release_date_precision": "day",
+                    "total_tracks": 10,
+                    "type": "album",
+                    "uri": f"spotify:album:{album_id}",
+                }
+            track_id = spotify_id(rng)
+            catalog.append({
+                "album": album,
+                "artists": album["artists"],
+                "available_markets": MARKETS,
+                "disc_number": 1,
+                "duration_ms": rng.randint(90_000, 420_000),
+                "explicit": rng.random() < 0.1,
+                "external_ids": {"isrc": f"US{spotify_id(rng)[:10].upper()}"},
+                "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+                "href": f"https://api.spotify.com/v1/tracks/{track_id}",
+                "id": track_id,
+                "is_local": False,
+                "name": f"Song {index}",
+                "popularity": rng.randint(0, 100),
+                "preview_url": None,
+                "track_number": index % 10 + 1,
+                "type": "track",
+                "uri": f"spotify:track:{track_id}",
+            })
+        return cls(artists=artists, tracks=catalog)
+
+    def pick(self, rng: random.Random) -> Dict[str, Any]:
+        # A third of the plays repeat a few favourites (Zipf-like), the rest spread over the long tail.
+        if rng.random() < 0.3:
+            return self.tracks[int(rng.paretovariate(1.1) - 1) % len(self.tracks)]
+        return self.tracks[rng.randrange(len(self.tracks))]
+
+def generate_user_history(user_id: str, events: int, catalog: Catalog, start: datetime, end: datetime,
+                          seed: int = 0, tag_user: bool = True) -> List[Dict[str, Any]]:
+    """
+    Generates `events` plays of one user between `start` and `end`, oldest first.
+
+    Args:
+        user_id (str): Listener the plays belong to.
+        events (int): Number of plays.
+        catalog (Catalog): Tracks to pick from.
+        start (datetime): Earliest play (UTC).
+        end (datetime): Latest play (UTC).
+        seed (int): Seed combined with the user for reproducible histories.
+        tag_user (bool): Whether to add "user_id" to each item, as extract does.
+
+    Returns:
+        List[Dict[str, Any]]: Play events shaped like items of the recently played endpoint.
+    """
+    rng = random.Random(f"{seed}:{user_id}")
+    span_ms = max(1, int((end - start).total_seconds() * 1000))
+    offsets = sorted(rng.sample(range(span_ms), events) if events <= span_ms else
+                     [rng.randrange(span_ms) for _ in range(events)])
+
+    history = []
+    for offset in offsets:
+        item = {
+            "track": catalog.pick(rng),
+            "played_at": format_played_at(start + timedelta(milliseconds=offset)),
+            "context": {"type": "playlist", "uri": f"spotify:playlist:{user_id}",
+                        "href": f"https://api.spotify.com/v1/playlists/{user_id}", "external_urls": {}},
+        }
+        if tag_user:
+            item["user_id"] = user_id
+        history.append(item)
+    return history
+
+def generate_items(events: int, users: int, seed: int = 0, catalog: Optional[Catalog] = None,
+                   start: Optional[datetime] = None, end: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yields `events` tagged play events spread evenly over `users` listeners, one user after another.
+
+    Histories are generated per user, so memory stays bounded by one user's plays even for
+    millions of events.
+    """
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=1)
+    catalog = catalog or Catalog.build(min(max(events // 5, 100), 50_000), seed)
+    per_user, extra = divmod(events, max(1, users))
+
+    for index, user_id in enumerate(user_ids(users)):
+        yield from generate_user_history(user_id, per_user + (index < extra), catalog, start, end, seed)
+
+def generate_payload(events: int, users: int = 1, seed: int = 0) -> Dict[str, Any]:
+    """
+    Generates a merged recently played payload, like the JSON file written by extract.
+    """
+    items = list(generate_items(events, users, seed))
+    return {"items": items, "next": None, "cursors": None, "limit": len(items),
+            "href": "https://api.spotify.com/v1/me/player/recently-played"}
+
+def write_raw_events(path: Path, events: int, users: int, seed: int = 0) -> Path:
+    """
+    Writes generated play events as newline-delimited compact records, like the raw file streamed by extract.
+    """
+    from pipeline.events import decode_record, encode_event
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as file:
+        for item in generate_items(events, users, seed):
+            file.write(encode_event(decode_record(item)))
+            file.write("\n")
+    return path
@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+import tempfile
+import importlib.util
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+from benchmarks.bench import (SRC_DIR, BenchmarkResult, find_regressions, format_results, load_baselines,
+                              percentile, save_baselines)
+
+DAGS_DIR = SRC_DIR.parent / "airflow" / "dags"
+HEAVY_MODULES = ("pandas", "pyarrow", "sqlalchemy", "psycopg2", "requests")
+
+@dataclass(frozen=True)
+class ImportTarget:
+    """
+    What a fresh interpreter imports for one entry point, and the modules it must not pull in.
+
+    `module` is a dotted module name, or the path of a DAG file (relative to `airflow/dags`) that
+    is executed the way the scheduler parses it.
+    """
+    module: str
+    forbidden: Tuple[str, ...]
+
+    @property
+    def is_dag(self) -> bool:
+        return self.module.endswith(".py")
+
+IMPORT_TARGETS: Dict[str, ImportTarget] = {
+    "config": ImportTarget("settings.config", ("dotenv", "pytz") + HEAVY_MODULES),
+    "dag": ImportTarget("spotify_dag.py", ("pipeline", "dotenv") + HEAVY_MODULES),
+    "backfill_dag": ImportTarget("spotify_backfill_dag.py", ("pipeline", "dotenv") + HEAVY_MODULES),
+    "inline_dag": ImportTarget("spotify_inline_dag.py", ("pipeline", "dotenv") + HEAVY_MODULES),
+    "shards": ImportTarget("pipeline.shards", HEAVY_MODULES),
+    "backfill": ImportTarget("pipeline.backfill", HEAVY_MODULES),
+    "extract": ImportTarget("pipeline.extract", ("pandas", "pyarrow", "sqlalchemy", "psycopg2")),
+    "transform": ImportTarget("pipeline.transform", ("pandas", "pyarrow", "sqlalchemy", "psycopg2", "requests")),
+    "load": ImportTarget("pipeline.load", ("psycopg2", "requests")),
+    "analytics": ImportTarget("pipeline.analytics", ("psycopg2", "requests")),
+}
+
+# Runs in the child interpreter; nothing of the project is imported before the clock starts.
+PROBE = """
+import sys, json, time, runpy, resource, importlib
+target, is_dag = sys.argv[1], sys.argv[2] == "1"
+before = set(sys.modules)
+started = time.perf_counter()
+if is_dag:
+    runpy.run_path(target)
+else:
+    importlib.import_module(target)
+seconds = time.perf_counter() - started
+print(json.dumps({"seconds": seconds, "modules": sorted(set(sys.modules) - before),
+                  "maxrss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+"""
+
+def probe(target: ImportTarget, workdir: Path) -> Dict[str, object]:
+    """
+    Imports the target in a fresh interpreter and returns its import time, new modules and peak RSS.
+    """
+    module = str(DAGS_DIR / target.module) if target.is_dag else target.module
+    completed = subprocess.run([sys.executable, "-c", PROBE, module, "1" if target.is_dag else "0"],
+                               cwd=SRC_DIR, env={**os.environ, "PYTHONPATH": str(SRC_DIR),
+                                                 "LOG_PATH": str(workdir / "logs" / "bench.log")},
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {target.module} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def loaded_forbidden(target: ImportTarget, modules: List[str]) -> List[str]:
+    return [forbidden for forbidden in target.forbidden
+            if any(name == forbidden or name.startswith(f"{forbidden}.") for name in modules)]
+
+def bench_imports(names: List[str], repeat: int = 5) -> Tuple[List[BenchmarkResult], List[str]]:
+    """
+    Measures the cold import time of each entry point over `repeat` fresh interpreters.
+
+    Args:
+        names (List[str]): Keys of `IMPORT_TARGETS`.
+        repeat (int): Interpreters started per target.
+
+    Returns:
+        Tuple[List[BenchmarkResult], List[str]]: One result per target (throughput is imports per second,
+        p50/p99 the import time), and a description of every heavy module a target should not have loaded.
+    """
+    results, violations = [], []
+    with tempfile.TemporaryDirectory(prefix="playlog-imports-") as workdir:
+        for name in names:
+            target = IMPORT_TARGETS[name]
+            if target.is_dag and importlib.util.find_spec("airflow") is None:
+                print(f"Skipping {name}: Airflow is not installed.")
+                continue
+
+            runs = [probe(target, Path(workdir)) for _ in range(repeat)]
+            seconds = [run["seconds"] for run in runs]
+            median = sorted(seconds)[len(seconds) // 2]
+            peak = max(run["maxrss"] for run in runs)
+            peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+            results.append(BenchmarkResult("import", name, 0, 0, median, 1 / median,
+                                           percentile(seconds, 0.5) * 1000, percentile(seconds, 0.99) * 1000,
+                                           peak_mb, {"modules": len(runs[0]["modules"])}))
+
+            loaded = loaded_forbidden(target, runs[0]["modules"])
+            if loaded:
+                violations.append(f"{name} ({target.module}) imports {', '.join(loaded)}")
+    return results, violations
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the cold import time of the DAG files and pipeline entry points.")
+    parser.add_argument("targets", nargs="*", help=f"Targets: {', '.join(IMPORT_TARGETS)} (default: all).")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", action="store_true", help="Store the results as baselines.")
+    parser.add_argument("--compare", action="store_true", help="Fail if results regress against the baselines.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    unknown = set(args.targets) - set(IMPORT_TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+
+    results, violations = bench_imports(args.targets or list(IMPORT_TARGETS), args.repeat)
+    print(format_results(results))
+    for violation in violations:
+        print(f"HEAVY IMPORT {violation}")
+
+    regressions = find_regressions(results, load_baselines(), args.tolerance) if args.compare else []
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if args.save:
+        save_baselines(results)
+    if violations or regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import json
+import time
+import bisect
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from benchmarks.generator import Catalog, generate_user_history
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the Spotify accounts and Web API endpoints used by the pipeline.
+
+    Serves `POST /api/token`, `GET /v1/me/player/recently-played` (cursor-paginated by `after`)
+    and `GET /v1/tracks|artists?ids=` from generated per-user histories. Every request waits
+    `latency` seconds (plus up to `jitter`) and is rejected with 429 and `Retry-After: retry_after`
+    with probability `rate_429`. Refresh token `rt-<user>` yields access token `token-<user>`.
+    """
+    daemon_threads = True
+
+    def __init__(self, events_per_user: int, latency: float = 0.0, jitter: float = 0.0, rate_429: float = 0.0,
+                 retry_after: float = 0.0, seed: int = 0, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), StandInHandler)
+        self.events_per_user = events_per_user
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.seed = seed
+        self.catalog = Catalog.build(min(max(events_per_user, 100), 20_000), seed)
+        self.tracks_by_id = {track["id"]: track for track in self.catalog.tracks}
+        self.artists_by_id = {artist["id"]: {**artist, "genres": ["synthetic"], "popularity": 50}
+                              for artist in self.catalog.artists}
+        self.end = datetime.now(timezone.utc)
+        self.requests = 0
+        self.throttled = 0
+        self._histories: Dict[str, Tuple[List[int], List[Dict[str, Any]]]] = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def history(self, user_id: str) -> Tuple[List[int], List[Dict[str, Any]]]:
+        """
+        Returns the user's plays, oldest first, with their `played_at` in Unix milliseconds.
+        """
+        with self._lock:
+            if user_id not in self._histories:
+                items = generate_user_history(user_id, self.events_per_user, self.catalog,
+                                              self.end - timedelta(hours=23), self.end, self.seed, tag_user=False)
+                played_ms = [int(datetime.fromisoformat(item["played_at"].replace("Z", "+00:00")).timestamp() * 1000)
+                             for item in items]
+                self._histories[user_id] = (played_ms, items)
+            return self._histories[user_id]
+
+    def should_throttle(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            throttled = self._rng.random() < self.rate_429
+            self.throttled += throttled
+            return throttled
+
+    def delay(self) -> float:
+        with self._lock:
+            return self.latency + self._rng.random() * self.jitter
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="spotify-stand-in", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server: StandInServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        payload = json.dumps(body, separators=(",", ":")).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def admit(self) -> bool:
+        time.sleep(self.server.delay())
+        if self.server.should_throttle():
+            self.send_json(429, {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                           {"Retry-After": f"{self.server.retry_after:g}"})
+            return False
+        return True
+
+    def user_id(self) -> Optional[str]:
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        return token.removeprefix("token-") if token.startswith("token-") else None
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        if urlsplit(self.path).path != "/api/token":
+            return self.send_json(404, {"error": "not found"})
+        if not self.admit():
+            return
+
+        refresh_token = parse_qs(body).get("refresh_token", [""])[0]
+        if not refresh_token.startswith("rt-"):
+            return self.send_json(400, {"error": "invalid_grant"})
+        self.send_json(200, {"access_token": f"token-{refresh_token[3:]}", "token_type": "Bearer", "expires_in": 3600})
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if not self.admit():
+            return
+
+        user_id = self.user_id()
+        if user_id is None:
+            return self.send_json(401, {"error": {"status": 401, "message": "Invalid access token"}})
+
+        if url.path == "/v1/me/player/recently-played":
+            self.recently_played(user_id, int(query.get("after", ["0"])[0]), int(query.get("limit", ["20"])[0]))
+        elif url.path in ("/v1/tracks", "/v1/artists"):
+            self.several(url.path.rsplit("/", 1)[1], query.get("ids", [""])[0].split(","))
+        else:
+            self.send_json(404, {"error": {"status": 404, "message": "Not found"}})
+
+    def recently_played(self, user_id: str, after: int, limit: int) -> None:
+        played_ms, items = self.server.history(user_id)
+        start = bisect.bisect_right(played_ms, after)
+        page = items[start:start + limit]
+        newest = played_ms[start + len(page) - 1] if page else after
+        href = f"{self.server.url}/v1/me/player/recently-played?limit={limit}&after="
+        self.send_json(200, {
+            "items": page[::-1],
+            "next": f"{href}{newest}" if start + limit < len(items) else None,
+            "cursors": {"after": str(newest), "before": str(played_ms[start]) if page else None},
+            "limit": limit,
+            "href": f"{href}{after}",
+        })
+
+    def several(self, kind: str, ids: List[str]) -> None:
+        known = self.server.tracks_by_id if kind == "tracks" else self.server.artists_by_id
+        self.send_json(200, {kind: [known.get(object_id) for object_id in ids]})
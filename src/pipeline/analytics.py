@@ -0,0 +1,325 @@
+import json
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import desc, func, select
+from sqlalchemy.engine import Engine
+from settings.config import Config
+from settings.logger import setup_logger
+from pipeline.rollups import rollup_artist_daily, rollup_track_daily
+from pipeline.state import get_watermark_store
+
+logger = setup_logger(Config.LOGGER_NAME, Config.LOGGER_PATH)
+
+# Query results are lists of plain dicts; they are shared between callers and must not be modified.
+Rows = List[Dict[str, Any]]
+
+# Largest `limit` served by the HTTP endpoints; larger values are capped.
+MAX_LIMIT = 100
+
+class QueryCache:
+    """
+    In-process LRU cache of query results with a time-to-live, invalidated per user.
+
+    Every key starts with the query name and the user, so the load stage can drop exactly the
+    results of the users whose plays it just stored. Each result also keeps the user's watermark
+    from before it was computed; at most every `revalidate_interval` seconds the cached users'
+    watermarks are read again and results of users who got plays loaded by another process are
+    dropped. A hit in between costs a dictionary lookup.
+    """
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                 revalidate_interval: Optional[float] = None):
+        max_entries = Config.ANALYTICS_CACHE_SIZE if max_entries is None else max_entries
+        ttl = Config.ANALYTICS_CACHE_TTL if ttl is None else ttl
+        revalidate_interval = Config.ANALYTICS_REVALIDATE_INTERVAL if revalidate_interval is None else revalidate_interval
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.revalidate_interval = revalidate_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[Any, ...], Tuple[float, Optional[int], Rows]]" = OrderedDict()
+        self._revalidated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[Any, ...]) -> Optional[Rows]:
+        now = time.monotonic()
+        if now - self._revalidated_at >= self.revalidate_interval:
+            self.revalidate()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: Tuple[Any, ...], watermark: Optional[int], rows: Rows) -> None:
+        """
+        Caches the rows of a query, computed when the user's watermark was `watermark`.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, watermark, rows)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_ids: Iterable[str]) -> int:
+        """
+        Drops the cached results of the given users.
+
+        Returns:
+            int: Number of results dropped.
+        """
+        users = set(map(str, user_ids))
+        with self._lock:
+            stale = [key for key in self._entries if key[1] in users]
+            for key in stale:
+                del self._entries[key]
+        if stale:
+            logger.debug("Invalidated %s cached results of %s user(s).", len(stale), len(users))
+        return len(stale)
+
+    def revalidate(self) -> int:
+        """
+        Drops the results computed before the user's watermark last moved.
+
+        Returns:
+            int: Number of results dropped.
+        """
+        self._revalidated_at = time.monotonic()
+        with self._lock:
+            users = {key[1] for key in self._entries}
+        if not users:
+            return 0
+        current = get_watermark_store().get_many(users)
+        with self._lock:
+            stale = [key for key, (_, watermark, _) in self._entries.items() if current.get(key[1]) != watermark]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "max_entries": self.max_entries, "ttl": self.ttl}
+
+_cache: Optional[QueryCache] = None
+
+def get_query_cache() -> QueryCache:
+    """
+    Returns the process-wide query cache.
+    """
+    global _cache
+    if _cache is None:
+        _cache = QueryCache()
+    return _cache
+
+def invalidate_users(user_ids: Iterable[str]) -> None:
+    """
+    Drops the cached results of users whose plays were just loaded; called by the load stage.
+    """
+    if _cache is not None:
+        _cache.invalidate(user_ids)
+
+def invalidate_all() -> None:
+    """
+    Drops every cached result, e.g. after the rollups were rebuilt.
+    """
+    if _cache is not None:
+        _cache.clear()
+
+def cached_query(name: str, user_id: str, params: Tuple[Any, ...], query: Callable[[Engine], Rows],
+                 engine: Optional[Engine] = None) -> Rows:
+    """
+    Returns the cached result of a query of one user's stats, running it on a miss.
+
+    Args:
+        name (str): Name of the query, part of the cache key.
+        user_id (str): User the query is about.
+        params (Tuple[Any, ...]): Remaining query parameters, part of the cache key.
+        query (Callable[[Engine], Rows]): Builds and runs the query; only called on a miss.
+        engine (Optional[Engine]): Database to query; defaults to the one at `DATABASE_URL`.
+
+    Returns:
+        Rows: The query result.
+
+    Raises:
+        RuntimeError: If `MAINTAIN_ROLLUPS` is disabled, since the queries read the rollups.
+    """
+    if not Config.MAINTAIN_ROLLUPS:
+        raise RuntimeError("Analytics queries read the daily rollups; enable MAINTAIN_ROLLUPS.")
+    cache = get_query_cache()
+    key = (name, user_id, *params)
+    rows = cache.get(key)
+    if rows is None:
+        if engine is None:
+            from pipeline.load import get_database_engine
+            engine = get_database_engine()
+        watermark = get_watermark_store().get(user_id)
+        rows = query(engine)
+        cache.put(key, watermark, rows)
+    return rows
+
+def fetch_rows(engine: Engine, statement: Any) -> Rows:
+    """
+    Runs a statement and returns its rows as JSON-ready dicts (dates as ISO strings, sums as ints).
+    """
+    with engine.connect() as conn:
+        result = conn.execute(statement)
+        rows = [dict(row) for row in result.mappings()]
+    for row in rows:
+        for column, value in row.items():
+            if isinstance(value, date):
+                row[column] = value.isoformat()
+            elif column in ("plays", "duration_ms") and value is not None:
+                row[column] = int(value)
+    return rows
+
+def top_artists(user_id: str, start: date, end: date, limit: int = 10, engine: Optional[Engine] = None) -> Rows:
+    """
+    Returns a user's most played artists in [start, end), with their plays and listening time in milliseconds.
+
+    Reads `rollup_artist_daily` through its (user_id, day, artist_id) primary key.
+    """
+    def query(db: Engine) -> Rows:
+        table = rollup_artist_daily
+        return fetch_rows(db, select(table.c.artist_id, func.max(table.c.artist_name).label("artist_name"),
+                                     func.sum(table.c.plays).label("plays"),
+                                     func.sum(table.c.duration_ms).label("duration_ms"))
+                          .where(table.c.user_id == user_id, table.c.day >= start, table.c.day < end)
+                          .group_by(table.c.artist_id)
+                          .order_by(desc("plays"), desc("duration_ms"), table.c.artist_id)
+                          .limit(limit))
+
+    return cached_query("top_artists", user_id, (start, end, limit), query, engine)
+
+def top_tracks(user_id: str, start: date, end: date, limit: int = 10, engine: Optional[Engine] = None) -> Rows:
+    """
+    Returns a user's most played tracks in [start, end), with their plays and listening time in milliseconds.
+
+    Reads `rollup_track_daily` through its (user_id, day, track_id) primary key.
+    """
+    def query(db: Engine) -> Rows:
+        table = rollup_track_daily
+        return fetch_rows(db, select(table.c.track_id, func.max(table.c.song_name).label("song_name"),
+                                     func.max(table.c.artist_name).label("artist_name"),
+                                     func.sum(table.c.plays).label("plays"),
+                                     func.sum(table.c.duration_ms).label("duration_ms"))
+                          .where(table.c.user_id == user_id, table.c.day >= start, table.c.day < end)
+                          .group_by(table.c.track_id)
+                          .order_by(desc("plays"), desc("duration_ms"), table.c.track_id)
+                          .limit(limit))
+
+    return cached_query("top_tracks", user_id, (start, end, limit), query, engine)
+
+def listening_time_by_day(user_id: str, start: date, end: date, engine: Optional[Engine] = None) -> Rows:
+    """
+    Returns a user's plays and listening time in milliseconds for every day in [start, end) they listened.
+    """
+    def query(db: Engine) -> Rows:
+        table = rollup_artist_daily
+        return fetch_rows(db, select(table.c.day, func.sum(table.c.plays).label("plays"),
+                                     func.sum(table.c.duration_ms).label("duration_ms"))
+                          .where(table.c.user_id == user_id, table.c.day >= start, table.c.day < end)
+                          .group_by(table.c.day)
+                          .order_by(table.c.day))
+
+    return cached_query("listening_time_by_day", user_id, (start, end), query, engine)
+
+def last_days(days: int = 7, today: Optional[date] = None) -> Tuple[date, date]:
+    """
+    Returns the [start, end) range of the last `days` days, today included.
+    """
+    end = (today or date.today()) + timedelta(days=1)
+    return end - timedelta(days=days), end
+
+class AnalyticsHandler(BaseHTTPRequestHandler):
+    """
+    Read-only JSON endpoints over the query functions:
+
+    `GET /users/<user>/top-artists`, `/users/<user>/top-tracks` and `/users/<user>/listening-time`
+    take optional `start` and `end` ISO days (default: the last 7 days; `start` must be before `end`)
+    and `limit` (1 or more, capped at `MAX_LIMIT`); `GET /cache` returns the cache statistics.
+    """
+    QUERIES = {
+        "top-artists": lambda user_id, start, end, limit: top_artists(user_id, start, end, limit),
+        "top-tracks": lambda user_id, start, end, limit: top_tracks(user_id, start, end, limit),
+        "listening-time": lambda user_id, start, end, limit: listening_time_by_day(user_id, start, end),
+    }
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        if parts == ["cache"]:
+            return self.send_json(200, get_query_cache().stats())
+        if len(parts) != 3 or parts[0] != "users" or parts[2] not in self.QUERIES:
+            return self.send_json(404, {"error": f"Unknown path: {url.path}"})
+
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            start, end = last_days()
+            start = date.fromisoformat(query["start"]) if "start" in query else start
+            end = date.fromisoformat(query["end"]) if "end" in query else end
+            limit = int(query.get("limit", 10))
+            if start >= end:
+                raise ValueError("start must be before end.")
+            if limit < 1:
+                raise ValueError("limit must be at least 1.")
+            limit = min(limit, MAX_LIMIT)
+        except ValueError as error:
+            return self.send_json(400, {"error": str(error)})
+
+        try:
+            rows = self.QUERIES[parts[2]](parts[1], start, end, limit)
+        except Exception as error:
+            logger.error("Analytics query %s failed: %s", url.path, error)
+            return self.send_json(500, {"error": "Query failed."})
+        self.send_json(200, {"user_id": parts[1], "start": start.isoformat(), "end": end.isoformat(), "rows": rows})
+
+    def send_json(self, status: int, body: Any) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+def serve(host: Optional[str] = None, port: Optional[int] = None) -> None:
+    """
+    Serves the analytics endpoints until interrupted.
+    """
+    host = Config.ANALYTICS_HOST if host is None else host
+    port = Config.ANALYTICS_PORT if port is None else port
+    server = ThreadingHTTPServer((host, port), AnalyticsHandler)
+    logger.info("Serving analytics on http://%s:%s.", host, server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the cached listening stats over HTTP.")
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("--host", default=Config.ANALYTICS_HOST)
+    parser.add_argument("--port", type=int, default=Config.ANALYTICS_PORT)
+    args = parser.parse_args()
+
+    serve(args.host, args.port)
+
+if __name__ == "__main__":
+    main()
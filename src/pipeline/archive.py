@@ -0,0 +1,327 @@
+import os
+import sys
+import gzip
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from settings.config import Config
+from settings.logger import setup_logger
+from pipeline.events import PlayEvent, decode_line, encode_event
+
+logger = setup_logger(Config.LOGGER_NAME, Config.LOGGER_PATH)
+
+MANIFEST_NAME = "manifest.sqlite"
+DAY_MS = 86_400_000
+EPOCH = date(1970, 1, 1)
+
+def play_day(played_at_ms: int) -> date:
+    """
+    Returns the UTC day of a play.
+    """
+    return EPOCH + timedelta(days=played_at_ms // DAY_MS)
+
+class RawArchive:
+    """
+    Gzip-compressed archive of the extracted play events, partitioned by UTC day and user.
+
+    Events are appended to `date=<day>/user=<user>/<run id>-<pid>.ndjson.gz`, one compact `PlayEvent`
+    record per line; every write adds a gzip member, so a file can grow over a run without being
+    rewritten and no two processes append to the same file. A SQLite manifest next to the partitions
+    records each file with its day, user, event count, size and `played_at` range, so replays find
+    their files without listing the directory tree.
+    """
+    def __init__(self, root: Path, compress_level: Optional[int] = None):
+        compress_level = Config.ARCHIVE_COMPRESS_LEVEL if compress_level is None else compress_level
+        self.root = root
+        self.compress_level = compress_level
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS archive_files (
+                    path TEXT PRIMARY KEY,
+                    day TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    events INTEGER NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    min_played_at_ms INTEGER NOT NULL,
+                    max_played_at_ms INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS archive_files_day_idx ON archive_files (day, user_id)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.root / MANIFEST_NAME, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def partition_path(self, day: date, user_id: str) -> Path:
+        return Path(f"date={day.isoformat()}") / f"user={user_id}" / f"{Config.RUN_ID}-{os.getpid()}.ndjson.gz"
+
+    def write(self, events: Iterable[PlayEvent]) -> int:
+        """
+        Appends events to the files of their day and user partitions and records them in the manifest.
+
+        Safe to call from several threads.
+
+        Returns:
+            int: Number of compressed bytes written.
+        """
+        partitions: Dict[Tuple[date, str], List[PlayEvent]] = defaultdict(list)
+        for event in events:
+            partitions[(play_day(event.played_at_ms), event.user_id)].append(event)
+
+        written, manifest_rows = 0, []
+        with self._lock:
+            for (day, user_id), group in partitions.items():
+                relative = self.partition_path(day, user_id)
+                path = self.root / relative
+                path.parent.mkdir(parents=True, exist_ok=True)
+                size = path.stat().st_size if path.exists() else 0
+                with gzip.open(path, "ab", compresslevel=self.compress_level) as file:
+                    file.write("".join(encode_event(event) + "\n" for event in group).encode())
+                new_size = path.stat().st_size
+                written += new_size - size
+
+                played_at = [event.played_at_ms for event in group]
+                manifest_rows.append((relative.as_posix(), day.isoformat(), user_id, len(group), new_size,
+                                      min(played_at), max(played_at), datetime.now(timezone.utc).timestamp()))
+
+            with self._connect() as conn:
+                conn.executemany("""
+                    INSERT INTO archive_files (path, day, user_id, events, bytes, min_played_at_ms,
+                                               max_played_at_ms, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (path) DO UPDATE SET
+                        events = events + excluded.events,
+                        bytes = excluded.bytes,
+                        min_played_at_ms = MIN(min_played_at_ms, excluded.min_played_at_ms),
+                        max_played_at_ms = MAX(max_played_at_ms, excluded.max_played_at_ms),
+                        updated_at = excluded.updated_at
+                """, manifest_rows)
+
+        logger.debug("Archived %s partition(s), %s compressed bytes.", len(partitions), written)
+        return written
+
+    def files(self, start: date, end: date, user_ids: Optional[List[str]] = None) -> Dict[str, List[Tuple[str, Path]]]:
+        """
+        Returns the archived files of the days in [start, end), by day, as (user, path) pairs.
+
+        Args:
+            start (date): First day (inclusive).
+            end (date): Last day (exclusive).
+            user_ids (Optional[List[str]]): Users to include; all users if None.
+        """
+        query = "SELECT day, user_id, path FROM archive_files WHERE day >= ? AND day < ?"
+        params: List[str] = [start.isoformat(), end.isoformat()]
+        if user_ids:
+            query += f" AND user_id IN ({', '.join('?' for _ in user_ids)})"
+            params.extend(user_ids)
+
+        files: Dict[str, List[Tuple[str, Path]]] = defaultdict(list)
+        with self._connect() as conn:
+            for day, user_id, path in conn.execute(query + " ORDER BY day, user_id, path", params):
+                files[day].append((user_id, self.root / path))
+        return dict(files)
+
+    def summary(self) -> List[Tuple[str, int, int, int]]:
+        """
+        Returns (day, users, events, bytes) for every archived day.
+        """
+        with self._connect() as conn:
+            return conn.execute("""
+                SELECT day, COUNT(DISTINCT user_id), SUM(events), SUM(bytes)
+                FROM archive_files GROUP BY day ORDER BY day
+            """).fetchall()
+
+def read_events(paths: Iterable[Path]) -> List[PlayEvent]:
+    """
+    Reads and validates the events of archived files.
+
+    Raises:
+        MalformedEventError: If a file holds a malformed event.
+    """
+    events = []
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            events.extend(decode_line(line) for line in file if line.strip())
+    return events
+
+_archive: Optional[RawArchive] = None
+
+def get_raw_archive() -> Optional[RawArchive]:
+    """
+    Returns the process-wide archive at `Config.ARCHIVE_DIR`, or None if `ARCHIVE_RAW` is disabled.
+    """
+    global _archive
+    if not Config.ARCHIVE_RAW:
+        return None
+    if _archive is None:
+        _archive = RawArchive(Config.ARCHIVE_DIR)
+    return _archive
+
+def delete_plays(conn: Any, table_name: str, start: datetime, end: datetime, user_ids: List[str]) -> int:
+    """
+    Deletes the loaded plays of `user_ids` in [start, end) inside the caller's transaction, so they can be loaded again.
+
+    Returns:
+        int: Number of plays deleted.
+    """
+    from sqlalchemy import bindparam, inspect, text
+
+    if Config.LOAD_SCHEMA == "star":
+        table_name = "fact_play"
+        condition = "user_key IN (SELECT user_key FROM dim_user WHERE user_id IN :users)"
+    else:
+        condition = "user_id IN :users"
+    if not inspect(conn).has_table(table_name):
+        return 0
+
+    table = conn.dialect.identifier_preparer.quote(table_name)
+    statement = text(f"DELETE FROM {table} WHERE played_at >= :start AND played_at < :end AND {condition}")
+    return conn.execute(statement.bindparams(bindparam("users", expanding=True)),
+                        {"start": start.replace(tzinfo=None), "end": end.replace(tzinfo=None),
+                         "users": user_ids}).rowcount
+
+def reprocess_day(day: str, files: List[Tuple[str, str]], database_url: Optional[str] = None,
+                  replace: bool = False) -> Tuple[int, int, int]:
+    """
+    Transforms and loads the archived plays of one day.
+
+    Watermarks are not used to filter the plays: the idempotent load skips rows that are already stored.
+    With `replace`, the day's plays and rollup rows of the archived users are deleted in the load
+    transaction first, so a failed reload leaves the day as it was and the reloaded plays are counted
+    from scratch. Takes plain strings so it can be submitted to a process pool.
+
+    Args:
+        day (str): ISO day.
+        files (List[Tuple[str, str]]): (user, path) of every archived file of the day.
+        database_url (Optional[str]): Target database URL; defaults to `Config.DATABASE_URL`.
+        replace (bool): Whether to delete the loaded plays of the day first.
+
+    Returns:
+        Tuple[int, int, int]: Events read, rows transformed and rows inserted.
+    """
+    from pipeline.rollups import delete_days
+    from pipeline.transform import transform_items
+    from pipeline.load import get_database_engine, load_dataframe
+
+    events = read_events(Path(path) for _, path in files)
+    df = transform_items(events)
+    engine = get_database_engine(database_url)
+    first = date.fromisoformat(day)
+    user_ids = sorted({user_id for user_id, _ in files})
+
+    def delete_day(conn: Any) -> None:
+        start = datetime.combine(first, datetime.min.time())
+        deleted = delete_plays(conn, Config.TABLE_NAME, start, start + timedelta(days=1), user_ids)
+        delete_days(conn, user_ids, first, first + timedelta(days=1))
+        logger.info("Deleted %s loaded plays of %s.", deleted, day)
+
+    inserted = load_dataframe(df, Config.TABLE_NAME, engine, delete_day if replace else None) if not df.empty else 0
+    logger.info("Reprocessed %s: %s events, %s rows, %s inserted.", day, len(events), len(df), inserted)
+    return len(events), len(df), inserted
+
+def reprocess(start: date, end: date, user_ids: Optional[List[str]] = None,
+              max_workers: Optional[int] = None, replace: bool = False,
+              database_url: Optional[str] = None) -> Dict[str, Tuple[int, int, int]]:
+    """
+    Re-derives the loaded plays of [start, end) from the raw archive, one day per task on a process pool.
+
+    Only databases with an idempotent load are supported. With `replace` the loaded plays of the
+    reprocessed days are deleted and loaded again, e.g. after a transform fix; each day is replaced
+    in one transaction together with its rollup rows, so a failed day is left unchanged. The analytics
+    results of the reprocessed users cached in this process are dropped.
+
+    Args:
+        start (date): First day (inclusive).
+        end (date): Last day (exclusive).
+        user_ids (Optional[List[str]]): Users to reprocess; all archived users if None.
+        max_workers (int): Number of days processed at the same time.
+        replace (bool): Whether to replace the plays already loaded instead of only adding missing ones.
+        database_url (Optional[str]): Target database URL; defaults to `Config.DATABASE_URL`.
+
+    Returns:
+        Dict[str, Tuple[int, int, int]]: Events read, rows transformed and rows inserted per day.
+
+    Raises:
+        RuntimeError: If the archive is disabled, the database has no idempotent load or some days failed.
+    """
+    max_workers = Config.REPROCESS_MAX_WORKERS if max_workers is None else max_workers
+    from sqlalchemy.engine import make_url
+    from pipeline.load import IDEMPOTENT_DIALECTS
+
+    archive = get_raw_archive()
+    if archive is None:
+        raise RuntimeError("The raw archive is disabled (ARCHIVE_RAW=false).")
+    backend = make_url(database_url or Config.DATABASE_URL).get_backend_name()
+    if backend not in IDEMPOTENT_DIALECTS:
+        raise RuntimeError(f"Reprocessing needs an idempotent load ({', '.join(IDEMPOTENT_DIALECTS)}), not '{backend}'.")
+
+    days = archive.files(start, end, user_ids)
+    logger.info("Reprocessing %s archived day(s) between %s and %s.", len(days), start, end)
+    if backend == "sqlite":
+        # SQLite allows a single writer; parallel days would only contend for the database lock.
+        max_workers = 1
+
+    results: Dict[str, Tuple[int, int, int]] = {}
+    failed: List[str] = []
+    if days:
+        with ProcessPoolExecutor(max_workers=max(1, min(max_workers, len(days)))) as executor:
+            futures = {executor.submit(reprocess_day, day, [(user_id, str(path)) for user_id, path in files],
+                                       database_url, replace): day
+                       for day, files in days.items()}
+            for future in as_completed(futures):
+                day = futures[future]
+                try:
+                    results[day] = future.result()
+                except Exception as error:
+                    logger.error("Reprocessing %s failed: %s", day, error)
+                    failed.append(day)
+
+    if results:
+        from pipeline.analytics import invalidate_users
+        invalidate_users({user_id for day in results for user_id, _ in days[day]})
+
+    if failed:
+        raise RuntimeError(f"Reprocessing failed for {len(failed)} day(s): {', '.join(sorted(failed))}")
+
+    logger.info("Reprocessing completed: %s rows inserted.", sum(inserted for _, _, inserted in results.values()))
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inspect the raw archive or reprocess archived days.")
+    parser.add_argument("command", choices=["reprocess", "list"])
+    parser.add_argument("--start", type=date.fromisoformat, help="First day to reprocess (inclusive).")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day to reprocess (exclusive).")
+    parser.add_argument("--users", nargs="+", help="Users to reprocess (default: all archived users).")
+    parser.add_argument("--workers", type=int, default=Config.REPROCESS_MAX_WORKERS)
+    parser.add_argument("--replace", action="store_true", help="Delete and reload the plays of the reprocessed days.")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        archive = get_raw_archive()
+        for day, users, events, size in archive.summary() if archive is not None else []:
+            print(f"{day}\t{users} user(s)\t{events} events\t{size} bytes")
+        return
+    if args.start is None or args.end is None:
+        parser.error("reprocess requires --start and --end")
+    try:
+        reprocess(args.start, args.end, args.users, args.workers, args.replace)
+    except RuntimeError as error:
+        logger.error("%s", error)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import os
+import json
+import argparse
+from pathlib import Path
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+from settings.config import Config
+from settings.logger import setup_logger
+
+logger = setup_logger(Config.LOGGER_NAME, Config.LOGGER_PATH)
+
+@dataclass(frozen=True)
+class BackfillChunk:
+    """
+    Half-open UTC time range [start, end) processed as one unit of a backfill.
+    """
+    start: datetime
+    end: datetime
+
+    @property
+    def key(self) -> str:
+        return f"{self.start.isoformat()}/{self.end.isoformat()}"
+
+@dataclass
+class ChunkResult:
+    """
+    Outcome of one backfill chunk.
+    """
+    events: int = 0
+    rows: int = 0
+    inserted: int = 0
+
+def parse_utc(value: str) -> datetime:
+    """
+    Parses an ISO date or datetime; naive values are taken as UTC.
+    """
+    parsed = datetime.fromisoformat(value)
+    return parsed.replace(tzinfo=timezone.utc) if parsed.tzinfo is None else parsed.astimezone(timezone.utc)
+
+def split_range(start: datetime, end: datetime, chunk_days: Optional[int] = None) -> List[BackfillChunk]:
+    """
+    Splits [start, end) into consecutive chunks of `chunk_days` days; the last chunk may be shorter.
+
+    Raises:
+        ValueError: If the range is empty or `chunk_days` is not positive.
+    """
+    chunk_days = Config.BACKFILL_CHUNK_DAYS if chunk_days is None else chunk_days
+    if end <= start:
+        raise ValueError(f"Backfill range is empty: {start.isoformat()} >= {end.isoformat()}.")
+    if chunk_days <= 0:
+        raise ValueError(f"chunk_days must be positive, got {chunk_days}.")
+
+    step = timedelta(days=chunk_days)
+    chunks = []
+    while start < end:
+        chunks.append(BackfillChunk(start, min(start + step, end)))
+        start += step
+    return chunks
+
+class BackfillCheckpoint:
+    """
+    JSON file recording the finished chunks of a backfill, so an interrupted backfill resumes where it stopped.
+
+    The file describes one backfill (its range and users); starting a different backfill replaces it.
+    Only the parent process writes it, atomically through a temporary file.
+    """
+    def __init__(self, path: Path, start: datetime, end: datetime, user_ids: List[str]):
+        self.path = path
+        self.header = {"start": start.isoformat(), "end": end.isoformat(), "users": sorted(user_ids)}
+        self.done: Dict[str, Dict[str, int]] = {}
+
+        if path.exists():
+            state = json.loads(path.read_text(encoding="utf-8"))
+            if {key: state.get(key) for key in self.header} == self.header:
+                self.done = state.get("done", {})
+                logger.info("Resuming backfill: %s chunk(s) already done.", len(self.done))
+            else:
+                logger.warning("Checkpoint %s belongs to another backfill and will be replaced.", path)
+
+    def is_done(self, chunk: BackfillChunk) -> bool:
+        return chunk.key in self.done
+
+    def mark_done(self, chunk: BackfillChunk, result: ChunkResult) -> None:
+        self.done[chunk.key] = asdict(result)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps({**self.header, "done": self.done}, indent=4), encoding="utf-8")
+        os.replace(temp_path, self.path)
+
+def require_idempotent_load(database_url: Optional[str] = None) -> str:
+    """
+    Checks that loads into the target database skip plays already stored, as backfill chunks may overlap
+    stored plays or be retried.
+
+    Returns:
+        str: Backend name of the database.
+
+    Raises:
+        RuntimeError: If the database is neither PostgreSQL nor SQLite.
+    """
+    from sqlalchemy.engine import make_url
+    from pipeline.load import IDEMPOTENT_DIALECTS
+
+    backend = make_url(database_url or Config.DATABASE_URL).get_backend_name()
+    if backend not in IDEMPOTENT_DIALECTS:
+        raise RuntimeError(f"Backfill needs an idempotent load ({', '.join(IDEMPOTENT_DIALECTS)}), not '{backend}'.")
+    return backend
+
+def run_chunk(start: str, end: str, user_ids: List[str], database_url: Optional[str] = None,
+              active_chunks: Optional[int] = None) -> ChunkResult:
+    """
+    Runs extract, transform and load for the plays of `user_ids` in [start, end).
+
+    Watermarks are not used to filter the plays: the load skips rows that are already stored, which
+    is checked first. The process's client gets an equal share of the API rate budget of the
+    `active_chunks` chunks running at the same time.
+    Takes ISO strings so it can be submitted to a process pool or called from an Airflow task.
+
+    Args:
+        start (str): ISO start of the chunk (inclusive, UTC if naive).
+        end (str): ISO end of the chunk (exclusive, UTC if naive).
+        user_ids (List[str]): Users to backfill.
+        database_url (Optional[str]): Target database URL; defaults to `Config.DATABASE_URL`.
+        active_chunks (Optional[int]): Chunks running at the same time; defaults to `Config.BACKFILL_MAX_WORKERS`.
+
+    Returns:
+        ChunkResult: Event, row and insert counts of the chunk.
+
+    Raises:
+        RuntimeError: If the database is neither PostgreSQL nor SQLite, or if extraction failed for
+            some users; nothing is loaded for the chunk then.
+    """
+    from pipeline.archive import get_raw_archive
+    from pipeline.extract import extract_users, merge_user_tracks
+    from pipeline.transform import transform_items
+    from pipeline.load import get_database_engine, load_dataframe
+    from pipeline.shards import share_rate_budget
+
+    require_idempotent_load(database_url)
+    share_rate_budget(Config.BACKFILL_MAX_WORKERS if active_chunks is None else active_chunks)
+
+    chunk = BackfillChunk(parse_utc(start), parse_utc(end))
+    after = int(chunk.start.timestamp() * 1000)
+    extraction = extract_users(user_ids, {user_id: after for user_id in user_ids},
+                               before=int(chunk.end.timestamp() * 1000))
+    if extraction.failed_users:
+        raise RuntimeError(f"Extraction failed for users: {', '.join(extraction.failed_users)}")
+
+    items = merge_user_tracks(extraction.payloads)["items"]
+    result = ChunkResult(events=len(items))
+    archive = get_raw_archive()
+    if archive is not None and items:
+        archive.write(items)
+    if items:
+        df = transform_items(items)
+        result.rows = len(df)
+        if not df.empty:
+            result.inserted = load_dataframe(df, Config.TABLE_NAME, get_database_engine(database_url))
+
+    logger.info("Backfill chunk %s: %s events, %s rows, %s inserted.",
+                chunk.key, result.events, result.rows, result.inserted)
+    return result
+
+def backfill(start: datetime, end: datetime, user_ids: Optional[List[str]] = None,
+             chunk_days: Optional[int] = None, max_workers: Optional[int] = None,
+             state_path: Optional[Path] = None, database_url: Optional[str] = None) -> Dict[str, ChunkResult]:
+    """
+    Backfills a time range by running the pipeline for its chunks on a process pool.
+
+    Finished chunks are checkpointed to `state_path` as they complete, so rerunning the same backfill
+    after a crash or kill only processes the remaining chunks. Note that the Spotify API only serves
+    the most recent plays of each user, so chunks older than that history come back empty.
+
+    Args:
+        start (datetime): Start of the range (inclusive).
+        end (datetime): End of the range (exclusive).
+        user_ids (Optional[List[str]]): Users to backfill; defaults to `Config.USER_IDS`.
+        chunk_days (int): Length of a chunk in days.
+        max_workers (int): Number of chunks processed at the same time.
+        state_path (Path): Path of the checkpoint file.
+        database_url (Optional[str]): Target database URL; defaults to `Config.DATABASE_URL`.
+
+    Returns:
+        Dict[str, ChunkResult]: Result of every chunk processed by this call, keyed by chunk.
+
+    Raises:
+        RuntimeError: If some chunks failed (the successful ones stay checkpointed), or if the
+            database is neither PostgreSQL nor SQLite, whose loads skip plays already stored.
+    """
+    chunk_days = Config.BACKFILL_CHUNK_DAYS if chunk_days is None else chunk_days
+    max_workers = Config.BACKFILL_MAX_WORKERS if max_workers is None else max_workers
+    state_path = Config.BACKFILL_STATE_PATH if state_path is None else state_path
+    user_ids = user_ids or Config.USER_IDS
+    chunks = split_range(start, end, chunk_days)
+    checkpoint = BackfillCheckpoint(state_path, start, end, user_ids)
+    pending = [chunk for chunk in chunks if not checkpoint.is_done(chunk)]
+    logger.info("Backfilling %s of %s chunk(s) for %s user(s).", len(pending), len(chunks), len(user_ids))
+
+    if require_idempotent_load(database_url) == "sqlite":
+        # SQLite allows a single writer; parallel chunks would only contend for the database lock.
+        max_workers = 1
+
+    results: Dict[str, ChunkResult] = {}
+    failed: List[str] = []
+    if pending:
+        workers = max(1, min(max_workers, len(pending)))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(run_chunk, chunk.start.isoformat(), chunk.end.isoformat(), user_ids,
+                                       database_url, workers): chunk
+                       for chunk in pending}
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    results[chunk.key] = future.result()
+                    checkpoint.mark_done(chunk, results[chunk.key])
+                except Exception as error:
+                    logger.error("Backfill chunk %s failed: %s", chunk.key, error)
+                    failed.append(chunk.key)
+
+    if failed:
+        raise RuntimeError(f"Backfill failed for {len(failed)} chunk(s): {', '.join(sorted(failed))}")
+
+    logger.info("Backfill completed: %s rows inserted.", sum(result.inserted for result in results.values()))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the Spotify playlog for a time range.")
+    parser.add_argument("--start", required=True, help="ISO start date or datetime (inclusive, UTC).")
+    parser.add_argument("--end", required=True, help="ISO end date or datetime (exclusive, UTC).")
+    parser.add_argument("--users", nargs="+", help="Users to backfill (defaults to SPOTIFY_USER_IDS).")
+    parser.add_argument("--chunk-days", type=int, default=Config.BACKFILL_CHUNK_DAYS)
+    parser.add_argument("--workers", type=int, default=Config.BACKFILL_MAX_WORKERS)
+    args = parser.parse_args()
+
+    backfill(parse_utc(args.start), parse_utc(args.end), args.users, args.chunk_days, args.workers)
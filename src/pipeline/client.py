@@ -0,0 +1,200 @@
+import time
+import random
+import threading
+import requests
+from typing import Any, Optional
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from settings.config import Config
+from settings.logger import setup_logger
+from settings.metrics import count, instrument
+
+logger = setup_logger(Config.LOGGER_NAME, Config.LOGGER_PATH)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting the request rate shared by every caller of a client.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. A 429 response
+    pauses the whole bucket for the `Retry-After` period, so concurrent workers back off together.
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self) -> None:
+        """
+        Blocks until a token is available and consumes it.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stops handing out tokens for the given number of seconds and drains the bucket.
+
+        Args:
+            seconds (float): Duration of the pause, typically Spotify's Retry-After value.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0
+            self._updated_at = self._paused_until
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a Retry-After header given either in seconds or as an HTTP date.
+
+    Args:
+        value (Optional[str]): Raw header value.
+
+    Returns:
+        Optional[float]: Number of seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class SpotifyClient:
+    """
+    HTTP client with a keep-alive connection pool, capped exponential backoff and client-side rate limiting.
+    """
+    def __init__(self,
+                 pool_size: Optional[int] = None,
+                 max_retries: Optional[int] = None,
+                 backoff_factor: Optional[float] = None,
+                 backoff_max: Optional[float] = None,
+                 rate_limit: Optional[float] = None,
+                 burst: Optional[float] = None,
+                 timeout: Optional[float] = None):
+        pool_size = Config.HTTP_POOL_SIZE if pool_size is None else pool_size
+        max_retries = Config.HTTP_MAX_RETRIES if max_retries is None else max_retries
+        backoff_factor = Config.HTTP_BACKOFF_FACTOR if backoff_factor is None else backoff_factor
+        backoff_max = Config.HTTP_BACKOFF_MAX if backoff_max is None else backoff_max
+        rate_limit = Config.HTTP_RATE_LIMIT if rate_limit is None else rate_limit
+        burst = Config.HTTP_RATE_BURST if burst is None else burst
+        timeout = Config.HTTP_TIMEOUT if timeout is None else timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate_limit, burst)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Returns the full-jitter exponential backoff delay for the given attempt, capped at `backoff_max`.
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * 2 ** attempt))
+
+    @instrument("client.request")
+    def request(self, method: str, url: str, retry: bool = True, **kwargs: Any) -> requests.Response:
+        """
+        Sends a request, retrying connection errors, 5xx responses and 429 responses.
+
+        Args:
+            method (str): HTTP method.
+            url (str): Target URL.
+            retry (bool): Whether to retry; disable it for requests that must not be sent twice,
+                such as exchanging a single-use authorization code.
+            **kwargs: Extra arguments passed to `requests.Session.request`.
+
+        Returns:
+            requests.Response: The last response received; callers still call `raise_for_status()`.
+
+        Raises:
+            requests.RequestException: If the connection keeps failing after all retries.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        max_retries = self.max_retries if retry else 0
+
+        for attempt in range(max_retries + 1):
+            self.bucket.acquire()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                if attempt == max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                count(retries=1)
+                logger.warning("%s %s failed (%s), retrying in %.2fs.", method, url, error, delay)
+                time.sleep(delay)
+                continue
+
+            if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                return response
+
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            delay = retry_after if retry_after is not None else self.backoff(attempt)
+            if response.status_code == 429:
+                self.bucket.pause(delay)
+            count(retries=1)
+            logger.warning("%s %s returned %s, retrying in %.2fs.", method, url, response.status_code, delay)
+            response.close()
+            time.sleep(delay)
+
+        return response
+
+    def get(self, url: str, retry: bool = True, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, retry, **kwargs)
+
+    def post(self, url: str, retry: bool = True, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, retry, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "SpotifyClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+_client: Optional[SpotifyClient] = None
+_client_lock = threading.Lock()
+
+def get_client() -> SpotifyClient:
+    """
+    Returns the process-wide client, creating it on first use.
+
+    Returns:
+        SpotifyClient: Client shared by token refreshes and data requests.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SpotifyClient()
+    return _client
@@ -0,0 +1,136 @@
+import time
+import sqlite3
+import hashlib
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+from settings.config import Config
+from pipeline.events import PlayEvent
+
+# Stays well below SQLite's limit on bound parameters per statement.
+QUERY_CHUNK_SIZE = 500
+
+def event_key(user_id: Any, played_at_s: int, track_id: Any) -> int:
+    """
+    Returns the 64-bit content hash of a play: its user, `played_at` in whole seconds and track ID.
+
+    Transform floors `played_at` to the second, so a raw event and the row loaded from it hash alike.
+    """
+    track_id = track_id if isinstance(track_id, str) else ""
+    digest = hashlib.blake2b(f"{user_id}\x1f{played_at_s}\x1f{track_id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+def play_key(event: PlayEvent) -> Tuple[int, int]:
+    """
+    Returns the content hash and `played_at` (Unix milliseconds, floored to the second) of a play event.
+    """
+    played_at_s = event.played_at_ms // 1000
+    return event_key(event.user_id, played_at_s, event.track_id), played_at_s * 1000
+
+def frame_keys(df: Any) -> List[Tuple[int, int]]:
+    """
+    Returns the content hash and `played_at` (Unix milliseconds) of every transformed row with a `played_at`.
+    """
+    import pandas as pd
+
+    played_at = pd.to_datetime(df["played_at"], errors="coerce", utc=True)
+    played_at_s = (played_at - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)
+    return [(event_key(user_id, int(seconds), track_id), int(seconds) * 1000)
+            for user_id, seconds, track_id in zip(df["user_id"], played_at_s, df["track_id"]) if pd.notna(seconds)]
+
+class SeenEventIndex:
+    """
+    On-disk index of the content hashes of the plays already loaded.
+
+    Extract consults it to emit only unseen events; keys are added only once their rows are loaded,
+    so a failed transform or load never hides plays from the next run. Entries whose plays are older
+    than `SEEN_EVENTS_RETENTION_DAYS` are pruned, since the API no longer returns them.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS seen_events (
+                    event_key INTEGER PRIMARY KEY,
+                    played_at_ms INTEGER NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS seen_events_played_at_idx ON seen_events (played_at_ms)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def seen(self, keys: Iterable[int]) -> set[int]:
+        """
+        Returns the given keys that are already in the index.
+        """
+        keys = list(set(keys))
+        found: set[int] = set()
+        with self._connect() as conn:
+            for start in range(0, len(keys), QUERY_CHUNK_SIZE):
+                chunk = keys[start:start + QUERY_CHUNK_SIZE]
+                placeholders = ", ".join("?" for _ in chunk)
+                found.update(row[0] for row in conn.execute(
+                    f"SELECT event_key FROM seen_events WHERE event_key IN ({placeholders})", chunk))
+        return found
+
+    def unseen(self, events: List[PlayEvent]) -> List[PlayEvent]:
+        """
+        Filters play events down to those not loaded yet, dropping repeats within `events` too.
+        """
+        keys = [play_key(event)[0] for event in events]
+        seen = self.seen(keys)
+        fresh = []
+        for event, key in zip(events, keys):
+            if key in seen:
+                continue
+            seen.add(key)
+            fresh.append(event)
+        return fresh
+
+    def add(self, keys: Iterable[Tuple[int, int]]) -> None:
+        """
+        Adds (content hash, `played_at` in Unix milliseconds) pairs; known keys are ignored.
+        """
+        with self._connect() as conn:
+            conn.executemany("INSERT OR IGNORE INTO seen_events (event_key, played_at_ms) VALUES (?, ?)", keys)
+
+    def prune(self, retention_days: Optional[int] = None) -> int:
+        """
+        Removes the keys of plays older than `retention_days`.
+
+        Returns:
+            int: Number of keys removed.
+        """
+        retention_days = Config.SEEN_EVENTS_RETENTION_DAYS if retention_days is None else retention_days
+        cutoff = int((time.time() - retention_days * 86400) * 1000)
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM seen_events WHERE played_at_ms < ?", (cutoff,)).rowcount
+
+    def record(self, df: Any) -> None:
+        """
+        Adds the keys of loaded rows and prunes the expired ones.
+        """
+        self.add(frame_keys(df))
+        self.prune()
+
+_index: Optional[SeenEventIndex] = None
+
+def get_seen_index() -> Optional[SeenEventIndex]:
+    """
+    Returns the process-wide index stored next to the watermarks at `Config.STATE_PATH`,
+    or None if `DEDUP_EVENTS` is disabled.
+    """
+    global _index
+    if not Config.DEDUP_EVENTS:
+        return None
+    if _index is None:
+        _index = SeenEventIndex(Config.STATE_PATH)
+    return _index
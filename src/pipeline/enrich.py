@@ -0,0 +1,232 @@
+import json
+import time
+import sqlite3
+import requests
+from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from settings.config import Config
+from settings.logger import setup_logger
+from pipeline.client import SpotifyClient, get_client
+from pipeline.events import PlayEvent, decode_record
+from pipeline.extract import get_access_token, build_data_request_payload
+from pipeline.transform import iter_raw_batches, load_data
+
+logger = setup_logger(Config.LOGGER_NAME, Config.LOGGER_PATH)
+
+BATCH_SIZE = 50
+DROPPED_FIELDS = ("available_markets",)
+
+class MetadataCache:
+    """
+    Local SQLite cache of Spotify catalog objects (tracks, artists) with time-to-live eviction.
+    """
+    def __init__(self, path: Path, ttl: Optional[float] = None):
+        ttl = Config.METADATA_TTL if ttl is None else ttl
+        self.path = path
+        self.ttl = ttl
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS metadata (
+                    kind TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (kind, id)
+                )
+            """)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_many(self, kind: str, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the cached objects of the given kind that are younger than the TTL.
+        """
+        ids = list(ids)
+        found: Dict[str, Dict[str, Any]] = {}
+        fresh_after = time.time() - self.ttl
+        with self._connect() as conn:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                rows = conn.execute(f"""
+                    SELECT id, payload FROM metadata
+                    WHERE kind = ? AND fetched_at > ? AND id IN ({placeholders})
+                """, [kind, fresh_after, *chunk]).fetchall()
+                found.update((object_id, json.loads(payload)) for object_id, payload in rows)
+        return found
+
+    def put_many(self, kind: str, objects: Dict[str, Dict[str, Any]]) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO metadata (kind, id, payload, fetched_at) VALUES (?, ?, ?, ?)",
+                             [(kind, object_id, json.dumps(obj, separators=(",", ":")), now)
+                              for object_id, obj in objects.items()])
+
+    def evict_expired(self) -> int:
+        """
+        Deletes entries older than the TTL and returns how many were removed.
+        """
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM metadata WHERE fetched_at <= ?", (time.time() - self.ttl,)).rowcount
+
+_cache: Optional[MetadataCache] = None
+
+def get_metadata_cache() -> MetadataCache:
+    """
+    Returns the process-wide metadata cache stored at `Config.METADATA_CACHE_PATH`.
+    """
+    global _cache
+    if _cache is None:
+        _cache = MetadataCache(Config.METADATA_CACHE_PATH)
+    return _cache
+
+_skip_logged = False
+
+def enrichment_enabled() -> bool:
+    """
+    Tells whether to enrich: `ENRICH_METADATA=true` and `LOAD_SCHEMA=star`.
+
+    Only the star schema stores metadata (artist genres in `dim_artist`); the flat playlog has no
+    column for it, so enriching for it would spend API calls for nothing.
+    """
+    global _skip_logged
+    if not Config.ENRICH_METADATA:
+        return False
+    if Config.LOAD_SCHEMA != "star":
+        if not _skip_logged:
+            logger.warning("Skipping metadata enrichment: only LOAD_SCHEMA=star stores it, not '%s'.", Config.LOAD_SCHEMA)
+            _skip_logged = True
+        return False
+    return True
+
+def catalog_access_token() -> str:
+    """
+    Returns the access token used for catalog lookups, that of the first configured user.
+
+    Track and artist objects are the same for every user, so one token serves a whole batch, even
+    one mixing several users' plays; the requests go through the shared client and its rate limit.
+    """
+    return get_access_token(Config.USER_IDS[0])
+
+def collect_ids(items: Iterable[PlayEvent]) -> Dict[str, set[str]]:
+    """
+    Collects the distinct track and artist IDs referenced by play events.
+
+    Args:
+        items (Iterable[PlayEvent]): Play events.
+
+    Returns:
+        Dict[str, set[str]]: Distinct IDs under "tracks" and "artists".
+    """
+    ids: Dict[str, set[str]] = {"tracks": set(), "artists": set()}
+    for event in items:
+        ids["tracks"].add(event.track_id)
+        ids["artists"].add(event.artist_id)
+        ids["artists"].update(event.artist_ids)
+    return ids
+
+def fetch_several(kind: str, ids: List[str], headers: Dict[str, str],
+                  client: Optional[SpotifyClient] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetches catalog objects through Spotify's multi-ID endpoint (`/tracks?ids=` or `/artists?ids=`).
+
+    Args:
+        kind (str): "tracks" or "artists".
+        ids (List[str]): At most `BATCH_SIZE` IDs.
+        headers (Dict[str, str]): Authorization headers.
+        client (Optional[SpotifyClient]): Client to send the request through; defaults to the shared one.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: The returned objects by ID; unknown IDs are omitted.
+
+    Raises:
+        requests.RequestException: If the request fails.
+    """
+    try:
+        response = (client or get_client()).get(f"{Config.SPOTIFY_API_URL}/{kind}", params={"ids": ",".join(ids)}, headers=headers)
+        response.raise_for_status()
+    except requests.RequestException as error:
+        logger.error("Failed to fetch %s metadata: %s", kind, error)
+        raise
+
+    objects: Dict[str, Dict[str, Any]] = {}
+    for obj in response.json().get(kind, []):
+        if obj is None:
+            continue
+        for dropped in DROPPED_FIELDS:
+            obj.pop(dropped, None)
+            (obj.get("album") or {}).pop(dropped, None)
+        objects[obj["id"]] = obj
+    return objects
+
+def enrich_items(items: Iterable[PlayEvent], access_token: Optional[str] = None,
+                 client: Optional[SpotifyClient] = None,
+                 max_workers: Optional[int] = None) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """
+    Resolves full track and artist metadata for play events, fetching each object at most once per TTL.
+
+    IDs are deduplicated across the whole batch, served from the metadata cache when fresh, and the
+    rest are fetched in chunks of `BATCH_SIZE` through the multi-ID endpoints.
+
+    Args:
+        items (Iterable[PlayEvent]): Play events.
+        access_token (Optional[str]): Any valid user access token; defaults to `catalog_access_token()`.
+        client (Optional[SpotifyClient]): Client to send the requests through; defaults to the shared one.
+        max_workers (int): Maximum number of chunk requests in flight.
+
+    Returns:
+        Dict[str, Dict[str, Dict[str, Any]]]: Track and artist objects by ID under "tracks" and "artists".
+    """
+    max_workers = Config.EXTRACT_MAX_WORKERS if max_workers is None else max_workers
+    cache = get_metadata_cache()
+    headers = build_data_request_payload(access_token or catalog_access_token()).headers
+    metadata: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    for kind, ids in collect_ids(items).items():
+        cached = cache.get_many(kind, ids)
+        missing = sorted(ids - cached.keys())
+        chunks = [missing[start:start + BATCH_SIZE] for start in range(0, len(missing), BATCH_SIZE)]
+        logger.info("%s: %s cached, fetching %s in %s request(s).", kind, len(cached), len(missing), len(chunks))
+
+        fetched: Dict[str, Dict[str, Any]] = {}
+        if chunks:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+                for objects in executor.map(lambda chunk: fetch_several(kind, chunk, headers, client), chunks):
+                    fetched.update(objects)
+            cache.put_many(kind, fetched)
+
+        metadata[kind] = {**cached, **fetched}
+
+    return metadata
+
+def enrich():
+    logger.info("Starting metadata enrichment process.")
+    if not enrichment_enabled():
+        logger.info("Metadata enrichment is disabled.")
+        return
+    try:
+        if Config.RAW_DATA_FORMAT == "json":
+            items = map(decode_record, load_data(Config.SPOTIFY_RAW_DATA_PATH).get("items", []))
+        else:
+            items = (item for batch in iter_raw_batches(Config.SPOTIFY_RAW_EVENTS_PATH) for item in batch)
+        metadata = enrich_items(items)
+        evicted = get_metadata_cache().evict_expired()
+        logger.info("Metadata enrichment completed: %s tracks, %s artists, %s expired entries evicted.",
+                    len(metadata['tracks']), len(metadata['artists']), evicted)
+    except Exception as error:
+        logger.critical("Metadata enrichment failed: %s", error, exc_info=True)
+        raise
+
+if __name__ == "__main__":
+    enrich()
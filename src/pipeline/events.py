@@ -0,0 +1,167 @@
+import json
+from datetime import datetime, timedelta, timezone
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from settings.config import Config
+from settings.logger import SAMPLED, setup_logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = setup_logger(Config.LOGGER_NAME, Config.LOGGER_PATH)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+class MalformedEventError(ValueError):
+    """
+    Raised when a play event lacks a field the pipeline keeps, or holds one of the wrong type.
+    """
+
+@dataclass(frozen=True, slots=True)
+class PlayEvent:
+    """
+    One play, holding only the fields the pipeline keeps.
+
+    Events are decoded from the items of the recently played endpoint by `decode_item` and are
+    what extract writes to the raw file and transform reads back, so no nested track, album or
+    artist objects are kept in memory.
+    """
+    user_id: str
+    played_at_ms: int
+    track_id: str
+    song_name: str
+    duration_ms: int
+    popularity: Optional[int]
+    artist_id: str
+    artist_name: str
+    artist_ids: Tuple[str, ...] = ()
+
+    def to_record(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in FIELD_NAMES}
+
+FIELD_NAMES = tuple(field.name for field in fields(PlayEvent))
+
+# Expected type of every field; `bool` is excluded explicitly since it is a subclass of int.
+FIELD_TYPES: Dict[str, Union[type, Tuple[type, ...]]] = {
+    "user_id": str, "played_at_ms": int, "track_id": str, "song_name": str, "duration_ms": int,
+    "popularity": (int, type(None)), "artist_id": str, "artist_name": str, "artist_ids": tuple,
+}
+
+def validate(event: PlayEvent) -> PlayEvent:
+    """
+    Checks the type of every field and that the IDs are not empty.
+
+    Raises:
+        MalformedEventError: If a field has the wrong type or an ID is empty.
+    """
+    for name, expected in FIELD_TYPES.items():
+        value = getattr(event, name)
+        if not isinstance(value, expected) or isinstance(value, bool):
+            raise MalformedEventError(f"Play event field '{name}' has invalid value {value!r}.")
+    if not event.track_id or not event.artist_id or not event.user_id:
+        raise MalformedEventError(f"Play event has an empty ID: {event!r}.")
+    return event
+
+def parse_played_at(played_at: str) -> int:
+    """
+    Converts an ISO 8601 `played_at` to Unix milliseconds; timestamps without an offset are taken as UTC.
+    """
+    moment = datetime.fromisoformat(played_at)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return (moment - EPOCH) // timedelta(milliseconds=1)
+
+def artist_ids(track: Dict[str, Any]) -> Tuple[str, ...]:
+    """
+    Returns the distinct IDs of the track's and its album's artists, for enrichment.
+    """
+    ids = [artist.get("id") for artist in (track.get("artists") or []) + (track["album"].get("artists") or [])]
+    return tuple(dict.fromkeys(artist_id for artist_id in ids if isinstance(artist_id, str) and artist_id))
+
+def decode_item(item: Dict[str, Any], user_id: str) -> PlayEvent:
+    """
+    Decodes one item of a recently played response into a `PlayEvent`.
+
+    The artist is the first artist of the track's album, as in the loaded tables.
+
+    Args:
+        item (Dict[str, Any]): One entry of the "items" list of the Spotify response.
+        user_id (str): User the play belongs to.
+
+    Returns:
+        PlayEvent: The validated event.
+
+    Raises:
+        MalformedEventError: If the item lacks a kept field or holds one of the wrong type.
+    """
+    try:
+        track = item["track"]
+        artist = track["album"]["artists"][0]
+        event = PlayEvent(user_id, parse_played_at(item["played_at"]), track["id"], track["name"],
+                          track["duration_ms"], track.get("popularity"), artist["id"], artist["name"],
+                          artist_ids(track))
+    except (KeyError, IndexError, TypeError, AttributeError, ValueError) as error:
+        raise MalformedEventError(f"Malformed play event ({error!r}): {str(item)[:200]}") from error
+    validate(event)
+    logger.debug("Decoded play event: %s", event, extra=SAMPLED)
+    return event
+
+def is_local(item: Dict[str, Any]) -> bool:
+    track = item.get("track")
+    return isinstance(track, dict) and bool(track.get("is_local"))
+
+def decode_items(items: Iterable[Dict[str, Any]], user_id: str) -> List[PlayEvent]:
+    """
+    Decodes the items of a recently played response, skipping plays of local files.
+
+    Local files have no Spotify ID, so they cannot be enriched, deduplicated or joined to the catalog.
+
+    Raises:
+        MalformedEventError: If any other item is malformed.
+    """
+    events = []
+    for item in items:
+        if is_local(item):
+            logger.debug("Skipping play of local file at %s.", item.get("played_at"))
+            continue
+        events.append(decode_item(item, user_id))
+    return events
+
+def decode_record(record: Dict[str, Any]) -> PlayEvent:
+    """
+    Decodes one stored event: a record written by `encode_event`, or a full API item
+    (as in raw files from before events were compacted) tagged with its "user_id".
+
+    Raises:
+        MalformedEventError: If the record is malformed.
+    """
+    if "track" in record:
+        return decode_item(record, record.get("user_id", Config.DEFAULT_USER_ID))
+    try:
+        event = PlayEvent(**{**record, "artist_ids": tuple(record.get("artist_ids") or ())})
+    except TypeError as error:
+        raise MalformedEventError(f"Malformed play event record ({error}): {str(record)[:200]}") from error
+    return validate(event)
+
+def decode_line(line: Union[str, bytes]) -> PlayEvent:
+    """
+    Decodes one line of a raw events file, with orjson when it is installed.
+
+    Raises:
+        json.JSONDecodeError: If the line is not valid JSON.
+        MalformedEventError: If the event is malformed.
+    """
+    record = orjson.loads(line) if orjson is not None else json.loads(line)
+    if not isinstance(record, dict):
+        raise MalformedEventError(f"Play event is not an object: {str(record)[:200]}")
+    return decode_record(record)
+
+def encode_event(event: PlayEvent) -> str:
+    """
+    Encodes an event as one compact JSON line (without the newline).
+    """
+    if orjson is not None:
+        return orjson.dumps(event).decode()
+    return json.dumps(event.to_record(), separators=(",", ":"))
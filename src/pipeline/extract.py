@@ -1,11 +1,21 @@
 import json
+import time
 import base64
 import requests
 from pathlib import Path
-from typing import Dict, Any
+import threading
+from typing import Dict, Any, Callable, List, Optional
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from settings.config import Config
 from settings.logger import setup_logger
+from settings.metrics import count, flush, instrument
+from pipeline.client import SpotifyClient, get_client
+from authentication.cache import AccessToken, get_token_cache
+from pipeline.state import get_watermark_store
+from pipeline.dedup import SeenEventIndex, get_seen_index
+from pipeline.events import PlayEvent, decode_items, encode_event
+from pipeline.archive import RawArchive, get_raw_archive
 
 logger = setup_logger(Config.LOGGER_NAME, Config.LOGGER_PATH)
 
@@ -24,6 +34,15 @@ class DataRequestPayload:
     """
     headers: dict[str, str]
 
+@dataclass
+class ExtractionResult:
+    """
+    Outcome of a multi-user extraction: merged responses per user and the users that failed.
+    """
+    payloads: Dict[str, Dict[str, Any]]
+    failed_users: List[str]
+
+@instrument()
 def load_refresh_token(token_path: str) -> str:
     """
     Loads the refresh token from a JSON file.
@@ -38,12 +57,12 @@ def load_refresh_token(token_path: str) -> str:
         RuntimeError: If the file is not found or the 'refresh_token' key is missing.
     """
     try:
-        logger.debug(f"Loading refresh token.")
+        logger.debug("Loading refresh token.")
         with open(token_path, encoding="utf-8") as file:
             refresh_token = json.load(file)["refresh_token"]
         logger.info("Refresh token loaded successfully.")
     except (FileNotFoundError, KeyError) as error:
-        logger.error(f"Failed to load refresh token from {token_path}: {error}")
+        logger.error("Failed to load refresh token from %s: %s", token_path, error)
         raise
 
     return refresh_token
@@ -77,40 +96,76 @@ def build_token_request_payload(client_id: str, client_secret: str, refresh_toke
         return TokenRequestPayload(headers=headers, data=data)
 
     except Exception as error:
-        logger.error(f"Failed to build token request payload: {error}", exc_info=True)
+        logger.error("Failed to build token request payload: %s", error, exc_info=True)
         raise
 
-def refresh_access_token(payload: TokenRequestPayload) -> str:
+@instrument()
+def request_access_token(payload: TokenRequestPayload, client: Optional[SpotifyClient] = None) -> AccessToken:
     """
     Requests a new Spotify access token using the provided refresh token payload.
 
     Args:
         payload (TokenRequestPayload): Contains the headers and data needed for the token request.
+        client (Optional[SpotifyClient]): Client to send the request through; defaults to the shared one.
 
     Returns:
-        str: The new access token returned by Spotify.
+        AccessToken: The new access token, its expiry and the (possibly rotated) refresh token.
 
     Raises:
         RuntimeError: If the HTTP request fails or returns a non-success status.
         ValueError: If the response does not contain an access token.
     """
     logger.info("Requesting new access token from Spotify.")
-    url = "https://accounts.spotify.com/api/token"
+    url = f"{Config.SPOTIFY_ACCOUNTS_URL}/api/token"
 
     try:
-        response = requests.post(url, headers = payload.headers, data = payload.data)
+        response = (client or get_client()).post(url, headers = payload.headers, data = payload.data)
         response.raise_for_status()
         logger.info("Access token refreshed successfully.")
     except requests.RequestException as error:
-        logger.error(f"Failed to refresh access token: {error}")
+        logger.error("Failed to refresh access token: %s", error)
         raise
     
-    new_access_token = response.json()["access_token"]
+    tokens = response.json()
+    new_access_token = tokens.get("access_token")
     if not new_access_token:
         logger.error("No access token found in Spotify's response.")
-        raise
+        raise ValueError("No access token found in Spotify's response.")
+
+    return AccessToken(access_token = new_access_token,
+                       refresh_token = tokens.get("refresh_token") or payload.data["refresh_token"],
+                       expires_at = time.time() + float(tokens.get("expires_in", 3600)))
+
+def refresh_access_token(payload: TokenRequestPayload, client: Optional[SpotifyClient] = None) -> str:
+    """
+    Requests a new Spotify access token using the provided refresh token payload.
+
+    Args:
+        payload (TokenRequestPayload): Contains the headers and data needed for the token request.
+        client (Optional[SpotifyClient]): Client to send the request through; defaults to the shared one.
+
+    Returns:
+        str: The new access token returned by Spotify.
+    """
+    return request_access_token(payload, client).access_token
+
+@instrument()
+def get_access_token(user_id: str, client: Optional[SpotifyClient] = None) -> str:
+    """
+    Returns a valid access token for the user from the token cache, refreshing it only near expiry.
+
+    Args:
+        user_id (str): User whose token is requested.
+        client (Optional[SpotifyClient]): Client used if a refresh is needed.
+
+    Returns:
+        str: An access token valid for at least `Config.TOKEN_REFRESH_MARGIN` seconds.
+    """
+    def refresh(refresh_token: str) -> AccessToken:
+        token_payload = build_token_request_payload(Config.CLIENT_ID, Config.CLIENT_SECRET, refresh_token)
+        return request_access_token(token_payload, client)
 
-    return new_access_token
+    return get_token_cache().get_access_token(user_id, refresh, Config.refresh_token_path(user_id), load_refresh_token)
 
 def build_data_request_payload(access_token: str) -> DataRequestPayload:
     """
@@ -133,40 +188,147 @@ def build_data_request_payload(access_token: str) -> DataRequestPayload:
         return DataRequestPayload(headers=headers)
 
     except Exception as error:
-        logger.error(f"Failed to build data request payload: {error}", exc_info=True)
+        logger.error("Failed to build data request payload: %s", error, exc_info=True)
         raise
 
-def get_recently_played_tracks(yesterday_unix_timestamp: str, payload: DataRequestPayload) -> Dict[str, Any]:
+def recently_played_url() -> str:
+    return f"{Config.SPOTIFY_API_URL}/me/player/recently-played"
+
+@instrument()
+def get_recently_played_tracks(yesterday_unix_timestamp: str, payload: DataRequestPayload,
+                               client: Optional[SpotifyClient] = None,
+                               max_pages: Optional[int] = None,
+                               on_page: Optional[Callable[[List[PlayEvent]], None]] = None,
+                               user_id: Optional[str] = None, before: Optional[int] = None) -> Dict[str, Any]:
     """
     Retrieves the list of tracks recently played by the user after a specified Unix timestamp.
 
+    Follows the `next` links of the cursor-paginated response until the window is exhausted
+    (an empty page, no `next` link or a page reaching back to the requested timestamp) or `max_pages`
+    pages have been fetched. Plays at or before the timestamp are dropped. With `before`, plays at or after it
+    are dropped too, and pagination stops at the first page reaching it.
+    Each page is decoded into `PlayEvent`s as soon as it arrives, so only the kept fields outlive the
+    response. If `on_page` is given, the events of each page are handed to it as they arrive instead of
+    being collected in the returned response.
+
     Args:
         yesterday_unix_timestamp (str): A Unix timestamp (in milliseconds) indicating the earliest point in time 
                                         to fetch played tracks from.
         payload (DataRequestPayload): An object containing authorization headers.
+        client (Optional[SpotifyClient]): Client to send the requests through; defaults to the shared one.
+        max_pages (int): Upper bound on the number of pages followed.
+        on_page (Optional[Callable[[List[PlayEvent]], None]]): Consumer of each page's new events.
+        user_id (str): User the plays belong to.
+        before (Optional[int]): Unix timestamp (in milliseconds) closing the window, exclusive; open if None.
 
     Returns:
-        Dict[str, Any]: The JSON response from the Spotify API containing recently played tracks.
+        Dict[str, Any]: The Spotify response with the events of every fetched page merged into "items"
+                        (empty when `on_page` is given) and the event count in "total".
 
     Raises:
         RuntimeError: If the HTTP request fails or returns an error status.
+        MalformedEventError: If the response holds a malformed play event.
     """
+    max_pages = Config.EXTRACT_MAX_PAGES if max_pages is None else max_pages
+    user_id = Config.DEFAULT_USER_ID if user_id is None else user_id
     logger.info("Fetching recently played tracks from Spotify.")
-    url = f"https://api.spotify.com/v1/me/player/recently-played?limit=50&after={yesterday_unix_timestamp}"
-
-    try:
-        response = requests.get(url, headers = payload.headers)
-        response.raise_for_status()
-        logger.info("Recently played tracks fetched successfully.")
-    except requests.HTTPError as http_error:
-        logger.error(f"Spotify API returned an error: {http_error}")
-        raise
-    except requests.RequestException as request_error:
-        logger.error(f"Request failed: {request_error}")
-        raise
-    
-    return response.json()
+    http = client or get_client()
+    url = f"{recently_played_url()}?limit=50&after={yesterday_unix_timestamp}"
+    after = int(yesterday_unix_timestamp)
+
+    result: Dict[str, Any] = {"items": [], "next": None, "cursors": None, "limit": 50, "href": url, "total": 0}
+    seen_played_at: set[int] = set()
+    visited: set[str] = set()
+    pages = 0
+
+    while url and url not in visited and pages < max_pages:
+        visited.add(url)
+        try:
+            response = http.get(url, headers = payload.headers)
+            response.raise_for_status()
+        except requests.HTTPError as http_error:
+            logger.error("Spotify API returned an error: %s", http_error)
+            raise
+        except requests.RequestException as request_error:
+            logger.error("Request failed: %s", request_error)
+            raise
+
+        page = response.json()
+        pages += 1
+        count(bytes_in=len(response.content))
+        page_items = page.get("items", [])
+        new_items = []
+        events = decode_items(page_items, user_id)
+        for event in events:
+            if event.played_at_ms <= after or event.played_at_ms in seen_played_at:
+                continue
+            if before is not None and event.played_at_ms >= before:
+                continue
+            seen_played_at.add(event.played_at_ms)
+            new_items.append(event)
+
+        result["total"] += len(new_items)
+        count(rows=len(new_items))
+        if on_page is not None:
+            on_page(new_items)
+        else:
+            result["items"].extend(new_items)
+
+        result["cursors"] = page.get("cursors") or result["cursors"]
+        # `next` links lead to older plays; none are left in the window once a page reaches `after`.
+        if not page_items or (events and min(event.played_at_ms for event in events) <= after):
+            break
+        # A closed window ends at `before`; pages past it only hold newer plays.
+        if before is not None and events and max(event.played_at_ms for event in events) >= before:
+            break
+        url = page.get("next")
+
+    logger.info("Recently played tracks fetched successfully: %s items in %s page(s).", result['total'], pages)
+    return result
+
+class RawEventWriter:
+    """
+    Appends play events to a newline-delimited JSON file, one compact `PlayEvent` record per line.
 
+    The file is truncated when the writer is opened; `write` is safe to call from several extraction threads.
+    With a `seen` index, events that were already loaded are skipped (and counted in `skipped`);
+    with an `archive`, the written events are also appended to the raw archive.
+    """
+    def __init__(self, path: Path, seen: Optional[SeenEventIndex] = None, archive: Optional[RawArchive] = None):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.seen = seen
+        self.archive = archive
+        self.count = 0
+        self.skipped = 0
+        self._file = path.open("w", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, items: List[PlayEvent]) -> None:
+        if self.seen is not None:
+            fresh = self.seen.unseen(items)
+            with self._lock:
+                self.skipped += len(items) - len(fresh)
+            items = fresh
+        lines = "".join(encode_event(event) + "\n" for event in items)
+        count("extract.raw_events", rows=len(items), bytes_out=len(lines))
+        with self._lock:
+            self._file.write(lines)
+            self._file.flush()
+            self.count += len(items)
+        if self.archive is not None and items:
+            self.archive.write(items)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "RawEventWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+@instrument()
 def save_recently_played_tracks(data: Dict[str, Any], path: Path) -> None:
     """
     Saves the recently played tracks data to a JSON file.
@@ -178,35 +340,139 @@ def save_recently_played_tracks(data: Dict[str, Any], path: Path) -> None:
     Raises:
         RuntimeError: If saving the file fails due to I/O errors.
     """
-    logger.info(f"Saving recently played tracks.")
+    logger.info("Saving recently played tracks.")
     try:
         path.parent.mkdir(parents=True, exist_ok=True)
         with path.open("w", encoding="utf-8") as file:
-            json.dump(data, file, indent=4)
+            json.dump(data, file, indent=4, default=PlayEvent.to_record)
+        count(rows=len(data.get("items", [])), bytes_out=path.stat().st_size)
         logger.info("Tracks saved successfully.")
     except (OSError, IOError) as error:
-        logger.error(f"Failed to save refresh token to {path}: {error}")
+        logger.error("Failed to save refresh token to %s: %s", path, error)
         raise
 
+@instrument()
+def extract_user_tracks(user_id: str, after: int, client: SpotifyClient,
+                        on_page: Optional[Callable[[List[PlayEvent]], None]] = None,
+                        before: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Obtains a cached or refreshed access token and runs the paginated fetch for a single user.
+
+    Args:
+        user_id (str): Identifier of the user whose refresh token is used.
+        after (int): Unix timestamp (in milliseconds) to fetch plays from.
+        client (SpotifyClient): Pooled, rate-limited client shared between users.
+        on_page (Optional[Callable[[List[PlayEvent]], None]]): Consumer of each page's events.
+        before (Optional[int]): Unix timestamp (in milliseconds) to fetch plays until, exclusive.
+
+    Returns:
+        Dict[str, Any]: The merged Spotify response; its "items" are `PlayEvent`s of the user.
+    """
+    logger.debug("Extracting recently played tracks for user '%s'.", user_id)
+    access_token = get_access_token(user_id, client)
+    data_payload = build_data_request_payload(access_token)
+    return get_recently_played_tracks(after, data_payload, client, on_page=on_page, user_id=user_id, before=before)
+
+@instrument()
+def extract_users(user_ids: List[str], after: Dict[str, int], max_workers: Optional[int] = None,
+                  on_page: Optional[Callable[[List[PlayEvent]], None]] = None,
+                  before: Optional[int] = None) -> ExtractionResult:
+    """
+    Extracts recently played tracks for many users concurrently.
+
+    Users are processed by a bounded thread pool that shares the pooled, rate-limited client,
+    so the wall time of a run is close to that of the slowest user.
+
+    Args:
+        user_ids (List[str]): Users to extract.
+        after (Dict[str, int]): Unix timestamp (in milliseconds) to fetch plays from, per user.
+        max_workers (int): Maximum number of users fetched at the same time.
+        on_page (Optional[Callable[[List[PlayEvent]], None]]): Thread-safe consumer of each page's events.
+        before (Optional[int]): Unix timestamp (in milliseconds) to fetch plays until, exclusive, for every user.
+
+    Returns:
+        ExtractionResult: The merged Spotify response per extracted user and the users that failed.
+    """
+    max_workers = Config.EXTRACT_MAX_WORKERS if max_workers is None else max_workers
+    workers = max(1, min(max_workers, len(user_ids)))
+    results: Dict[str, Dict[str, Any]] = {}
+    failed: List[str] = []
+
+    client = get_client()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(extract_user_tracks, user_id, after[user_id], client, on_page, before): user_id for user_id in user_ids}
+        for future in as_completed(futures):
+            user_id = futures[future]
+            try:
+                results[user_id] = future.result()
+            except Exception as error:
+                logger.error("Extraction failed for user '%s': %s", user_id, error)
+                failed.append(user_id)
+
+    return ExtractionResult(payloads=results, failed_users=sorted(failed))
+
+def merge_user_tracks(results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merges per-user responses into a single payload with the shape of a Spotify response.
+
+    Args:
+        results (Dict[str, Dict[str, Any]]): Merged Spotify response per user.
+
+    Returns:
+        Dict[str, Any]: A payload whose "items" hold the plays of every user.
+    """
+    items = [item for user_id in sorted(results) for item in results[user_id]["items"]]
+    return {"items": items, "next": None, "cursors": None, "limit": len(items), "href": recently_played_url()}
+
+@instrument()
+def resolve_extract_windows(user_ids: List[str]) -> Dict[str, int]:
+    """
+    Resolves the `after` timestamp of every user from their high watermark.
+
+    Users without a watermark (nothing loaded yet) fall back to the last 24 hours.
+
+    Args:
+        user_ids (List[str]): Users to extract.
+
+    Returns:
+        Dict[str, int]: Unix timestamp (in milliseconds) to fetch plays from, per user.
+    """
+    watermarks = get_watermark_store().get_many(user_ids)
+    default_after = Config.unix_timestamp()
+    logger.info("Resolved watermarks for %s of %s user(s).", len(watermarks), len(user_ids))
+    return {user_id: watermarks.get(user_id, default_after) for user_id in user_ids}
+
+@instrument()
 def extract():
     logger.info("Starting Spotify ETL extract process.")
     try:
-        refresh_token = load_refresh_token(Config.REFRESH_TOKEN_PATH)
-
-        token_payload = build_token_request_payload(Config.CLIENT_ID, 
-                                                    Config.CLIENT_SECRET, 
-                                                    refresh_token)
-        
-        new_access_token = refresh_access_token(token_payload)
-
-        data_payload = build_data_request_payload(new_access_token)
-        spotify_data = get_recently_played_tracks(Config.unix_timestamp(), data_payload)
-        
-        save_recently_played_tracks(spotify_data, Config.SPOTIFY_RAW_DATA_PATH)
+        after = resolve_extract_windows(Config.USER_IDS)
+        seen = get_seen_index()
+        if Config.RAW_DATA_FORMAT == "json":
+            result = extract_users(Config.USER_IDS, after)
+            data = merge_user_tracks(result.payloads)
+            if seen is not None:
+                extracted = len(data["items"])
+                data["items"] = seen.unseen(data["items"])
+                logger.info("%s of %s play events are new.", len(data["items"]), extracted)
+            save_recently_played_tracks(data, Config.SPOTIFY_RAW_DATA_PATH)
+            archive = get_raw_archive()
+            if archive is not None and data["items"]:
+                archive.write(data["items"])
+        else:
+            logger.info("Streaming recently played tracks to %s.", Config.SPOTIFY_RAW_EVENTS_PATH)
+            with RawEventWriter(Config.SPOTIFY_RAW_EVENTS_PATH, seen, get_raw_archive()) as writer:
+                result = extract_users(Config.USER_IDS, after, on_page=writer.write)
+            logger.info("%s new play events saved successfully, %s already loaded.", writer.count, writer.skipped)
+
+        if result.failed_users:
+            raise RuntimeError(f"Extraction failed for users: {', '.join(result.failed_users)}")
         logger.info("Spotify ETL extract process completed successfully.")
     except Exception as error:
-        logger.critical(f"ETL extract failed: {error}.", exc_info=True)
+        logger.critical("ETL extract failed: %s.", error, exc_info=True)
         raise
+    finally:
+        flush("extract")
 
 if __name__ == "__main__":
-    extract()
\ No newline at end of file
+    extract()
@@ -1,19 +1,101 @@
+import io
 import sys
+import time
+import atexit
+import threading
 import pandas as pd
-from typing import Union
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
 from pathlib import Path
+from dataclasses import asdict, dataclass
 from settings.config import Config
-from sqlalchemy.engine import Engine
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.pool import QueuePool
 from settings.logger import setup_logger
-from sqlalchemy import create_engine, text
+from settings.metrics import count, flush, instrument
+from sqlalchemy import create_engine, event, text
+from pipeline.state import get_watermark_store
+from pipeline.dedup import get_seen_index
+from pipeline.staging import is_staged_empty, read_staged_data, staged_data_path
+from pipeline import analytics, partitions, rollups
 
 logger = setup_logger(Config.LOGGER_NAME, Config.LOGGER_PATH)
 
-def get_database_engine() -> Engine:
+@dataclass
+class PoolStats:
     """
-    Creates and verifies a database engine connection using the configured database URL.
+    Connection pool counters of one engine; wait times cover checkouts that had to open or wait for a connection.
+    """
+    checkouts: int = 0
+    connects: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited in the `stats` class attribute.
+    """
+    stats: PoolStats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.stats.record_wait(time.perf_counter() - start)
+
+# Runs first in the transaction of a load, e.g. to delete the plays the batch replaces.
+BeforeInsert = Optional[Callable[[Connection], Any]]
+
+_engines: Dict[str, Engine] = {}
+_pool_stats: Dict[str, PoolStats] = {}
+_engines_lock = threading.Lock()
+
+def create_database_engine(database_url: str) -> Engine:
+    """
+    Creates an engine with the configured pool size, overflow, recycle time and pre-ping.
+
+    Args:
+        database_url (str): SQLAlchemy database URL.
+
+    Returns:
+        Engine: An SQLAlchemy Engine instance whose pool statistics are tracked.
+    """
+    stats = PoolStats()
+    options: Dict[str, Any] = {"pool_pre_ping": True, "pool_recycle": Config.DB_POOL_RECYCLE}
+    if make_url(database_url).get_backend_name() != "sqlite":
+        options.update(poolclass=type("TimedQueuePool", (TimedQueuePool,), {"stats": stats}),
+                       pool_size=Config.DB_POOL_SIZE,
+                       max_overflow=Config.DB_MAX_OVERFLOW,
+                       pool_timeout=Config.DB_POOL_TIMEOUT)
+
+    engine = create_engine(database_url, **options)
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        stats.connects += 1
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.checkouts += 1
+
+    _pool_stats[database_url] = stats
+    return engine
 
-    Executes a simple test query to ensure the connection is valid.
+@instrument()
+def get_database_engine(database_url: Optional[str] = None) -> Engine:
+    """
+    Returns the process-wide engine for the database URL, creating and verifying it on first use.
+
+    The engine and its connection pool are reused by every load in the process; the connectivity
+    test query only runs when the engine is created, afterwards `pool_pre_ping` guards checkouts.
+
+    Args:
+        database_url (Optional[str]): SQLAlchemy database URL; defaults to `Config.DATABASE_URL`.
 
     Returns:
         Engine: An SQLAlchemy Engine instance for interacting with the database.
@@ -21,29 +103,446 @@ def get_database_engine() -> Engine:
     Raises:
         RuntimeError: If the engine creation or test query fails.
     """
+    database_url = database_url or Config.DATABASE_URL
+    engine = _engines.get(database_url)
+    if engine is not None:
+        return engine
+
+    with _engines_lock:
+        engine = _engines.get(database_url)
+        if engine is not None:
+            return engine
+        try:
+            logger.info("Creating database engine.")
+            engine = create_database_engine(database_url)
+
+            logger.debug("Testing database connection.")
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            logger.info("Database engine created and tested successfully.")
+        except Exception as error:
+            logger.error("Failed to create database engine: %s", error)
+            raise RuntimeError(f"Failed to create database engine: {error}") from error
+
+        _engines[database_url] = engine
+        return engine
+
+def get_pool_stats(database_url: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Returns the connection pool statistics of a cached engine.
+
+    Args:
+        database_url (Optional[str]): SQLAlchemy database URL; defaults to `Config.DATABASE_URL`.
+
+    Returns:
+        Dict[str, Any]: Checkout and connect counts, total/average/max checkout wait in seconds,
+                        and the pool's current size and checked-out connections when available.
+    """
+    database_url = database_url or Config.DATABASE_URL
+    stats = _pool_stats.get(database_url, PoolStats())
+    result: Dict[str, Any] = asdict(stats)
+    result["avg_wait"] = stats.total_wait / stats.checkouts if stats.checkouts else 0.0
+
+    engine = _engines.get(database_url)
+    if engine is not None and isinstance(engine.pool, QueuePool):
+        result.update(size=engine.pool.size(), checked_out=engine.pool.checkedout(), overflow=engine.pool.overflow())
+    return result
+
+def dispose_engines() -> None:
+    """
+    Closes the pooled connections of every cached engine, e.g. at process shutdown.
+    """
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+atexit.register(dispose_engines)
+
+PLAYLOG_KEY = ["user_id", "played_at", "track_id"]
+# Databases whose load skips plays that are already stored, as backfill and reprocessing rely on.
+IDEMPOTENT_DIALECTS = ("postgresql", "sqlite")
+COPY_CHUNK_ROWS = 100_000
+# Text format of `played_at` in SQLite, which has no timestamp type: the unique play index only
+# recognizes a stored play if every load writes its timestamp the same way.
+PLAYED_AT_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+PLAYLOG_COLUMNS_DDL = f"""
+    user_id TEXT NOT NULL DEFAULT '{Config.DEFAULT_USER_ID}',
+    artist_name TEXT,
+    artist_id TEXT,
+    song_name TEXT,
+    track_id TEXT,
+    duration_ms BIGINT,
+    popularity INTEGER,
+    played_at TIMESTAMP
+"""
+
+_prepared_tables: Dict[tuple[str, str], bool] = {}
+
+def is_postgres(engine: Engine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+def add_duration_ms(conn: Connection, table_name: str) -> None:
+    """
+    Adds the `duration_ms` column to a playlog table created by an earlier version, which stored the
+    duration only as "m:ss" text; the existing rows are filled from that text, to the second.
+    """
+    from sqlalchemy import inspect
+
+    columns = {column["name"] for column in inspect(conn).get_columns(table_name)}
+    if "duration_ms" in columns:
+        return
+
+    table = conn.dialect.identifier_preparer.quote(table_name)
+    logger.info("Adding column 'duration_ms' to table '%s'.", table_name)
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN duration_ms BIGINT"))
+    if "duration" not in columns:
+        return
+    if conn.dialect.name == "postgresql":
+        filled = conn.execute(text(f"""
+            UPDATE {table} SET duration_ms = (split_part(duration, ':', 1)::bigint * 60
+                                              + split_part(duration, ':', 2)::bigint) * 1000
+            WHERE duration ~ '^[0-9]+:[0-9]{{2}}$'
+        """)).rowcount
+    else:
+        filled = conn.execute(text(f"""
+            UPDATE {table} SET duration_ms = (CAST(substr(duration, 1, instr(duration, ':') - 1) AS INTEGER) * 60
+                                              + CAST(substr(duration, instr(duration, ':') + 1) AS INTEGER)) * 1000
+            WHERE duration GLOB '[0-9]*:[0-9][0-9]'
+        """)).rowcount
+    logger.info("Filled 'duration_ms' of %s rows of table '%s' from 'duration'.", filled, table_name)
+
+@instrument()
+def ensure_playlog_table(table_name: str, engine: Engine) -> bool:
+    """
+    Creates the PostgreSQL playlog table and its unique play index if they are missing.
+
+    New tables are range partitioned on `played_at` by `Config.PLAYLOG_PARTITIONING` ("month" or "day");
+    existing unpartitioned tables are used as they are until migrated with `migrate_to_partitioned`.
+
+    Tables created by earlier versions get a `user_id` column (existing rows belong to the default user)
+    and a `duration_ms` column, and duplicate plays are removed once before the unique index on (user_id, played_at, track_id) is built.
+
+    Args:
+        table_name (str): Name of the target database table.
+        engine (Engine): SQLAlchemy Engine instance connected to PostgreSQL.
+
+    Returns:
+        bool: Whether the table is partitioned.
+    """
+    prepared_key = (engine.url.render_as_string(hide_password=False), table_name)
+    if prepared_key in _prepared_tables:
+        return _prepared_tables[prepared_key]
+
+    index_name = f"{table_name}_play_key"
+    table = engine.dialect.identifier_preparer.quote(table_name)
+
+    with engine.begin() as conn:
+        # Concurrent first loads (e.g. backfill workers) would otherwise race on CREATE TABLE.
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:table))"), {"table": table_name})
+        with conn.connection.cursor() as cursor:
+            partitioned = partitions.is_partitioned(cursor, table_name)
+            exists = partitioned or conn.execute(text("SELECT to_regclass(:table)"), {"table": table_name}).scalar()
+            if not exists and Config.PLAYLOG_PARTITIONING in partitions.PARTITION_NAME_FORMATS:
+                partitions.create_partitioned_table(cursor, table_name,
+                                                    PLAYLOG_COLUMNS_DDL.replace("played_at TIMESTAMP", "played_at TIMESTAMP NOT NULL"),
+                                                    PLAYLOG_KEY, Config.PLAYLOG_PARTITIONING)
+                _prepared_tables[prepared_key] = True
+                return True
+
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table} ({PLAYLOG_COLUMNS_DDL})"))
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS user_id TEXT NOT NULL DEFAULT '{Config.DEFAULT_USER_ID}'"))
+        add_duration_ms(conn, table_name)
+
+        has_index = conn.execute(text("SELECT 1 FROM pg_indexes WHERE tablename = :table AND indexname = :index"),
+                                 {"table": table_name, "index": index_name}).first()
+        if not has_index:
+            create_play_index(conn, table_name, index_name)
+
+    _prepared_tables[prepared_key] = partitioned
+    return partitioned
+
+def create_play_index(conn: Connection, table_name: str, index_name: str) -> None:
+    """
+    Removes duplicate plays and builds the unique index on (user_id, played_at, track_id).
+    """
+    quote = conn.dialect.identifier_preparer.quote
+    table, index = quote(table_name), quote(index_name)
+
+    logger.info("Creating unique index '%s' on table '%s'.", index_name, table_name)
+    removed = conn.execute(text(f"""
+        DELETE FROM {table} AS a USING {table} AS b
+        WHERE a.ctid > b.ctid
+          AND a.user_id = b.user_id AND a.played_at = b.played_at AND a.track_id = b.track_id
+    """)).rowcount
+    if removed:
+        logger.warning("Removed %s duplicate plays from table '%s'.", removed, table_name)
+    conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {index} ON {table} ({', '.join(PLAYLOG_KEY)})"))
+
+@instrument()
+def copy_upsert(df: pd.DataFrame, table_name: str, engine: Engine, before_insert: BeforeInsert = None) -> int:
+    """
+    Bulk loads rows into PostgreSQL through COPY and merges them without duplicating plays.
+
+    Rows are streamed with `COPY ... FROM STDIN` into a temporary staging table in chunks of
+    `COPY_CHUNK_ROWS`, then merged with `INSERT ... ON CONFLICT (user_id, played_at, track_id) DO NOTHING`
+    in the same transaction. On a partitioned table the missing partitions are created first and each
+    partition is merged directly, so only the partitions touched by the batch are read for conflicts.
+    With `MAINTAIN_ROLLUPS` the merge returns the inserted rows, which are added to the rollups before commit.
+
+    Args:
+        df (pd.DataFrame): Transformed rows to load.
+        table_name (str): Name of the target database table.
+        engine (Engine): SQLAlchemy Engine instance connected to PostgreSQL.
+        before_insert (Optional[Callable[[Connection], Any]]): Called first in the load transaction.
+
+    Returns:
+        int: Number of rows actually inserted.
+    """
+    partitioned = ensure_playlog_table(table_name, engine)
+    if partitioned:
+        if df["played_at"].isna().any():
+            logger.warning("Skipping %s rows without played_at for partitioned table '%s'.",
+                           df['played_at'].isna().sum(), table_name)
+            df = df[df["played_at"].notna()]
+        interval = partitions.configured_interval()
+        # CSV staging hands over played_at as text; COPY accepts either, the routing needs datetimes.
+        days = pd.to_datetime(df["played_at"]).dt.normalize().unique()
+        starts = {partitions.partition_start(day.to_pydatetime(), interval) for day in days}
+        partitions.ensure_partitions(table_name, engine, starts, interval)
+
+    quote = engine.dialect.identifier_preparer.quote
+    table, staging = quote(table_name), quote(f"{table_name}_staging")
+    columns = ", ".join(quote(column) for column in df.columns)
+    # The inserted rows are only sent back when the rollups need them.
+    returning = f"RETURNING {columns}" if Config.MAINTAIN_ROLLUPS else ""
+    if "popularity" in df.columns:
+        df = df.astype({"popularity": "Int64"})
+
+    with engine.begin() as conn:
+        if before_insert is not None:
+            before_insert(conn)
+        with conn.connection.cursor() as cursor:
+            cursor.execute(f"CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+            for start in range(0, len(df), COPY_CHUNK_ROWS):
+                buffer = io.StringIO()
+                df.iloc[start:start + COPY_CHUNK_ROWS].to_csv(buffer, index=False, header=False,
+                                                              date_format=PLAYED_AT_FORMAT)
+                count(bytes_out=buffer.tell())
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+            if partitioned:
+                inserted_rows = merge_partitions(cursor, table_name, staging, columns, starts, interval, returning)
+            else:
+                cursor.execute(f"""
+                    INSERT INTO {table} ({columns})
+                    SELECT {columns} FROM {staging}
+                    ON CONFLICT ({", ".join(PLAYLOG_KEY)}) DO NOTHING
+                    {returning}
+                """)
+                inserted_rows = cursor.fetchall() if returning else cursor.rowcount
+
+        if returning:
+            rollups.add_plays(conn, pd.DataFrame(inserted_rows, columns=df.columns))
+
+    return len(inserted_rows) if returning else inserted_rows
+
+def merge_partitions(cursor: Any, table_name: str, staging: str, columns: str, starts: Iterable[datetime],
+                     interval: str, returning: str = "") -> Union[int, List[tuple]]:
+    """
+    Merges the staged rows into each (already created) partition of the playlog table they fall into.
+
+    Returns:
+        Union[int, List[tuple]]: Number of rows inserted, or the inserted rows with a `returning` clause.
+    """
+    from psycopg2 import sql
+
+    inserted, inserted_rows = 0, []
+    for start in sorted(starts):
+        name = partitions.partition_name(table_name, start, interval)
+        cursor.execute(sql.SQL("""
+            INSERT INTO {partition} ({columns})
+            SELECT {columns} FROM {staging}
+            WHERE played_at >= %s AND played_at < %s
+            ON CONFLICT ({key}) DO NOTHING
+            {returning}
+        """).format(partition=sql.Identifier(name), columns=sql.SQL(columns), staging=sql.SQL(staging),
+                    key=sql.SQL(", ".join(PLAYLOG_KEY)), returning=sql.SQL(returning)),
+            (start, partitions.partition_end(start, interval)))
+        inserted += cursor.rowcount
+        if returning:
+            inserted_rows.extend(cursor.fetchall())
+
+    logger.debug("Merged %s rows into the partitions of table '%s'.", inserted, table_name)
+    return inserted_rows if returning else inserted
+
+def ensure_sqlite_playlog_table(df: pd.DataFrame, table_name: str, engine: Engine) -> None:
+    """
+    Creates the SQLite playlog table from the frame's columns and its unique play index if they are missing.
+
+    Duplicate plays left by earlier append-only loads are removed once before the unique index on
+    (user_id, played_at, track_id) is built, and tables of earlier versions get a `duration_ms` column.
+    Timestamps stored with fractional seconds by earlier loads are cut to `PLAYED_AT_FORMAT` first,
+    and the index is rebuilt. Runs in its own transaction, like `ensure_playlog_table`,
+    so a failed load never leaves the table remembered as prepared without its index.
+    """
+    from sqlalchemy import inspect
+
+    prepared_key = (engine.url.render_as_string(hide_password=False), table_name)
+    if prepared_key in _prepared_tables:
+        return
+
+    index_name = f"{table_name}_play_key"
+    quote = engine.dialect.identifier_preparer.quote
+    table, index, key = quote(table_name), quote(index_name), ", ".join(PLAYLOG_KEY)
+
+    with engine.begin() as conn:
+        if not inspect(conn).has_table(table_name):
+            df.head(0).to_sql(table_name, conn, index=False)
+        else:
+            add_duration_ms(conn, table_name)
+        has_index = index_name in {index["name"] for index in inspect(conn).get_indexes(table_name)}
+        if conn.execute(text(f"SELECT 1 FROM {table} WHERE length(played_at) > 19 LIMIT 1")).first():
+            logger.info("Normalizing the played_at timestamps of table '%s'.", table_name)
+            conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+            conn.execute(text(f"UPDATE {table} SET played_at = substr(played_at, 1, 19) WHERE length(played_at) > 19"))
+            has_index = False
+        if not has_index:
+            logger.info("Creating unique index '%s' on table '%s'.", index_name, table_name)
+            removed = conn.execute(text(f"""
+                DELETE FROM {table} WHERE rowid NOT IN (SELECT MIN(rowid) FROM {table} GROUP BY {key})
+            """)).rowcount
+            if removed:
+                logger.warning("Removed %s duplicate plays from table '%s'.", removed, table_name)
+            conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {index} ON {table} ({key})"))
+
+    _prepared_tables[prepared_key] = False
+
+def insert_new_plays(df: pd.DataFrame, table_name: str, engine: Engine, before_insert: BeforeInsert = None) -> int:
+    """
+    Inserts rows into a SQLite playlog table, skipping plays that are already stored.
+
+    `played_at` is written as `PLAYED_AT_FORMAT` text whether it arrives as datetime (Parquet staging)
+    or as text (CSV staging). `DataFrame.to_sql` keeps the other column types, but sends the rows through
+    `INSERT ... ON CONFLICT (user_id, played_at, track_id) DO NOTHING RETURNING`, and only the
+    returned plays are added to the daily rollups, in the same transaction.
+
+    Returns:
+        int: Number of rows inserted.
+    """
+    from sqlalchemy.dialects import sqlite
+
+    played_at = pd.to_datetime(df["played_at"], utc=True).dt.tz_localize(None).dt.strftime(PLAYED_AT_FORMAT)
+    df = df.assign(played_at=played_at)
+    ensure_sqlite_playlog_table(df, table_name, engine)
+    inserted: List[Any] = []
+
+    def insert_ignoring_stored(pd_table: Any, conn: Connection, keys: List[str], data_iter: Iterable[tuple]) -> int:
+        table = pd_table.table
+        statement = (sqlite.insert(table).on_conflict_do_nothing(index_elements=PLAYLOG_KEY)
+                     .returning(*(table.c[column] for column in PLAYLOG_KEY)))
+        rows = conn.execute(statement, [dict(zip(keys, row)) for row in data_iter]).all()
+        inserted.extend(tuple(row) for row in rows)
+        return len(rows)
+
+    with engine.begin() as conn:
+        if before_insert is not None:
+            before_insert(conn)
+        df.to_sql(table_name, conn, if_exists="append", index=False, method=insert_ignoring_stored)
+        if inserted and Config.MAINTAIN_ROLLUPS:
+            new_plays = set(inserted)
+            fresh = [play in new_plays for play in zip(df["user_id"], df["played_at"], df["track_id"])]
+            rollups.add_plays(conn, df[fresh])
+    return len(inserted)
+
+@instrument()
+def write_playlog(df: pd.DataFrame, table_name: str, engine: Engine, before_insert: BeforeInsert = None) -> int:
+    """
+    Writes transformed rows to the playlog table.
+
+    PostgreSQL uses the COPY loader with idempotent merge and SQLite an insert that skips stored plays,
+    so reruns, backfills and reprocessing never duplicate plays on either. Other databases fall back to
+    an append-only `DataFrame.to_sql`. The inserted rows are added to the daily rollups in the same transaction.
+
+    Args:
+        df (pd.DataFrame): Transformed rows to load.
+        table_name (str): Name of the target database table.
+        engine (Engine): SQLAlchemy Engine instance for database connection.
+        before_insert (Optional[Callable[[Connection], Any]]): Called first in the load transaction.
+
+    Returns:
+        int: Number of rows inserted.
+    """
+    if is_postgres(engine):
+        logger.debug("Copying data into table '%s'.", table_name)
+        return copy_upsert(df, table_name, engine, before_insert)
+
+    if engine.dialect.name == "sqlite":
+        logger.debug("Inserting new plays into table '%s'.", table_name)
+        return insert_new_plays(df, table_name, engine, before_insert)
+
+    logger.debug("Appending data to table '%s'.", table_name)
+    with engine.begin() as conn:
+        if before_insert is not None:
+            before_insert(conn)
+        df.to_sql(table_name, conn, if_exists='append', index=False)
+        rollups.add_plays(conn, df)
+    return len(df)
+
+@instrument()
+def load_dataframe(df: pd.DataFrame, table_name: str, engine: Engine, before_insert: BeforeInsert = None) -> int:
+    """
+    Loads transformed rows into the specified database table, advances the users' watermarks,
+    adds the rows to the index of seen plays and drops the users' cached analytics results.
+
+    With `LOAD_SCHEMA=star` the rows go to the normalized `fact_play`/`dim_*` tables instead.
+    `before_insert` runs first in the load transaction, so whatever it changes is committed or rolled
+    back together with the rows.
+
+    Args:
+        df (pd.DataFrame): Transformed rows, e.g. straight from `transform_items`.
+        table_name (str): Name of the target database table.
+        engine (Engine): SQLAlchemy Engine instance for database connection.
+        before_insert (Optional[Callable[[Connection], Any]]): Called first in the load transaction.
+
+    Returns:
+        int: Number of rows inserted.
+
+    Raises:
+        RuntimeError: If loading data into the database fails.
+    """
     try:
-        logger.info(f"Creating database engine.")
-        engine = create_engine(Config.DATABASE_URL)
-
-        logger.debug("Testing database connection.")
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        logger.info("Database engine created and tested successfully.")
-        return(engine)
-    
+        if Config.LOAD_SCHEMA == "star":
+            from pipeline.star import load_star_schema
+            inserted = load_star_schema(df, engine, before_insert)
+        else:
+            inserted = write_playlog(df, table_name, engine, before_insert)
+            logger.info("%s of %s rows successfully loaded into table '%s'.", inserted, len(df), table_name)
+
     except Exception as error:
-        logger.error(f"Failed to create database engine: {error}")
-        raise RuntimeError(f"Failed to create database engine: {error}") from error
-    
+        logger.error("Failed to load data into the database: %s", error)
+        raise RuntimeError(f"Failed to load data into the database: {error}") from error
+
+    get_watermark_store().advance(compute_watermarks(df))
+    seen = get_seen_index()
+    if seen is not None:
+        seen.record(df)
+    analytics.invalidate_users(df["user_id"].unique())
+    count(rows=inserted)
+    return inserted
+
+@instrument()
 def load_data_to_database(data_path: Union[str, Path], table_name: str, engine: Engine) -> None:
     """
     Loads data into the specified database table.
 
-    Reads the CSV file using pandas and writes the data into the database table using SQLAlchemy.
-    Disposes the engine connection after successful loading.
+    Reads the staged Parquet or CSV file and writes the data into the database table with `load_dataframe`,
+    which also advances the users' watermarks. The engine stays pooled for later loads in the process.
 
     Args:
-        data_path (Union[str, Path]): Path to the CSV file containing data to load.
+        data_path (Union[str, Path]): Path to the staged data to load.
         table_name (str): Name of the target database table.
         engine (Engine): SQLAlchemy Engine instance for database connection.
 
@@ -51,29 +550,65 @@ def load_data_to_database(data_path: Union[str, Path], table_name: str, engine:
         RuntimeError: If reading the file or loading data into the database fails.
     """
     try:
-        logger.debug(f"Reading data from CSV file: {data_path}")
-        df = pd.read_csv(data_path)
+        logger.debug("Reading staged data: %s", data_path)
+        df = read_staged_data(Path(data_path))
+    except Exception as error:
+        logger.error("Failed to load data into the database: %s", error)
+        raise RuntimeError(f"Failed to load data into the database: {error}") from error
 
-        logger.debug(f"Inserting data into table '{table_name}'.")
-        df.to_sql(table_name, engine, if_exists='append', index=False)
+    load_dataframe(df, table_name, engine)
 
-        engine.dispose()
-        logger.info(f"Data successfully loaded into table '{table_name}' and connection disposed.")
+def compute_watermarks(df: pd.DataFrame) -> Dict[str, int]:
+    """
+    Computes the latest `played_at` per user of a transformed batch.
 
-    except Exception as error:
-        logger.error(f"Failed to load data into the database: {error}")
-        raise RuntimeError(f"Failed to load data into the database: {error}") from error
-    
+    Args:
+        df (pd.DataFrame): Transformed data with `user_id` and `played_at` columns.
+
+    Returns:
+        Dict[str, int]: Latest `played_at` per user in Unix milliseconds.
+    """
+    played_at = pd.to_datetime(df["played_at"], errors="coerce", utc=True)
+    played_at_ms = (played_at - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(milliseconds=1)
+    latest = played_at_ms.groupby(df["user_id"]).max().dropna()
+    return {str(user_id): int(value) for user_id, value in latest.items()}
+
+@instrument()
+def restore_watermarks(table_name: str, engine: Engine) -> Dict[str, int]:
+    """
+    Rebuilds the watermark store from the target table, e.g. after the state file was lost.
+
+    Args:
+        table_name (str): Name of the target database table.
+        engine (Engine): SQLAlchemy Engine instance for database connection.
+
+    Returns:
+        Dict[str, int]: The restored watermark per user in Unix milliseconds.
+    """
+    logger.info("Restoring watermarks from table '%s'.", table_name)
+    df = pd.read_sql(text(f"SELECT user_id, MAX(played_at) AS played_at FROM {table_name} GROUP BY user_id"), engine)
+    watermarks = compute_watermarks(df)
+    get_watermark_store().advance(watermarks)
+    return watermarks
+
+@instrument()
 def load():
     logger.info("Starting data load process.")
     try:
+        if is_staged_empty(staged_data_path()):
+            logger.info("No new rows staged, nothing to load.")
+            return
         engine = get_database_engine()
-        load_data_to_database(Config.SPOTIFY_TRANSFORMED_DATA_PATH, Config.TABLE_NAME, engine)
+        load_data_to_database(staged_data_path(), Config.TABLE_NAME, engine)
+        if is_postgres(engine) and Config.PLAYLOG_RETENTION_DAYS > 0:
+            partitions.apply_retention(Config.TABLE_NAME, engine)
         logger.info("Data load process completed successfully.")
 
     except Exception as error:
-        logger.error(f"Data load process failed: {error}")
+        logger.error("Data load process failed: %s", error)
         raise
+    finally:
+        flush("load")
 
 if __name__ == "__main__":
     load()
\ No newline at end of file
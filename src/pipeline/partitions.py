@@ -0,0 +1,261 @@
+import re
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, List, Optional, Tuple
+from sqlalchemy.engine import Engine
+from settings.config import Config
+from settings.logger import setup_logger
+
+logger = setup_logger(Config.LOGGER_NAME, Config.LOGGER_PATH)
+
+PARTITION_NAME_FORMATS = {"month": "%Y%m", "day": "%Y%m%d"}
+UPPER_BOUND_PATTERN = re.compile(r"TO \('([^']+)'\)")
+
+_known_partitions: set[Tuple[str, str]] = set()
+
+def configured_interval() -> str:
+    """
+    Returns the configured partition interval; "month" when partitioning of new tables is disabled,
+    which still applies to tables that are already partitioned or migrated explicitly.
+    """
+    return Config.PLAYLOG_PARTITIONING if Config.PLAYLOG_PARTITIONING in PARTITION_NAME_FORMATS else "month"
+
+def partition_start(played_at: datetime, interval: str) -> datetime:
+    """
+    Returns the lower bound of the partition holding `played_at`.
+    """
+    start = played_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start.replace(day=1) if interval == "month" else start
+
+def partition_end(start: datetime, interval: str) -> datetime:
+    """
+    Returns the exclusive upper bound of the partition starting at `start`.
+    """
+    if interval == "day":
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def partition_name(table_name: str, start: datetime, interval: str) -> str:
+    return f"{table_name}_p{start.strftime(PARTITION_NAME_FORMATS[interval])}"
+
+def is_partitioned(cursor: Any, table_name: str) -> bool:
+    """
+    Returns whether the table exists and is range partitioned.
+    """
+    cursor.execute("""
+        SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace
+    """, (table_name,))
+    return cursor.fetchone() is not None
+
+def create_partitioned_table(cursor: Any, table_name: str, columns_ddl: str, key: List[str],
+                             interval: str) -> None:
+    """
+    Creates the playlog table range partitioned on `played_at`, with its unique play index.
+    """
+    from psycopg2 import sql
+
+    logger.info("Creating table '%s' partitioned by %s on played_at.", table_name, interval)
+    cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} ({}) PARTITION BY RANGE (played_at)").format(
+        sql.Identifier(table_name), sql.SQL(columns_ddl)))
+    cursor.execute(sql.SQL("CREATE UNIQUE INDEX IF NOT EXISTS {} ON {} ({})").format(
+        sql.Identifier(f"{table_name}_play_key"), sql.Identifier(table_name),
+        sql.SQL(", ").join(map(sql.Identifier, key))))
+    cursor.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} (played_at)").format(
+        sql.Identifier(f"{table_name}_played_at_idx"), sql.Identifier(table_name)))
+
+def create_partition(cursor: Any, table_name: str, start: datetime, interval: str) -> str:
+    """
+    Creates the partition starting at `start` if it does not exist yet and returns its name.
+    """
+    from psycopg2 import sql
+
+    name = partition_name(table_name, start, interval)
+    cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)").format(
+        sql.Identifier(name), sql.Identifier(table_name)), (start, partition_end(start, interval)))
+    return name
+
+def ensure_partitions(table_name: str, engine: Engine, starts: Iterable[datetime], interval: str) -> List[str]:
+    """
+    Creates the missing partitions for the given partition starts in a short transaction of its own.
+
+    Creation is serialized per table with a transaction-level advisory lock and committed before any
+    rows are merged, so concurrent loads neither race on the same partition nor deadlock on each other.
+
+    Returns:
+        List[str]: Names of the partitions covering `starts`.
+    """
+    names = {partition_name(table_name, start, interval): start for start in starts}
+    missing = sorted(name for name in names if (table_name, name) not in _known_partitions)
+    if missing:
+        conn = engine.raw_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (table_name,))
+                for name in missing:
+                    create_partition(cursor, table_name, names[name], interval)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        _known_partitions.update((table_name, name) for name in missing)
+    return sorted(names)
+
+def list_partitions(cursor: Any, table_name: str) -> List[Tuple[str, Optional[datetime]]]:
+    """
+    Returns the partitions of a table with their exclusive upper bound.
+    """
+    cursor.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = %s AND p.relnamespace = current_schema()::regnamespace
+        ORDER BY c.relname
+    """, (table_name,))
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = UPPER_BOUND_PATTERN.search(bound or "")
+        partitions.append((name, datetime.fromisoformat(match.group(1)) if match else None))
+    return partitions
+
+def apply_retention(table_name: str, engine: Engine, retention_days: Optional[int] = None,
+                    mode: Optional[str] = None) -> List[str]:
+    """
+    Detaches every partition whose data is entirely older than the retention period.
+
+    Detached partitions are dropped, or with `mode="archive"` moved to `Config.ARCHIVE_SCHEMA`;
+    both are metadata operations, independent of the number of rows removed.
+
+    Args:
+        table_name (str): Name of the partitioned playlog table.
+        engine (Engine): SQLAlchemy Engine instance connected to PostgreSQL.
+        retention_days (int): Number of days of plays to keep; 0 disables retention.
+        mode (str): "drop" or "archive".
+
+    Returns:
+        List[str]: Names of the detached partitions.
+    """
+    from psycopg2 import sql
+
+    retention_days = Config.PLAYLOG_RETENTION_DAYS if retention_days is None else retention_days
+    mode = Config.PLAYLOG_RETENTION_MODE if mode is None else mode
+    if retention_days <= 0:
+        return []
+
+    # Partition bounds are naive UTC, like the played_at column.
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=retention_days)
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            expired = [name for name, upper in list_partitions(cursor, table_name) if upper and upper <= cutoff]
+            if expired and mode == "archive":
+                cursor.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(Config.ARCHIVE_SCHEMA)))
+
+            for name in expired:
+                cursor.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+                    sql.Identifier(table_name), sql.Identifier(name)))
+                if mode == "archive":
+                    cursor.execute(sql.SQL("ALTER TABLE {} SET SCHEMA {}").format(
+                        sql.Identifier(name), sql.Identifier(Config.ARCHIVE_SCHEMA)))
+                else:
+                    cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+                _known_partitions.discard((table_name, name))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if expired:
+        action = f"archived to schema '{Config.ARCHIVE_SCHEMA}'" if mode == "archive" else "dropped"
+        logger.info("%s partition(s) of '%s' older than %s days %s.", len(expired), table_name, retention_days, action)
+    return expired
+
+def migrate_to_partitioned(table_name: str, engine: Engine, columns_ddl: str, key: List[str],
+                           interval: Optional[str] = None) -> str:
+    """
+    Converts an existing unpartitioned playlog table into a partitioned one.
+
+    The old table is renamed to `<table>_unpartitioned` and kept for manual removal; its rows are
+    copied into a new partitioned table, with `played_at` cast to TIMESTAMP and rows without it skipped.
+    A table of an earlier version first gets its `duration_ms` column.
+
+    Args:
+        table_name (str): Name of the playlog table.
+        engine (Engine): SQLAlchemy Engine instance connected to PostgreSQL.
+        columns_ddl (str): Column definitions of the playlog table.
+        key (List[str]): Columns of the unique play index.
+        interval (Optional[str]): "month" or "day"; defaults to `configured_interval()`.
+
+    Returns:
+        str: Name of the renamed, unpartitioned table.
+    """
+    from psycopg2 import sql
+    from pipeline.load import add_duration_ms
+
+    legacy = f"{table_name}_unpartitioned"
+    with engine.begin() as conn:
+        add_duration_ms(conn, table_name)
+    interval = interval or configured_interval()
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            if is_partitioned(cursor, table_name):
+                raise ValueError(f"Table '{table_name}' is already partitioned.")
+
+            logger.info("Migrating table '%s' to %s partitions.", table_name, interval)
+            cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(sql.Identifier(table_name), sql.Identifier(legacy)))
+            cursor.execute(sql.SQL("ALTER INDEX IF EXISTS {} RENAME TO {}").format(
+                sql.Identifier(f"{table_name}_play_key"), sql.Identifier(f"{legacy}_play_key")))
+            create_partitioned_table(cursor, table_name, columns_ddl, key, interval)
+
+            cursor.execute(sql.SQL("SELECT DISTINCT date_trunc(%s, played_at::timestamp) FROM {} WHERE played_at IS NOT NULL")
+                           .format(sql.Identifier(legacy)), (interval,))
+            names = [create_partition(cursor, table_name, start, interval) for (start,) in cursor.fetchall()]
+
+            cursor.execute(sql.SQL("""
+                INSERT INTO {} (user_id, artist_name, artist_id, song_name, track_id, duration_ms, popularity, played_at)
+                SELECT user_id, artist_name, artist_id, song_name, track_id, duration_ms, popularity::integer, played_at::timestamp
+                FROM {} WHERE played_at IS NOT NULL
+                ON CONFLICT DO NOTHING
+            """).format(sql.Identifier(table_name), sql.Identifier(legacy)))
+            logger.info("%s rows copied into %s partition(s).", cursor.rowcount, len(names))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    _known_partitions.update((table_name, name) for name in names)
+    return legacy
+
+def main() -> None:
+    from pipeline.load import PLAYLOG_COLUMNS_DDL, PLAYLOG_KEY, get_database_engine
+
+    parser = argparse.ArgumentParser(description="Maintain the partitions of the playlog table.")
+    parser.add_argument("command", choices=["migrate", "retention", "list"])
+    parser.add_argument("--table", default=Config.TABLE_NAME)
+    args = parser.parse_args()
+
+    engine = get_database_engine()
+    if args.command == "migrate":
+        columns_ddl = PLAYLOG_COLUMNS_DDL.replace("played_at TIMESTAMP", "played_at TIMESTAMP NOT NULL")
+        migrate_to_partitioned(args.table, engine, columns_ddl, PLAYLOG_KEY)
+    elif args.command == "retention":
+        apply_retention(args.table, engine)
+    else:
+        conn = engine.raw_connection()
+        try:
+            with conn.cursor() as cursor:
+                for name, upper in list_partitions(cursor, args.table):
+                    print(f"{name}\t{upper}")
+        finally:
+            conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import time
+import heapq
+import random
+import signal
+import asyncio
+import argparse
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Set, Tuple
+from settings.config import Config
+from settings.logger import setup_logger
+from settings.metrics import flush
+from pipeline.client import get_client
+from pipeline.dedup import get_seen_index
+from pipeline.archive import get_raw_archive
+from pipeline.events import PlayEvent
+from pipeline.enrich import enrich_items, enrichment_enabled
+from pipeline.extract import extract_user_tracks, resolve_extract_windows
+from pipeline.transform import transform_items
+from pipeline.load import get_database_engine, load_dataframe
+from pipeline.state import get_watermark_store
+
+logger = setup_logger(Config.LOGGER_NAME, Config.LOGGER_PATH)
+
+# Spotify only keeps the most recent plays of a user; a poll returning this many may have missed some.
+HISTORY_LIMIT = 50
+
+@dataclass(order=True)
+class UserSchedule:
+    """
+    Polling state of one user; schedules are ordered by the (monotonic) time of their next poll.
+    """
+    due: float
+    user_id: str = field(compare=False)
+    after: int = field(compare=False)
+    interval: float = field(compare=False)
+    polled_at: Optional[float] = field(default=None, compare=False)
+    failures: int = field(default=0, compare=False)
+
+def next_interval(interval: float, new_plays: int, elapsed: float,
+                  min_interval: Optional[float] = None, max_interval: Optional[float] = None,
+                  backoff: Optional[float] = None, target_plays: Optional[int] = None) -> float:
+    """
+    Adapts a user's polling interval to their listening.
+
+    Idle users back off geometrically up to `max_interval`. Active users are polled `backoff` times
+    sooner, and at least often enough for their observed play rate to yield `target_plays` plays per poll,
+    well within the plays Spotify keeps.
+
+    Args:
+        interval (float): Current interval in seconds.
+        new_plays (int): Plays returned by the last poll.
+        elapsed (float): Seconds between the last two polls.
+        min_interval (float): Lower bound in seconds.
+        max_interval (float): Upper bound in seconds.
+        backoff (float): Factor the interval grows by when idle and shrinks by when active.
+        target_plays (int): Plays a poll should return at the observed play rate.
+
+    Returns:
+        float: The next interval in seconds.
+    """
+    min_interval = Config.POLLER_MIN_INTERVAL if min_interval is None else min_interval
+    max_interval = Config.POLLER_MAX_INTERVAL if max_interval is None else max_interval
+    backoff = Config.POLLER_BACKOFF if backoff is None else backoff
+    target_plays = Config.POLLER_TARGET_PLAYS if target_plays is None else target_plays
+    if new_plays == 0:
+        return min(max_interval, interval * backoff)
+    rate = new_plays / max(elapsed, 1.0)
+    return max(min_interval, min(max_interval, interval / backoff, target_plays / rate))
+
+class Poller:
+    """
+    Polls the recently played tracks of many users on adaptive schedules from one event loop.
+
+    Users wait in a heap ordered by their next poll. Due users are polled on a bounded thread pool,
+    since the extract functions are blocking, and every request draws from the shared client's token
+    bucket, which is the global rate budget. New plays are buffered and transformed and loaded as one
+    micro-batch every `flush_interval` seconds, or sooner once `TRANSFORM_BATCH_SIZE` plays are pending.
+    """
+    def __init__(self, user_ids: List[str], database_url: Optional[str] = None,
+                 min_interval: Optional[float] = None, max_interval: Optional[float] = None,
+                 flush_interval: Optional[float] = None,
+                 max_concurrency: Optional[int] = None):
+        min_interval = Config.POLLER_MIN_INTERVAL if min_interval is None else min_interval
+        max_interval = Config.POLLER_MAX_INTERVAL if max_interval is None else max_interval
+        flush_interval = Config.POLLER_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        max_concurrency = Config.POLLER_MAX_CONCURRENCY if max_concurrency is None else max_concurrency
+        self.user_ids = user_ids
+        self.database_url = database_url
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.flush_interval = flush_interval
+        self.max_concurrency = max(1, max_concurrency)
+
+        self.schedule: List[UserSchedule] = []
+        self.pending: List[PlayEvent] = []
+        self.polls = 0
+        self.inserted = 0
+
+        self._pollers = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="poll")
+        self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="micro-batch")
+        self._stopping = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self._flush_now = asyncio.Event()
+
+    def stop(self) -> None:
+        """
+        Asks the poller to finish the polls in flight, load what is pending and return.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        self._flush_now.set()
+
+    def fetch(self, user_id: str, after: int) -> Tuple[int, List[PlayEvent]]:
+        """
+        Fetches a user's plays after `after` (runs on the poll threads).
+
+        Returns:
+            Tuple[int, List[PlayEvent]]: Number of plays returned and the ones not loaded before.
+        """
+        items = extract_user_tracks(user_id, after, get_client())["items"]
+        seen = get_seen_index()
+        fresh = seen.unseen(items) if seen is not None else items
+        archive = get_raw_archive()
+        if archive is not None and fresh:
+            archive.write(fresh)
+        return len(items), fresh
+
+    def load_batch(self, items: List[PlayEvent]) -> int:
+        """
+        Enriches (if enabled), transforms and loads one micro-batch (runs on the loader thread).
+
+        Returns:
+            int: Number of rows inserted.
+        """
+        if enrichment_enabled():
+            enrich_items(items)
+        watermarks = get_watermark_store().get_many({event.user_id for event in items})
+        df = transform_items(items, watermarks)
+        inserted = load_dataframe(df, Config.TABLE_NAME, get_database_engine(self.database_url)) if not df.empty else 0
+        logger.info("Micro-batch of %s plays loaded: %s rows, %s inserted.", len(items), len(df), inserted)
+        flush("poller")
+        return inserted
+
+    async def poll(self, user: UserSchedule, slots: asyncio.Semaphore) -> None:
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        try:
+            returned, items = await loop.run_in_executor(self._pollers, self.fetch, user.user_id, user.after)
+        except Exception as error:
+            user.failures += 1
+            user.interval = min(self.max_interval, user.interval * Config.POLLER_BACKOFF)
+            logger.warning("Polling user '%s' failed (%s in a row), next poll in %.0fs: %s",
+                           user.user_id, user.failures, user.interval, error)
+        else:
+            self.polls += 1
+            user.failures = 0
+            first_poll = user.polled_at is None
+            elapsed = user.interval if first_poll else started - user.polled_at
+            user.polled_at = started
+            if returned >= HISTORY_LIMIT and not first_poll:
+                logger.warning("User '%s' played %s+ tracks in %.0fs; older plays may be missing.",
+                               user.user_id, returned, elapsed)
+                user.interval = self.min_interval
+            else:
+                user.interval = next_interval(user.interval, len(items), elapsed, self.min_interval, self.max_interval)
+            user.after = max([user.after] + [event.played_at_ms for event in items])
+            self.pending.extend(items)
+            logger.debug("User '%s': %s new plays, next poll in %.0fs.", user.user_id, len(items), user.interval)
+        finally:
+            slots.release()
+
+        user.due = time.monotonic() + user.interval
+        heapq.heappush(self.schedule, user)
+        self._wakeup.set()
+        if len(self.pending) >= Config.TRANSFORM_BATCH_SIZE:
+            self._flush_now.set()
+
+    async def flush_pending(self) -> None:
+        """
+        Loads the buffered plays as one micro-batch; on failure they are kept for the next flush.
+        """
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        try:
+            self.inserted += await asyncio.get_running_loop().run_in_executor(self._loader, self.load_batch, batch)
+        except Exception as error:
+            logger.error("Loading a micro-batch of %s plays failed, retrying at the next flush: %s", len(batch), error)
+            self.pending = batch + self.pending
+
+    async def flush_periodically(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            if not self._stopping.is_set():
+                await self.flush_pending()
+
+    async def run(self, duration: Optional[float] = None) -> int:
+        """
+        Polls until `stop()` is called or `duration` seconds have passed, then loads what is pending.
+
+        Args:
+            duration (Optional[float]): Seconds to run for; runs until stopped if None.
+
+        Returns:
+            int: Number of rows inserted.
+        """
+        loop = asyncio.get_running_loop()
+        if duration is not None:
+            loop.call_later(duration, self.stop)
+
+        after = await loop.run_in_executor(self._pollers, resolve_extract_windows, self.user_ids)
+        now = time.monotonic()
+        for user_id in self.user_ids:
+            # The first polls are spread over the minimum interval instead of all firing at once.
+            self.schedule.append(UserSchedule(now + random.uniform(0, self.min_interval), user_id,
+                                              after[user_id], self.min_interval))
+        heapq.heapify(self.schedule)
+        logger.info("Polling %s user(s) every %g-%gs, loading every %gs.",
+                    len(self.user_ids), self.min_interval, self.max_interval, self.flush_interval)
+
+        slots = asyncio.Semaphore(self.max_concurrency)
+        in_flight: Set[asyncio.Task] = set()
+        flusher = asyncio.create_task(self.flush_periodically())
+        try:
+            while not self._stopping.is_set():
+                while self.schedule and self.schedule[0].due <= time.monotonic() and not self._stopping.is_set():
+                    await slots.acquire()
+                    task = asyncio.create_task(self.poll(heapq.heappop(self.schedule), slots))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+
+                self._wakeup.clear()
+                timeout = max(0.0, self.schedule[0].due - time.monotonic()) if self.schedule else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+            await flusher
+            await self.flush_pending()
+            self._pollers.shutdown()
+            self._loader.shutdown()
+
+        logger.info("Poller stopped after %s polls: %s rows inserted, %s plays left unloaded.",
+                    self.polls, self.inserted, len(self.pending))
+        return self.inserted
+
+async def serve(poller: Poller, duration: Optional[float] = None) -> int:
+    """
+    Runs the poller until SIGINT/SIGTERM (or `duration`), loading the pending plays before exiting.
+    """
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, poller.stop)
+    return await poller.run(duration)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Poll the users' recently played tracks continuously.")
+    parser.add_argument("--users", nargs="+", help="Users to poll (defaults to SPOTIFY_USER_IDS).")
+    parser.add_argument("--min-interval", type=float, default=Config.POLLER_MIN_INTERVAL)
+    parser.add_argument("--max-interval", type=float, default=Config.POLLER_MAX_INTERVAL)
+    parser.add_argument("--flush-interval", type=float, default=Config.POLLER_FLUSH_INTERVAL)
+    parser.add_argument("--max-concurrency", type=int, default=Config.POLLER_MAX_CONCURRENCY)
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds.")
+    parser.add_argument("--database-url", help="Target database (defaults to DATABASE_URL).")
+    args = parser.parse_args()
+
+    poller = Poller(args.users or Config.USER_IDS, args.database_url, args.min_interval, args.max_interval,
+                    args.flush_interval, args.max_concurrency)
+    asyncio.run(serve(poller, args.duration))
+
+if __name__ == "__main__":
+    main()
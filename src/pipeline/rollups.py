@@ -0,0 +1,210 @@
+import argparse
+import pandas as pd
+from datetime import date
+from typing import Any, Dict, List, Optional
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy import BigInteger, Column, Date, Integer, MetaData, String, Table, delete, select, text
+from settings.config import Config
+from settings.logger import setup_logger
+
+logger = setup_logger(Config.LOGGER_NAME, Config.LOGGER_PATH)
+
+# Rows of the play history aggregated at a time by `rebuild_rollups`.
+REBUILD_CHUNK_ROWS = 100_000
+
+metadata = MetaData()
+
+rollup_artist_daily = Table(
+    "rollup_artist_daily", metadata,
+    Column("user_id", String, primary_key=True),
+    Column("day", Date, primary_key=True),
+    Column("artist_id", String, primary_key=True),
+    Column("artist_name", String),
+    Column("plays", Integer, nullable=False),
+    Column("duration_ms", BigInteger, nullable=False),
+)
+
+rollup_track_daily = Table(
+    "rollup_track_daily", metadata,
+    Column("user_id", String, primary_key=True),
+    Column("day", Date, primary_key=True),
+    Column("track_id", String, primary_key=True),
+    Column("song_name", String),
+    Column("artist_id", String),
+    Column("artist_name", String),
+    Column("plays", Integer, nullable=False),
+    Column("duration_ms", BigInteger, nullable=False),
+)
+
+# Natural key column and the descriptive columns kept (last value wins) of every rollup table.
+ROLLUPS = {
+    rollup_artist_daily: ("artist_id", ["artist_name"]),
+    rollup_track_daily: ("track_id", ["song_name", "artist_id", "artist_name"]),
+}
+
+SUPPORTED_DIALECTS = ("postgresql", "sqlite")
+
+_created_schemas: set[str] = set()
+
+def ensure_rollup_tables(conn: Connection) -> None:
+    engine_key = conn.engine.url.render_as_string(hide_password=False)
+    if engine_key not in _created_schemas:
+        metadata.create_all(conn, checkfirst=True)
+        for table in ROLLUPS:
+            rename_duration_s(conn, table)
+        _created_schemas.add(engine_key)
+
+def rename_duration_s(conn: Connection, table: Table) -> None:
+    """
+    Converts the `duration_s` column of a rollup table created by an earlier version, which summed whole
+    seconds, to `duration_ms`. The converted totals stay rounded to the second until the rollups are rebuilt.
+    """
+    from sqlalchemy import inspect
+
+    if "duration_s" not in {column["name"] for column in inspect(conn).get_columns(table.name)}:
+        return
+    conn.execute(text(f"ALTER TABLE {table.name} RENAME COLUMN duration_s TO duration_ms"))
+    conn.execute(text(f"UPDATE {table.name} SET duration_ms = duration_ms * 1000"))
+    logger.warning("Converted '%s' to 'duration_ms'; run `python -m pipeline.rollups rebuild` for exact totals.",
+                   table.name)
+
+def aggregate_plays(df: pd.DataFrame, key: str, columns: List[str]) -> List[Dict[str, Any]]:
+    """
+    Aggregates plays per user, day (UTC) and `key` into rollup rows with their play count and total duration
+    in milliseconds; plays without a duration count as 0.
+
+    Args:
+        df (pd.DataFrame): Loaded rows with the playlog columns.
+        key (str): Column the plays are grouped by besides user and day.
+        columns (List[str]): Descriptive columns carried over from the last play of each group.
+
+    Returns:
+        List[Dict[str, Any]]: One row per group; plays without a `key` or `played_at` are left out.
+    """
+    plays = df[["user_id", key, *columns]].assign(
+        day=pd.to_datetime(df["played_at"], errors="coerce").dt.date,
+        plays=1,
+        duration_ms=pd.to_numeric(df["duration_ms"], errors="coerce").fillna(0).astype("int64"),
+    ).dropna(subset=["user_id", "day", key])
+
+    grouped = plays.groupby(["user_id", "day", key], sort=False)
+    rollup = grouped[["plays", "duration_ms"]].sum().join(grouped[columns].last()).reset_index()
+    rollup = rollup.astype(object).where(rollup.notna(), None)
+    return rollup.to_dict("records")
+
+def upsert_add(conn: Connection, table: Table, rows: List[Dict[str, Any]]) -> None:
+    """
+    Inserts rollup rows, adding their plays and duration to the rows that already exist.
+    """
+    from pipeline.star import dialect_insert
+
+    if not rows:
+        return
+    statement = dialect_insert(conn.engine, table)
+    updates = {column.name: statement.excluded[column.name] for column in table.columns if not column.primary_key}
+    updates.update(plays=table.c.plays + statement.excluded.plays,
+                   duration_ms=table.c.duration_ms + statement.excluded.duration_ms)
+    conn.execute(statement.on_conflict_do_update(index_elements=list(table.primary_key.columns), set_=updates), rows)
+
+def add_plays(conn: Connection, df: pd.DataFrame) -> None:
+    """
+    Adds newly inserted plays to the daily rollups, inside the caller's load transaction.
+
+    Only rows that were actually inserted may be passed, since the rollups count every row they are given.
+    Does nothing when `MAINTAIN_ROLLUPS` is disabled, the batch is empty or the database is not PostgreSQL or SQLite.
+
+    Args:
+        conn (Connection): Open connection of the load transaction.
+        df (pd.DataFrame): Inserted rows with the playlog columns.
+    """
+    if not Config.MAINTAIN_ROLLUPS or df.empty:
+        return
+    if conn.dialect.name not in SUPPORTED_DIALECTS:
+        logger.warning("Rollups are not supported for '%s', skipping.", conn.dialect.name)
+        return
+
+    ensure_rollup_tables(conn)
+    for table, (key, columns) in ROLLUPS.items():
+        rows = aggregate_plays(df, key, columns)
+        upsert_add(conn, table, rows)
+        logger.debug("Added %s plays to %s rows of '%s'.", len(df), len(rows), table.name)
+
+def delete_days(conn: Connection, user_ids: List[str], since: date, until: date) -> None:
+    """
+    Deletes the rollup rows of `user_ids` for the days in [since, until), inside the caller's transaction,
+    e.g. before their plays are deleted and loaded again.
+
+    Does nothing when `MAINTAIN_ROLLUPS` is disabled or the database is not PostgreSQL or SQLite.
+    """
+    if not Config.MAINTAIN_ROLLUPS or conn.dialect.name not in SUPPORTED_DIALECTS:
+        return
+
+    ensure_rollup_tables(conn)
+    for table in ROLLUPS:
+        conn.execute(delete(table).where(table.c.user_id.in_(user_ids), table.c.day >= since, table.c.day < until))
+
+def play_history(table_name: str, since: Optional[date] = None) -> Any:
+    """
+    Returns the query reading every play in the columns of the playlog table, from the star schema
+    with `LOAD_SCHEMA=star`, optionally limited to plays on or after `since`.
+    """
+    if Config.LOAD_SCHEMA == "star":
+        from pipeline.star import dim_artist, dim_track, dim_user, fact_play
+
+        query = (select(dim_user.c.user_id, dim_artist.c.artist_name, dim_artist.c.artist_id, dim_track.c.song_name,
+                        dim_track.c.track_id, dim_track.c.duration_ms, fact_play.c.played_at)
+                 .select_from(fact_play.join(dim_user, fact_play.c.user_key == dim_user.c.user_key)
+                              .join(dim_track, fact_play.c.track_key == dim_track.c.track_key)
+                              .outerjoin(dim_artist, fact_play.c.artist_key == dim_artist.c.artist_key)))
+        return query.where(fact_play.c.played_at >= since) if since else query
+
+    columns = "user_id, artist_name, artist_id, song_name, track_id, duration_ms, played_at"
+    if since:
+        return text(f"SELECT {columns} FROM {table_name} WHERE played_at >= :since").bindparams(since=since)
+    return text(f"SELECT {columns} FROM {table_name}")
+
+def rebuild_rollups(engine: Engine, table_name: Optional[str] = None, since: Optional[date] = None) -> int:
+    """
+    Recomputes the rollups from the play history, e.g. after a failed load or a manual fix of the plays.
+
+    The rollup rows from `since` on (all of them if None) are deleted and rebuilt in one transaction,
+    reading the history in chunks of `REBUILD_CHUNK_ROWS` rows. The analytics results cached in this
+    process are dropped afterwards.
+
+    Args:
+        engine (Engine): SQLAlchemy Engine instance connected to PostgreSQL or SQLite.
+        table_name (str): Name of the playlog table (unused with `LOAD_SCHEMA=star`).
+        since (Optional[date]): First day to rebuild.
+
+    Returns:
+        int: Number of plays aggregated.
+    """
+    table_name = Config.TABLE_NAME if table_name is None else table_name
+    logger.info("Rebuilding rollups from %s.", since or "the first play")
+    plays = 0
+    with engine.begin() as conn:
+        ensure_rollup_tables(conn)
+        for table in ROLLUPS:
+            conn.execute(delete(table).where(table.c.day >= since) if since else delete(table))
+        for chunk in pd.read_sql(play_history(table_name, since), conn, chunksize=REBUILD_CHUNK_ROWS):
+            for table, (key, columns) in ROLLUPS.items():
+                upsert_add(conn, table, aggregate_plays(chunk, key, columns))
+            plays += len(chunk)
+    from pipeline.analytics import invalidate_all
+    invalidate_all()
+    logger.info("Rollups rebuilt from %s plays.", plays)
+    return plays
+
+def main() -> None:
+    from pipeline.load import get_database_engine
+
+    parser = argparse.ArgumentParser(description="Maintain the daily listening rollups.")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--since", type=date.fromisoformat, help="First day to rebuild (default: all).")
+    parser.add_argument("--table", default=Config.TABLE_NAME)
+    args = parser.parse_args()
+
+    rebuild_rollups(get_database_engine(), args.table, args.since)
+
+if __name__ == "__main__":
+    main()
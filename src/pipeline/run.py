@@ -0,0 +1,125 @@
+import argparse
+from pathlib import Path
+from dataclasses import dataclass, field
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, List, Optional
+from settings.config import Config
+from settings.logger import setup_logger
+from settings.metrics import flush, instrument
+from pipeline.extract import RawEventWriter, extract_users, merge_user_tracks, resolve_extract_windows
+from pipeline.enrich import enrich_items, enrichment_enabled
+from pipeline.transform import transform_items
+from pipeline.load import get_database_engine, load_dataframe
+from pipeline.staging import StagingWriter
+from pipeline.state import get_watermark_store
+from pipeline.dedup import get_seen_index
+from pipeline.archive import get_raw_archive
+from pipeline.events import PlayEvent
+
+logger = setup_logger(Config.LOGGER_NAME, Config.LOGGER_PATH)
+
+@dataclass
+class PipelineResult:
+    """
+    Summary of a single-process pipeline run.
+    """
+    events: int = 0
+    rows: int = 0
+    inserted: int = 0
+    failed_users: List[str] = field(default_factory=list)
+
+def persist_raw_events(items: List[PlayEvent], path: Path) -> None:
+    """
+    Writes the extracted play events to the newline-delimited raw file.
+    """
+    with RawEventWriter(path) as writer:
+        writer.write(items)
+    logger.info("%s raw play events persisted to %s.", writer.count, path)
+
+def persist_staged_data(df: Any, path: Path) -> None:
+    """
+    Writes the transformed rows to the staging file.
+    """
+    with StagingWriter(path) as writer:
+        writer.write(df)
+    logger.info("%s transformed rows persisted to %s.", writer.rows, path)
+
+@instrument()
+def run_pipeline(user_ids: Optional[List[str]] = None, persist_artifacts: Optional[bool] = None,
+                 database_url: Optional[str] = None) -> PipelineResult:
+    """
+    Runs extract, (enrich,) transform and load in one process, handing the payload and DataFrame over in memory.
+
+    Raw events and staged rows are only written if `persist_artifacts` is set, and then on a
+    background thread while the next stage runs; the run waits for them before returning.
+    New events are appended to the raw archive on the same thread.
+
+    Args:
+        user_ids (Optional[List[str]]): Users to process; defaults to `Config.USER_IDS`.
+        persist_artifacts (bool): Whether to also write the raw and staged files.
+        database_url (Optional[str]): Target database URL; defaults to `Config.DATABASE_URL`.
+
+    Returns:
+        PipelineResult: Event, row and insert counts of the run.
+
+    Raises:
+        RuntimeError: If extraction failed for some users (after the others were loaded) or persisting failed.
+    """
+    persist_artifacts = Config.PERSIST_ARTIFACTS if persist_artifacts is None else persist_artifacts
+    user_ids = user_ids or Config.USER_IDS
+    logger.info("Starting in-memory Spotify ETL run for %s user(s).", len(user_ids))
+    result = PipelineResult()
+    pending: List[Future] = []
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="persist") as persister:
+        extraction = extract_users(user_ids, resolve_extract_windows(user_ids))
+        result.failed_users = extraction.failed_users
+        items = merge_user_tracks(extraction.payloads)["items"]
+        seen = get_seen_index()
+        if seen is not None:
+            items = seen.unseen(items)
+        result.events = len(items)
+
+        if persist_artifacts:
+            pending.append(persister.submit(persist_raw_events, items, Config.SPOTIFY_RAW_EVENTS_PATH))
+        archive = get_raw_archive()
+        if archive is not None and items:
+            pending.append(persister.submit(archive.write, items))
+
+        if items and enrichment_enabled():
+            enrich_items(items)
+
+        if items:
+            watermarks = get_watermark_store().get_many(extraction.payloads)
+            df = transform_items(items, watermarks)
+            result.rows = len(df)
+
+            if persist_artifacts:
+                pending.append(persister.submit(persist_staged_data, df, Config.SPOTIFY_STAGED_DATA_PATH))
+
+            if not df.empty:
+                result.inserted = load_dataframe(df, Config.TABLE_NAME, get_database_engine(database_url))
+        else:
+            logger.info("No new plays extracted, skipping transform and load.")
+
+    for future in pending:
+        future.result()
+
+    if result.failed_users:
+        raise RuntimeError(f"Extraction failed for users: {', '.join(result.failed_users)}")
+
+    logger.info("In-memory Spotify ETL run completed: %s events, %s rows, %s inserted.",
+                result.events, result.rows, result.inserted)
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Spotify ETL pipeline in a single process.")
+    parser.add_argument("--users", nargs="+", help="Users to process (defaults to SPOTIFY_USER_IDS).")
+    parser.add_argument("--persist", action=argparse.BooleanOptionalAction, default=Config.PERSIST_ARTIFACTS,
+                        help="Also write the raw and staged files in the background.")
+    args = parser.parse_args()
+
+    try:
+        run_pipeline(args.users, args.persist)
+    finally:
+        flush("run")
@@ -0,0 +1,143 @@
+import re
+from pathlib import Path
+from dataclasses import dataclass
+from typing import List, Optional
+from settings.config import Config
+from settings.logger import setup_logger
+
+logger = setup_logger(Config.LOGGER_NAME, Config.LOGGER_PATH)
+
+# Each shard task runs a single stage, so the stage modules are imported by the function that needs
+# them: the extract task never loads pandas or SQLAlchemy, and planning the shards loads neither.
+
+@dataclass(frozen=True)
+class ShardArtifacts:
+    """
+    Run-scoped files of one user shard, derived from the run date, run id and shard number alone,
+    so the tasks of a shard find each other's output without passing it through XCom.
+    """
+    raw: Path
+    staged: Path
+
+def shard_users(user_ids: List[str], shard_size: Optional[int] = None) -> List[List[str]]:
+    """
+    Splits the users into shards of at most `shard_size` users, in a stable order.
+    """
+    shard_size = Config.USER_SHARD_SIZE if shard_size is None else shard_size
+    user_ids = sorted(set(user_ids))
+    size = max(1, shard_size)
+    return [user_ids[start:start + size] for start in range(0, len(user_ids), size)]
+
+def shard_artifacts(run_date: str, run_id: str, shard: int) -> ShardArtifacts:
+    """
+    Returns the artifact paths of a shard under `Config.RUNS_DIR/<run_date>/<run_id>/`.
+
+    Args:
+        run_date (str): Logical date of the run (YYYY-MM-DD).
+        run_id (str): Identifier of the run; unsafe path characters are replaced.
+        shard (int): Number of the shard within the run.
+
+    Returns:
+        ShardArtifacts: Raw events and staged data paths of the shard.
+    """
+    run_dir = Config.RUNS_DIR / run_date / re.sub(r"[^A-Za-z0-9_.-]", "_", run_id)
+    suffix = ".csv" if Config.STAGING_FORMAT == "csv" else ".parquet"
+    return ShardArtifacts(raw=run_dir / f"shard_{shard:04d}.ndjson", staged=run_dir / f"shard_{shard:04d}{suffix}")
+
+def share_rate_budget(active_shards: Optional[int] = None) -> None:
+    """
+    Gives this process's client an equal share of the API rate budget, so that
+    `active_shards` concurrent shard or backfill chunk tasks together stay within `HTTP_RATE_LIMIT`.
+    """
+    active_shards = Config.MAX_ACTIVE_SHARDS if active_shards is None else active_shards
+    from pipeline.client import get_client
+
+    shares = max(1, active_shards)
+    bucket = get_client().bucket
+    bucket.rate = Config.HTTP_RATE_LIMIT / shares
+    bucket.capacity = max(1.0, Config.HTTP_RATE_BURST / shares)
+
+def extract_shard(user_ids: List[str], artifacts: ShardArtifacts) -> int:
+    """
+    Streams the recently played tracks of the shard's users to the shard's raw file,
+    skipping the plays that were already loaded.
+
+    Returns:
+        int: Number of new play events written.
+
+    Raises:
+        RuntimeError: If extraction failed for some users of the shard.
+    """
+    from pipeline.archive import get_raw_archive
+    from pipeline.dedup import get_seen_index
+    from pipeline.extract import RawEventWriter, extract_users, resolve_extract_windows
+
+    share_rate_budget()
+    with RawEventWriter(artifacts.raw, get_seen_index(), get_raw_archive()) as writer:
+        result = extract_users(user_ids, resolve_extract_windows(user_ids), on_page=writer.write)
+    logger.info("%s new play events of %s user(s) saved to %s, %s already loaded.",
+                writer.count, len(user_ids), artifacts.raw, writer.skipped)
+
+    if result.failed_users:
+        raise RuntimeError(f"Extraction failed for users: {', '.join(result.failed_users)}")
+    return writer.count
+
+def enrich_shard(artifacts: ShardArtifacts) -> int:
+    """
+    Fetches the catalog metadata of the shard's raw events into the metadata cache, when
+    `enrichment_enabled()`; otherwise, or without new plays, does nothing.
+
+    Returns:
+        int: Number of tracks and artists resolved.
+    """
+    from pipeline.enrich import enrich_items, enrichment_enabled
+    from pipeline.transform import iter_raw_batches
+
+    if not enrichment_enabled() or not artifacts.raw.exists() or artifacts.raw.stat().st_size == 0:
+        return 0
+
+    share_rate_budget()
+    metadata = enrich_items(item for batch in iter_raw_batches(artifacts.raw) for item in batch)
+    return sum(len(objects) for objects in metadata.values())
+
+def transform_shard(user_ids: List[str], artifacts: ShardArtifacts) -> int:
+    """
+    Transforms the shard's raw events into the shard's staging file.
+
+    A shard without new plays gets an empty staging file instead of failing the run.
+
+    Returns:
+        int: Number of rows staged.
+    """
+    from pipeline.staging import StagingWriter
+    from pipeline.transform import iter_raw_batches, transform_track_batches
+    from pipeline.state import get_watermark_store
+
+    if not artifacts.raw.exists() or artifacts.raw.stat().st_size == 0:
+        logger.info("No new plays for users %s.", ', '.join(user_ids))
+        with StagingWriter(artifacts.staged):
+            pass
+        return 0
+
+    watermarks = get_watermark_store().get_many(user_ids)
+    rows = transform_track_batches(iter_raw_batches(artifacts.raw), artifacts.staged, watermarks)
+    logger.info("%s transformed rows saved to %s.", rows, artifacts.staged)
+    return rows
+
+def load_shard(artifacts: ShardArtifacts) -> int:
+    """
+    Loads the shard's staging file into the playlog table.
+
+    Returns:
+        int: Number of rows inserted.
+    """
+    from pipeline.staging import is_staged_empty, read_staged_data
+
+    if is_staged_empty(artifacts.staged):
+        logger.info("Nothing to load from %s.", artifacts.staged)
+        return 0
+
+    from pipeline.load import get_database_engine, load_dataframe
+
+    df = read_staged_data(artifacts.staged)
+    return load_dataframe(df, Config.TABLE_NAME, get_database_engine())
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Optional
+from settings.config import Config
+from settings.logger import setup_logger
+from settings.metrics import count, instrument
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+logger = setup_logger(Config.LOGGER_NAME, Config.LOGGER_PATH)
+
+# pandas and pyarrow are imported by the functions that use them, so importing this module
+# (e.g. for `staged_data_path`) stays cheap and CSV staging never loads pyarrow.
+STAGING_COLUMNS = ["user_id", "artist_name", "artist_id", "song_name", "track_id", "duration_ms", "popularity", "played_at"]
+# The CSV export also carries the duration as "m:ss" text for reading; loads use `duration_ms`.
+CSV_COLUMNS = ["user_id", "artist_name", "artist_id", "song_name", "track_id", "duration", "duration_ms", "popularity",
+               "played_at"]
+
+@lru_cache(maxsize=None)
+def staging_schema() -> pa.Schema:
+    """
+    Returns the Arrow schema of the staged rows.
+    """
+    import pyarrow as pa
+
+    return pa.schema([
+        ("user_id", pa.string()),
+        ("artist_name", pa.string()),
+        ("artist_id", pa.string()),
+        ("song_name", pa.string()),
+        ("track_id", pa.string()),
+        ("duration_ms", pa.int64()),
+        ("popularity", pa.int64()),
+        ("played_at", pa.timestamp("s")),
+    ])
+
+@instrument()
+def format_duration(duration_ms: pd.Series) -> pd.Series:
+    """
+    Formats track durations given in milliseconds as "m:ss" strings.
+
+    Args:
+        duration_ms (pd.Series): Durations in milliseconds; non-numeric values become None.
+
+    Returns:
+        pd.Series: The formatted durations.
+    """
+    import pandas as pd
+
+    duration_ms = pd.to_numeric(duration_ms, errors="coerce")
+    valid = duration_ms.notna()
+    total_seconds = (duration_ms[valid] // 1000).astype("int64")
+
+    minutes = (total_seconds // 60).astype(str)
+    seconds = (total_seconds % 60).astype(str).str.zfill(2)
+
+    formatted = pd.Series(None, index=duration_ms.index, dtype=object)
+    formatted[valid] = (minutes + ":" + seconds).to_numpy(dtype=object)
+    return formatted
+
+PARTITION_COLUMN = "play_date"
+# Zero-row file written into a partitioned dataset directory that received no rows, so an empty
+# transform is staged as "empty" rather than "missing".
+EMPTY_DATASET_FILE = "empty.parquet"
+
+def staged_data_path() -> Path:
+    """
+    Returns the handoff path between transform and load for the configured staging format.
+    """
+    if Config.STAGING_FORMAT == "csv":
+        return Config.SPOTIFY_TRANSFORMED_DATA_PATH
+    return Config.SPOTIFY_STAGED_DATA_PATH
+
+class StagingWriter:
+    """
+    Writes transformed batches to the staging file, one call per batch.
+
+    A `.csv` path produces the CSV export with `played_at` formatted as %Y-%m-%d %H:%M:%S and the
+    duration also formatted as "m:ss".
+    Any other path produces typed Parquet: a single file, or with `partition_by_day` a dataset
+    directory with one `play_date=YYYY-MM-DD` partition per day. Existing output is replaced.
+    Without rows, the output is an empty CSV with its header, or a zero-row Parquet file (inside
+    the dataset directory when partitioned), so load always finds the staged data.
+    """
+    def __init__(self, path: Path, partition_by_day: Optional[bool] = None):
+        partition_by_day = Config.STAGING_PARTITION_BY_DAY if partition_by_day is None else partition_by_day
+        self.path = path
+        self.is_csv = path.suffix == ".csv"
+        self.partition_by_day = partition_by_day and not self.is_csv
+        self.rows = 0
+        self._batches = 0
+        self._writer: Optional[pq.ParquetWriter] = None
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.is_dir():
+            shutil.rmtree(path)
+        elif path.exists():
+            path.unlink()
+
+    def write(self, df: pd.DataFrame) -> None:
+        if not self.is_csv:
+            import pyarrow as pa
+            import pyarrow.compute as pc
+            import pyarrow.parquet as pq
+
+        if self.is_csv:
+            first_batch = self._batches == 0
+            df = df.assign(duration=format_duration(df["duration_ms"]))[CSV_COLUMNS]
+            df.to_csv(self.path, index=False, mode="w" if first_batch else "a", header=first_batch,
+                      date_format="%Y-%m-%d %H:%M:%S")
+        elif self.partition_by_day:
+            table = pa.Table.from_pandas(df, schema=staging_schema(), preserve_index=False)
+            table = table.append_column(PARTITION_COLUMN, pc.strftime(table["played_at"], format="%Y-%m-%d"))
+            pq.write_to_dataset(table, self.path, partition_cols=[PARTITION_COLUMN],
+                                basename_template=f"batch-{self._batches}-{{i}}.parquet")
+        else:
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, staging_schema(), compression="snappy")
+            self._writer.write_table(pa.Table.from_pandas(df, schema=staging_schema(), preserve_index=False))
+
+        self._batches += 1
+        self.rows += len(df)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        elif self._batches == 0 and self.is_csv:
+            self.path.write_text(",".join(CSV_COLUMNS) + "\n", encoding="utf-8")
+        elif self._batches == 0 and not self.partition_by_day:
+            import pyarrow.parquet as pq
+            pq.write_table(staging_schema().empty_table(), self.path)
+        elif self.partition_by_day and not self.path.exists():
+            import pyarrow.parquet as pq
+            self.path.mkdir(parents=True)
+            pq.write_table(staging_schema().empty_table(), self.path / EMPTY_DATASET_FILE)
+        if Config.METRICS_ENABLED:
+            count("staging.write", rows=self.rows, bytes_out=staged_size(self.path))
+
+    def __enter__(self) -> "StagingWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+def staged_size(path: Path) -> int:
+    """
+    Returns the size in bytes of a staging file or partitioned dataset directory.
+    """
+    if path.is_dir():
+        return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+    return path.stat().st_size if path.exists() else 0
+
+def is_staged_empty(path: Path) -> bool:
+    """
+    Tells whether the staged data holds no rows, reading only the CSV header or the Parquet footers
+    (of every file of a partitioned dataset directory).
+
+    Raises:
+        FileNotFoundError: If nothing has been staged at path.
+    """
+    if not path.exists():
+        raise FileNotFoundError(f"Staged data not found: {path}.")
+
+    if path.suffix == ".csv":
+        with path.open("r", encoding="utf-8") as file:
+            file.readline()
+            return not file.readline().strip()
+
+    import pyarrow.parquet as pq
+
+    files = sorted(path.rglob("*.parquet")) if path.is_dir() else [path]
+    return all(pq.read_metadata(file).num_rows == 0 for file in files)
+
+@instrument()
+def read_staged_data(path: Path) -> pd.DataFrame:
+    """
+    Reads the staged data written by `StagingWriter`.
+
+    Parquet is read with its stored types, so `played_at` arrives as datetime without re-parsing.
+    The "m:ss" duration text of the CSV export is dropped in favour of `duration_ms`.
+
+    Args:
+        path (Path): Staging file or partitioned dataset directory.
+
+    Returns:
+        pd.DataFrame: The staged rows.
+
+    Raises:
+        FileNotFoundError: If nothing has been staged at path.
+    """
+    if not path.exists():
+        logger.error("Staged data not found: %s.", path)
+        raise FileNotFoundError(f"Staged data not found: {path}.")
+
+    import pandas as pd
+
+    if path.suffix == ".csv":
+        df = pd.read_csv(path).drop(columns=["duration"], errors="ignore")
+    else:
+        import pyarrow.parquet as pq
+        df = pq.read_table(path, schema=staging_schema() if path.is_file() else None).to_pandas()
+        df = df.drop(columns=[PARTITION_COLUMN], errors="ignore")
+
+    if Config.METRICS_ENABLED:
+        count(rows=len(df), bytes_in=staged_size(path))
+    return df
@@ -0,0 +1,246 @@
+import threading
+import pandas as pd
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy import (BigInteger, Boolean, Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, select)
+from sqlalchemy.dialects import postgresql, sqlite
+from settings.config import Config
+from settings.logger import setup_logger
+from pipeline.enrich import enrichment_enabled, get_metadata_cache
+from pipeline import rollups
+
+logger = setup_logger(Config.LOGGER_NAME, Config.LOGGER_PATH)
+
+UPSERT_CHUNK_ROWS = 500
+
+metadata = MetaData()
+
+dim_user = Table(
+    "dim_user", metadata,
+    Column("user_key", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", String, nullable=False, unique=True),
+)
+
+dim_artist = Table(
+    "dim_artist", metadata,
+    Column("artist_key", Integer, primary_key=True, autoincrement=True),
+    Column("artist_id", String, nullable=False, unique=True),
+    Column("artist_name", String),
+    Column("genres", String),
+)
+
+dim_track = Table(
+    "dim_track", metadata,
+    Column("track_key", Integer, primary_key=True, autoincrement=True),
+    Column("track_id", String, nullable=False, unique=True),
+    Column("song_name", String),
+    Column("duration_ms", BigInteger),
+    Column("popularity", Integer),
+    Column("artist_key", Integer, ForeignKey("dim_artist.artist_key")),
+    Column("album_id", String),
+    Column("album_name", String),
+    Column("release_date", String),
+    Column("explicit", Boolean),
+)
+
+fact_play = Table(
+    "fact_play", metadata,
+    Column("user_key", Integer, ForeignKey("dim_user.user_key"), nullable=False),
+    Column("track_key", Integer, ForeignKey("dim_track.track_key"), nullable=False),
+    Column("artist_key", Integer, ForeignKey("dim_artist.artist_key")),
+    Column("played_at", DateTime, nullable=False),
+    Index("fact_play_key", "user_key", "played_at", "track_key", unique=True),
+    Index("fact_play_played_at_idx", "played_at"),
+    Index("fact_play_track_key_idx", "track_key"),
+    Index("fact_play_artist_key_idx", "artist_key"),
+)
+
+def dialect_insert(engine: Engine, table: Table) -> Any:
+    """
+    Returns an INSERT construct supporting ON CONFLICT for PostgreSQL and SQLite.
+
+    Raises:
+        NotImplementedError: For other databases.
+    """
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    if engine.dialect.name == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"Star schema loading is not supported for '{engine.dialect.name}'.")
+
+class DimensionKeyCache:
+    """
+    In-process cache mapping natural IDs to surrogate keys, per database and dimension table.
+
+    Only IDs missing from the cache reach the database, in bulk upserts that return their keys.
+    Keys resolved inside a load transaction are collected in a pending map and only added to the
+    cache by `remember` once that transaction has committed, so a rollback never leaves keys of
+    rows that do not exist.
+    """
+    def __init__(self):
+        self._keys: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, conn: Connection, table: Table, natural_column: str, records: Dict[str, Dict[str, Any]],
+                pending: Dict[Tuple[str, str], Dict[str, int]]) -> Dict[str, int]:
+        """
+        Returns the surrogate key of every natural ID in `records`, upserting unknown ones.
+
+        Args:
+            conn (Connection): Open connection inside the load transaction.
+            table (Table): Dimension table.
+            natural_column (str): Column holding the natural (Spotify) ID.
+            records (Dict[str, Dict[str, Any]]): Attribute values per natural ID.
+            pending (Dict[Tuple[str, str], Dict[str, int]]): Keys resolved by the transaction so far;
+                the keys upserted here are added to it, to be passed to `remember` after commit.
+
+        Returns:
+            Dict[str, int]: Surrogate key per natural ID.
+        """
+        cache_key = (conn.engine.url.render_as_string(hide_password=False), table.name)
+        with self._lock:
+            known = self._keys.get(cache_key, {})
+            keys = {natural_id: known[natural_id] for natural_id in records if natural_id in known}
+        missing = [natural_id for natural_id in records if natural_id not in keys]
+
+        key_column = table.primary_key.columns[0]
+        natural = table.c[natural_column]
+
+        for start in range(0, len(missing), UPSERT_CHUNK_ROWS):
+            chunk = missing[start:start + UPSERT_CHUNK_ROWS]
+            rows = [{natural_column: natural_id, **records[natural_id]} for natural_id in chunk]
+            statement = dialect_insert(conn.engine, table).values(rows)
+            updates = {column: statement.excluded[column] for column in rows[0] if column != natural_column}
+            statement = (statement.on_conflict_do_update(index_elements=[natural], set_=updates) if updates
+                         else statement.on_conflict_do_nothing(index_elements=[natural]))
+            conn.execute(statement)
+            resolved = dict(conn.execute(select(natural, key_column).where(natural.in_(chunk))).all())
+            pending.setdefault(cache_key, {}).update(resolved)
+            keys.update(resolved)
+
+        return keys
+
+    def remember(self, pending: Dict[Tuple[str, str], Dict[str, int]]) -> None:
+        """
+        Adds the keys resolved by a committed load transaction to the cache.
+        """
+        with self._lock:
+            for cache_key, keys in pending.items():
+                self._keys.setdefault(cache_key, {}).update(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys.clear()
+
+dimension_keys = DimensionKeyCache()
+_created_schemas: set[str] = set()
+
+def artist_genres(artist_ids: List[str]) -> Dict[str, Optional[str]]:
+    """
+    Returns the comma-joined genres of every artist, None for artists missing from the metadata cache,
+    when enrichment is enabled.
+    """
+    if not enrichment_enabled():
+        return {}
+    artists = get_metadata_cache().get_many("artists", artist_ids)
+    return {artist_id: ", ".join(artists[artist_id].get("genres") or []) if artist_id in artists else None
+            for artist_id in artist_ids}
+
+def track_albums(track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns the album and explicit flag of every track from the metadata cache, None values for
+    tracks missing from it, when enrichment is enabled.
+    """
+    if not enrichment_enabled():
+        return {}
+    tracks = get_metadata_cache().get_many("tracks", track_ids)
+    albums = {}
+    for track_id in track_ids:
+        track = tracks.get(track_id, {})
+        album = track.get("album") or {}
+        albums[track_id] = {"album_id": album.get("id"), "album_name": album.get("name"),
+                            "release_date": album.get("release_date"), "explicit": track.get("explicit")}
+    return albums
+
+def records_by_id(df: pd.DataFrame, id_column: str, columns: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns the attribute values of the first row of every distinct ID, with missing values as None.
+    """
+    unique = df.drop_duplicates(subset=id_column)[[id_column, *columns]]
+    unique = unique.astype(object).where(unique.notna(), None)
+    return {row[0]: dict(zip(columns, row[1:])) for row in unique.itertuples(index=False, name=None)}
+
+def load_star_schema(df: pd.DataFrame, engine: Engine,
+                     before_insert: Optional[Callable[[Connection], Any]] = None) -> int:
+    """
+    Loads transformed rows into the `fact_play` table and its `dim_user`, `dim_artist` and `dim_track` dimensions.
+
+    Surrogate keys come from the in-process `DimensionKeyCache`, which learns the keys of new dimension
+    rows only after the transaction commits; dimension rows are bulk upserted and
+    fact rows, which hold only keys and the play timestamp, are inserted with ON CONFLICT DO NOTHING.
+    The facts that were inserted are added to the daily rollups in the same transaction.
+
+    Args:
+        df (pd.DataFrame): Transformed rows.
+        engine (Engine): SQLAlchemy Engine instance connected to PostgreSQL or SQLite.
+        before_insert (Optional[Callable[[Connection], Any]]): Called first in the load transaction.
+
+    Returns:
+        int: Number of fact rows inserted.
+    """
+    df = df[df["track_id"].notna() & df["played_at"].notna()].reset_index(drop=True)
+    if df.empty:
+        return 0
+
+    engine_key = engine.url.render_as_string(hide_password=False)
+    if engine_key not in _created_schemas:
+        metadata.create_all(engine, checkfirst=True)
+        _created_schemas.add(engine_key)
+    played_at = pd.to_datetime(df["played_at"])
+
+    # Keys of dimension rows upserted by this transaction; cached only once it has committed.
+    pending: Dict[Tuple[str, str], Dict[str, int]] = {}
+    with engine.begin() as conn:
+        if before_insert is not None:
+            before_insert(conn)
+        user_keys = dimension_keys.resolve(conn, dim_user, "user_id",
+                                           {user_id: {} for user_id in df["user_id"].unique()}, pending)
+
+        artists = records_by_id(df[df["artist_id"].notna()], "artist_id", ["artist_name"])
+        for artist_id, genres in artist_genres(list(artists)).items():
+            artists[artist_id]["genres"] = genres
+        artist_keys = dimension_keys.resolve(conn, dim_artist, "artist_id", artists, pending)
+
+        tracks = records_by_id(df, "track_id", ["song_name", "duration_ms", "popularity", "artist_id"])
+        for track in tracks.values():
+            track["artist_key"] = artist_keys.get(track.pop("artist_id"))
+        for track_id, album in track_albums(list(tracks)).items():
+            tracks[track_id].update(album)
+        track_keys = dimension_keys.resolve(conn, dim_track, "track_id", tracks, pending)
+
+        facts = pd.DataFrame({
+            "user_key": df["user_id"].map(user_keys),
+            "track_key": df["track_id"].map(track_keys),
+            "artist_key": df["artist_id"].map(artist_keys).astype("Int64"),
+        })
+        rows = facts.astype(object).where(facts.notna(), None).to_dict("records")
+        for row, timestamp in zip(rows, played_at.dt.to_pydatetime()):
+            row["played_at"] = timestamp
+
+        statement = dialect_insert(engine, fact_play).on_conflict_do_nothing(
+            index_elements=["user_key", "played_at", "track_key"])
+        if not Config.MAINTAIN_ROLLUPS:
+            inserted = conn.execute(statement, rows).rowcount if rows else 0
+        else:
+            returned = conn.execute(statement.returning(fact_play.c.user_key, fact_play.c.played_at,
+                                                        fact_play.c.track_key), rows).all() if rows else []
+            # Only the plays that were not stored before are added to the rollups.
+            new_plays = set(returned)
+            fresh = [(user_key, timestamp, track_key) in new_plays for user_key, timestamp, track_key
+                     in zip(facts["user_key"], played_at.dt.to_pydatetime(), facts["track_key"])]
+            rollups.add_plays(conn, df[fresh])
+            inserted = len(returned)
+    dimension_keys.remember(pending)
+
+    logger.info("%s of %s plays loaded into the star schema.", inserted, len(df))
+    return inserted
@@ -0,0 +1,74 @@
+import sqlite3
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional
+from settings.config import Config
+
+class WatermarkStore:
+    """
+    Persisted per-user high watermark: the latest `played_at` (Unix milliseconds) already loaded.
+
+    Watermarks only move forward, so re-applying the same batch is a no-op.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS watermarks (
+                    user_id TEXT PRIMARY KEY,
+                    played_at_ms INTEGER NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, user_id: str) -> Optional[int]:
+        """
+        Returns the watermark of a user, or None if nothing has been loaded for them yet.
+        """
+        return self.get_many([user_id]).get(user_id)
+
+    def get_many(self, user_ids: Iterable[str]) -> Dict[str, int]:
+        """
+        Returns the watermarks of the given users that have one.
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in user_ids)
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT user_id, played_at_ms FROM watermarks WHERE user_id IN ({placeholders})",
+                                user_ids).fetchall()
+        return dict(rows)
+
+    def advance(self, watermarks: Dict[str, int]) -> None:
+        """
+        Moves the watermarks of the given users forward; older values are ignored.
+
+        Args:
+            watermarks (Dict[str, int]): Latest loaded `played_at` per user in Unix milliseconds.
+        """
+        with self._connect() as conn:
+            conn.executemany("""
+                INSERT INTO watermarks (user_id, played_at_ms) VALUES (?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET played_at_ms = MAX(played_at_ms, excluded.played_at_ms)
+            """, list(watermarks.items()))
+
+_store: Optional[WatermarkStore] = None
+
+def get_watermark_store() -> WatermarkStore:
+    """
+    Returns the process-wide watermark store stored at `Config.STATE_PATH`.
+    """
+    global _store
+    if _store is None:
+        _store = WatermarkStore(Config.STATE_PATH)
+    return _store
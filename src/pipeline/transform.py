@@ -1,12 +1,28 @@
+from __future__ import annotations
+
 import json
-import pandas as pd
 from pathlib import Path
-from typing import Any, Dict
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional
 from settings.config import Config
 from settings.logger import setup_logger
+from settings.metrics import count, flush, instrument
+from pipeline.events import MalformedEventError, PlayEvent, decode_line, decode_record
+from pipeline.state import get_watermark_store
+from pipeline.staging import StagingWriter, staged_data_path
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 logger = setup_logger(Config.LOGGER_NAME, Config.LOGGER_PATH)
 
+# pandas is imported by the functions that build DataFrames, so modules that only need the raw
+# event readers (enrich, the shard tasks) do not pay for importing it.
+
+# Identifies one play, like the unique index of the playlog table. Replays of a track are separate
+# plays, so what is kept never depends on how the events were split into batches.
+PLAY_KEY = ["user_id", "played_at", "track_id"]
+
+@instrument()
 def load_data(raw_data_path: Path) -> dict[str, Any]:
     """
     Loads JSON data from the specified file path.
@@ -21,121 +37,247 @@ def load_data(raw_data_path: Path) -> dict[str, Any]:
         FileNotFoundError: If the file at raw_data_path does not exist.
         json.JSONDecodeError: If the file content is not valid JSON.
     """
-    logger.debug(f"Starting to load data path from {raw_data_path}.")
+    logger.debug("Starting to load data path from %s.", raw_data_path)
     if not raw_data_path.exists():
-        logger.error(f"Data path not found: {raw_data_path}.")
+        logger.error("Data path not found: %s.", raw_data_path)
         raise
 
     try:
         with open(raw_data_path, "r", encoding="utf-8") as file:
             data = json.load(file)
-        logger.info(f"Successfully loaded JSON data from {raw_data_path}.")
+        count(rows=len(data.get("items", [])), bytes_in=raw_data_path.stat().st_size)
+        logger.info("Successfully loaded JSON data from %s.", raw_data_path)
     except json.JSONDecodeError as error:
-        logger.error(f"Invalid JSON in file {raw_data_path}: {error}")
+        logger.error("Invalid JSON in file %s: %s", raw_data_path, error)
         raise
 
     return data
 
-def parse_track(item: Dict[str, Any]) -> Dict[str, Any]:
+TRACK_COLUMNS = ["user_id", "artist_name", "artist_id", "song_name", "track_id", "duration_ms", "popularity", "played_at"]
+
+@instrument()
+def flatten_items(items: List[PlayEvent]) -> pd.DataFrame:
     """
-    Parses a single track item from Spotify's recently played data structure
-    and extracts relevant track and artist information.
+    Flattens play events into a columnar DataFrame, reading each column straight off the events.
 
     Args:
-        item (Dict[str, Any]): A dictionary representing a single track play event,
-                               typically one entry from the "items" list in the Spotify API response.
+        items (List[PlayEvent]): Decoded play events.
 
     Returns:
-        Dict[str, Any]: A dictionary containing:
-            - artist_name (str | None): Comma-separated artist names.
-            - artist_id (str | None): Comma-separated artist IDs.
-            - song_name (str | None): Name of the track.
-            - track_id (str | None): Spotify ID of the track.
-            - duration_ms (int | None): Duration of the track in milliseconds.
-            - track_popularity (int | None): Popularity score of the track.
-            - played_at (str | None): ISO timestamp when the track was played.
+        pd.DataFrame: One row per play event with the columns of `TRACK_COLUMNS`;
+                      `played_at` holds Unix milliseconds.
     """
+    import pandas as pd
+
+    return pd.DataFrame({
+        "user_id": [event.user_id for event in items],
+        "artist_name": [event.artist_name for event in items],
+        "artist_id": [event.artist_id for event in items],
+        "song_name": [event.song_name for event in items],
+        "track_id": [event.track_id for event in items],
+        "duration_ms": [event.duration_ms for event in items],
+        "popularity": [event.popularity for event in items],
+        "played_at": [event.played_at_ms for event in items],
+    }, columns=TRACK_COLUMNS)
+
+@instrument()
+def transform_items(items: List[PlayEvent], watermarks: Optional[Dict[str, int]] = None) -> pd.DataFrame:
+    """
+    Transforms play events into a cleaned pandas DataFrame.
+
+    Plays at or before the user's watermark are dropped, so only the delta since the last load is kept,
+    and duplicate events of the same play (`PLAY_KEY`, with `played_at` to the second) are kept once.
+    Every step after flattening the items is a vectorized column operation.
+
+    Args:
+        items (List[PlayEvent]): Decoded play events.
+        watermarks (Optional[Dict[str, int]]): Latest loaded `played_at` per user in Unix milliseconds.
+
+    Returns:
+        pd.DataFrame: The cleaned and transformed DataFrame, with `played_at` as a UTC datetime.
+    """
+    import pandas as pd
+
     try:
-        logger.debug(f"Parsing track item with played_at={item.get('played_at')}.")
+        logger.debug("Flattening track items.")
+        df = flatten_items(items)
+
+        logger.debug("Converting played_at to datetime.")
+        played_at = pd.to_datetime(df["played_at"], unit="ms", utc=True).dt.floor("s")
 
-        track = item.get("track", {})
-        album = track.get("album", {})
-        artist = album.get("artists", [{}])[0]
+        if watermarks:
+            logger.debug("Dropping plays at or before the users' watermarks.")
+            played_at_ms = (played_at - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(milliseconds=1)
+            watermark = df["user_id"].map(watermarks)
+            delta = watermark.isna() | (played_at_ms > watermark)
+            df, played_at = df[delta], played_at[delta]
+            logger.info("%s of %s plays are newer than the watermarks.", int(delta.sum()), len(delta))
 
-        parsed = {
-            "artist_name": artist.get("name"),
-            "artist_id": artist.get("id"),
-            "song_name": track.get("name"),
-            "track_id": track.get("id"),
-            "duration_ms": track.get("duration_ms"),
-            "track_popularity": track.get("popularity"),
-            "played_at": item.get("played_at")
-        }
+        df = df.assign(played_at=played_at.dt.tz_localize(None).astype("datetime64[s]"))
 
-        logger.debug(f"Parsed track: {parsed}")
-        return parsed
+        logger.debug("Dropping duplicate plays.")
+        df = df[~df.duplicated(subset=PLAY_KEY, keep="first")].copy()
 
     except Exception as error:
-        logger.error(f"Error parsing track item: {error}. Full item: {item}")
+        logger.error("Error while transforming DataFrame: %s", error)
         raise
-    
 
-def transform_track(data: dict[str, Any], transformed_data_path: Path) -> pd.DataFrame:
+    count(rows=len(df))
+    return df
+
+@instrument()
+def transform_track(data: dict[str, Any], transformed_data_path: Path,
+                    watermarks: Optional[Dict[str, int]] = None) -> pd.DataFrame:
     """
     Transforms raw Spotify recently played track data into a cleaned pandas DataFrame,
-    formats fields, removes duplicates, and saves the result as a CSV file.
+    formats fields, removes duplicates, and saves the result to the staging file.
 
     Args:
-        data (dict[str, Any]): Raw JSON data from Spotify API containing recently played tracks.
-        transformed_data_path (Path): Path to save the transformed CSV data.
+        data (dict[str, Any]): Raw JSON data whose "items" are play event records (or Spotify API items).
+        transformed_data_path (Path): Path to save the transformed data; a `.csv` path exports CSV,
+                                      any other path typed Parquet.
+        watermarks (Optional[Dict[str, int]]): Latest loaded `played_at` per user in Unix milliseconds.
 
     Raises:
         ValueError: If no 'items' are found in the input data.
+        MalformedEventError: If an item is malformed.
 
     Returns:
         pd.DataFrame: The cleaned and transformed DataFrame.
     """
     logger.debug("Starting transformation of raw Spotify data.")
-    items = data.get("items", [])
+    items = [decode_record(item) for item in data.get("items", [])]
     if not items:
         logger.error("No items found in the input data.")
         raise ValueError("No items found in the input data.")
 
-    rows = [parse_track(item) for item in items]
-    df = pd.DataFrame(rows)
+    df = transform_items(items, watermarks)
+    with StagingWriter(transformed_data_path) as writer:
+        writer.write(df)
 
-    try:
-        logger.debug("Renaming and reordering columns.")
-        df = df[["artist_name", "artist_id", "song_name", "track_id", "duration_ms", "track_popularity", "played_at"]]
-        df.columns = ["artist_name", "artist_id", "song_name", "track_id", "duration", "popularity", "played_at"]
+    return df
 
-        logger.debug("Converting played_at to datetime.")
-        df["played_at"] = pd.to_datetime(df["played_at"], errors="coerce").dt.strftime("%Y-%m-%d %H:%M:%S")
+@instrument()
+def iter_raw_batches(raw_events_path: Path, batch_size: Optional[int] = None) -> Iterator[List[PlayEvent]]:
+    """
+    Reads a newline-delimited JSON file of play events in batches of at most `batch_size` decoded events.
 
-        logger.debug("Formatting duration in mm:ss.")
-        df["duration"] = pd.to_numeric(df["duration"], errors="coerce").apply(
-            lambda ms: f"{int(ms // 60000)}:{int((ms % 60000) // 1000):02}" if pd.notnull(ms) else None)
-        
-        logger.debug("Dropping duplicates from tracks.")
-        df = df.drop_duplicates(subset="track_id", keep="first")
+    Every line is validated as it is decoded, so a malformed event stops the run at its line.
 
-    except Exception as error:
-        logger.error(f"Error while transforming DataFrame: {error}")
-        raise
-    
-    df.to_csv(transformed_data_path, index=False)
+    Args:
+        raw_events_path (Path): Path to the NDJSON file written by extract.
+        batch_size (int): Maximum number of events held in memory at once.
 
-    return df
+    Yields:
+        List[PlayEvent]: The next batch of play events.
+
+    Raises:
+        FileNotFoundError: If the file at raw_events_path does not exist.
+        json.JSONDecodeError: If a line is not valid JSON.
+        MalformedEventError: If a line holds a malformed play event.
+    """
+    batch_size = Config.TRANSFORM_BATCH_SIZE if batch_size is None else batch_size
+    logger.debug("Streaming play events from %s.", raw_events_path)
+    batch: List[PlayEvent] = []
+    batch_bytes = 0
+    with open(raw_events_path, "r", encoding="utf-8") as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            batch_bytes += len(line)
+            try:
+                batch.append(decode_line(line))
+            except json.JSONDecodeError as error:
+                logger.error("Invalid JSON on line %s of %s: %s", line_number, raw_events_path, error)
+                raise
+            except MalformedEventError as error:
+                logger.error("Malformed play event on line %s of %s: %s", line_number, raw_events_path, error)
+                raise
+            if len(batch) >= batch_size:
+                count(rows=len(batch), bytes_in=batch_bytes)
+                yield batch
+                batch, batch_bytes = [], 0
+    if batch:
+        count(rows=len(batch), bytes_in=batch_bytes)
+        yield batch
+
+@instrument()
+def transform_track_batches(batches: Iterable[List[PlayEvent]], transformed_data_path: Path,
+                            watermarks: Optional[Dict[str, int]] = None) -> int:
+    """
+    Transforms play events batch by batch and appends each result to the staging file.
+
+    Memory is bounded by one batch plus the set of play keys already written, which keeps duplicate
+    plays out across batches exactly like `transform_items` does within one.
+
+    Args:
+        batches (Iterable[List[PlayEvent]]): Batches of play events, e.g. from `iter_raw_batches`.
+        transformed_data_path (Path): Path to save the transformed data; a `.csv` path exports CSV,
+                                      any other path typed Parquet.
+        watermarks (Optional[Dict[str, int]]): Latest loaded `played_at` per user in Unix milliseconds.
+
+    Raises:
+        ValueError: If the batches contain no items at all.
+
+    Returns:
+        int: Number of rows written.
+    """
+    seen: set[str] = set()
+    events = 0
+
+    with StagingWriter(transformed_data_path) as writer:
+        for batch in batches:
+            events += len(batch)
+            df = transform_items(batch, watermarks)
+
+            keys = df["user_id"].astype(str) + "\x1f" + df["played_at"].astype(str) + "\x1f" + df["track_id"].astype(str)
+            fresh = ~keys.isin(seen)
+            seen.update(keys[fresh])
+            df = df[fresh]
+
+            writer.write(df)
+            logger.debug("Transformed batch of %s events into %s rows.", len(batch), len(df))
+
+    if not events:
+        logger.error("No items found in the input data.")
+        raise ValueError("No items found in the input data.")
+
+    return writer.rows
+
+def stage_nothing() -> None:
+    """
+    Replaces the staging file with an empty one, so load skips the run instead of reloading old rows.
+    """
+    logger.info("No new plays since the last run, nothing to transform.")
+    with StagingWriter(staged_data_path()):
+        pass
 
+@instrument()
 def transform():
     logger.info("Starting data transformation process.")
     try:
-        data: dict[str, Any] = load_data(Config.SPOTIFY_RAW_DATA_PATH)
-        transform_track(data, Config.SPOTIFY_TRANSFORMED_DATA_PATH)
+        if Config.RAW_DATA_FORMAT == "json":
+            data: dict[str, Any] = load_data(Config.SPOTIFY_RAW_DATA_PATH)
+            if not data.get("items"):
+                stage_nothing()
+                return
+            user_ids = {item.get("user_id", Config.DEFAULT_USER_ID) for item in data.get("items", [])}
+            watermarks = get_watermark_store().get_many(user_ids)
+            transform_track(data, staged_data_path(), watermarks)
+        elif Config.SPOTIFY_RAW_EVENTS_PATH.stat().st_size == 0:
+            stage_nothing()
+            return
+        else:
+            watermarks = get_watermark_store().get_many(Config.USER_IDS)
+            rows = transform_track_batches(iter_raw_batches(Config.SPOTIFY_RAW_EVENTS_PATH),
+                                           staged_data_path(), watermarks)
+            logger.info("%s transformed rows saved.", rows)
         logger.info("Data transformation process completed successfully.")
     except Exception as error:
-        logger.critical(f"ETL transformation failed: {error}")
+        logger.critical("ETL transformation failed: %s", error)
         raise
+    finally:
+        flush("transform")
 
 if __name__ == "__main__":
     transform()
\ No newline at end of file
@@ -1,35 +1,161 @@
 import os
-import pytz
 from pathlib import Path
 from datetime import datetime, timedelta
-from dotenv import load_dotenv, find_dotenv
+from typing import Any, Callable, List, Optional
 
-path_dotenv = find_dotenv()
-load_dotenv(path_dotenv)
+_environment_loaded = False
+
+def load_environment() -> None:
+    """
+    Loads the nearest `.env` file into the environment, once, on the first read of an env setting.
+    """
+    global _environment_loaded
+    if not _environment_loaded:
+        from dotenv import find_dotenv, load_dotenv
+        load_dotenv(find_dotenv())
+        _environment_loaded = True
+
+def flag(value: str) -> bool:
+    return value.lower() == "true"
+
+def user_list(value: str) -> List[str]:
+    return [user.strip() for user in value.split(",") if user.strip()]
+
+class env:
+    """
+    `Config` attribute read from the environment variable of the same name (or `name`) on first access.
+
+    The parsed value replaces the descriptor on the class, so later reads are plain attribute lookups,
+    and assigning the attribute (e.g. in benchmarks) overrides it like any class attribute.
+    """
+    def __init__(self, default: Optional[str] = None, cast: Optional[Callable[[str], Any]] = None,
+                 name: Optional[str] = None):
+        self.default = default
+        self.cast = cast
+        self.name = name
+
+    def __set_name__(self, owner: type, attribute: str) -> None:
+        self.attribute = attribute
+        self.name = self.name or attribute
+
+    def __get__(self, instance: Any, owner: type) -> Any:
+        load_environment()
+        value = os.getenv(self.name, self.default)
+        if value is not None and self.cast is not None:
+            value = self.cast(value)
+        setattr(owner, self.attribute, value)
+        return value
 
 class Config:
-    CLIENT_ID = os.getenv("CLIENT_ID")
-    CLIENT_SECRET = os.getenv("CLIENT_SECRET")
-    REDIRECT_URI = os.getenv("REDIRECT_URI")
-    SCOPE = os.getenv("SCOPE")
-    AUTH_CODE = os.getenv("AUTH_CODE")
+    CLIENT_ID = env()
+    CLIENT_SECRET = env()
+    REDIRECT_URI = env()
+    SCOPE = env()
+    AUTH_CODE = env()
 
     @staticmethod
     def unix_timestamp() -> int:
+        import pytz
         timezone = pytz.timezone("Europe/Warsaw")
         yesterday = datetime.now(timezone) - timedelta(days=1)
         return int(yesterday.timestamp()) * 1000
     
     SRC_DIR = Path(__file__).resolve().parent.parent
 
-    REFRESH_TOKEN_PATH = SRC_DIR / "data" / "token" / "refresh_token.json"
+    TOKEN_DIR = SRC_DIR / "data" / "token"
+    REFRESH_TOKEN_PATH = TOKEN_DIR / "refresh_token.json"
+    TOKEN_CACHE_PATH = TOKEN_DIR / "token_cache.sqlite"
+    TOKEN_REFRESH_MARGIN = env("300", float)
+
+    DEFAULT_USER_ID = "default"
+    USER_IDS = env(DEFAULT_USER_ID, user_list, name="SPOTIFY_USER_IDS")
+
+    @staticmethod
+    def refresh_token_path(user_id: str) -> Path:
+        if user_id == Config.DEFAULT_USER_ID:
+            return Config.REFRESH_TOKEN_PATH
+        return Config.TOKEN_DIR / f"{user_id}_refresh_token.json"
+
+    SPOTIFY_API_URL = env("https://api.spotify.com/v1")
+    SPOTIFY_ACCOUNTS_URL = env("https://accounts.spotify.com")
+
+    EXTRACT_MAX_WORKERS = env("8", int)
+    EXTRACT_MAX_PAGES = env("20", int)
+    HTTP_TIMEOUT = env("10", float)
+    HTTP_POOL_SIZE = env("16", int)
+    HTTP_MAX_RETRIES = env("5", int)
+    HTTP_BACKOFF_FACTOR = env("0.5", float)
+    HTTP_BACKOFF_MAX = env("30", float)
+    HTTP_RATE_LIMIT = env("8", float)
+    HTTP_RATE_BURST = env("16", float)
 
     SPOTIFY_TRANSFORMED_DATA_PATH = SRC_DIR / "data" / "spotify_transformed_data.csv"
+    SPOTIFY_STAGED_DATA_PATH = SRC_DIR / "data" / "spotify_transformed_data.parquet"
+    STAGING_FORMAT = env("parquet")
+    STAGING_PARTITION_BY_DAY = env("false", flag)
     SPOTIFY_RAW_DATA_PATH = SRC_DIR / "data" / "spotify_raw_data.json"
+    SPOTIFY_RAW_EVENTS_PATH = SRC_DIR / "data" / "spotify_raw_data.ndjson"
+    RAW_DATA_FORMAT = env("ndjson")
+    TRANSFORM_BATCH_SIZE = env("50000", int)
+    PERSIST_ARTIFACTS = env("false", flag)
+
+    RUNS_DIR = SRC_DIR / "data" / "runs"
+    USER_SHARD_SIZE = env("1", int)
+    MAX_ACTIVE_SHARDS = env("4", int)
+
+    STATE_PATH = SRC_DIR / "data" / "state" / "pipeline_state.sqlite"
+    DEDUP_EVENTS = env("true", flag)
+    SEEN_EVENTS_RETENTION_DAYS = env("30", int)
+    BACKFILL_STATE_PATH = SRC_DIR / "data" / "state" / "backfill.json"
+    BACKFILL_CHUNK_DAYS = env("1", int)
+    BACKFILL_MAX_WORKERS = env("4", int)
+
+    ARCHIVE_RAW = env("true", flag)
+    ARCHIVE_DIR = SRC_DIR / "data" / "archive"
+    ARCHIVE_COMPRESS_LEVEL = env("6", int)
+    REPROCESS_MAX_WORKERS = env(str(os.cpu_count() or 4), int)
 
-    DATABASE_URL = os.getenv("DATABASE_URL")
+    POLLER_MIN_INTERVAL = env("60", float)
+    POLLER_MAX_INTERVAL = env("1200", float)
+    POLLER_BACKOFF = env("2", float)
+    POLLER_TARGET_PLAYS = env("25", int)
+    POLLER_FLUSH_INTERVAL = env("300", float)
+    POLLER_MAX_CONCURRENCY = env("16", int)
+
+    ENRICH_METADATA = env("false", flag)
+    METADATA_CACHE_PATH = SRC_DIR / "data" / "cache" / "metadata.sqlite"
+    METADATA_TTL = env(str(7 * 24 * 3600), float)
+
+    DATABASE_URL = env()
+    DB_POOL_SIZE = env("5", int)
+    DB_MAX_OVERFLOW = env("10", int)
+    DB_POOL_TIMEOUT = env("30", float)
+    DB_POOL_RECYCLE = env("1800", int)
 
     TABLE_NAME = "spotify_playlog"
+    LOAD_SCHEMA = env("flat")
+    MAINTAIN_ROLLUPS = env("true", flag)
+    PLAYLOG_PARTITIONING = env("month")
+    PLAYLOG_RETENTION_DAYS = env("0", int)
+    PLAYLOG_RETENTION_MODE = env("drop")
+    ARCHIVE_SCHEMA = env("archive")
+
+    ANALYTICS_CACHE_SIZE = env("1024", int)
+    ANALYTICS_CACHE_TTL = env("300", float)
+    ANALYTICS_REVALIDATE_INTERVAL = env("1", float)
+    ANALYTICS_HOST = env("127.0.0.1")
+    ANALYTICS_PORT = env("8050", int)
+
+    METRICS_ENABLED = env("false", flag)
+    METRICS_DIR = SRC_DIR / "data" / "metrics"
+    RUN_ID = env(datetime.now().strftime("%Y%m%dT%H%M%S"), name="PIPELINE_RUN_ID")
 
-    LOGGER_PATH = SRC_DIR / "data" / "logs" / "spotify_playlog.log"
-    LOGGER_NAME = "playlog"
\ No newline at end of file
+    LOGGER_PATH = env(str(SRC_DIR / "data" / "logs" / "spotify_playlog.log"), Path, name="LOG_PATH")
+    LOGGER_NAME = "playlog"
+    LOG_LEVEL = env("INFO", str.upper)
+    LOG_FORMAT = env("text")
+    LOG_ROTATION = env("size")
+    LOG_MAX_BYTES = env(str(10 * 1024 * 1024), int)
+    LOG_ROTATE_WHEN = env("midnight")
+    LOG_BACKUP_COUNT = env("7", int)
+    LOG_DEBUG_SAMPLE_RATE = env("0.01", float)
\ No newline at end of file
@@ -1,40 +1,187 @@
+import os
 import sys
+import copy
+import json
+import queue
+import atexit
 import logging
+import itertools
+import threading
 from pathlib import Path
+from datetime import datetime
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Tuple
 from colorlog import ColoredFormatter
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from settings.config import Config
 
-def setup_logger(log_name: str, log_path: Path) -> logging.Logger:
-    logger = logging.getLogger(log_name)
-    logger.setLevel(logging.INFO)
-
-    logger.propagate = False
-
-    if not logger.handlers:
-        color_formatter = ColoredFormatter(
-            fmt="%(log_color)s[%(asctime)s] %(levelname)s %(message)s",
-            datefmt="%Y-%m-%d %H:%M:%S",
-            log_colors={
-                "DEBUG": "cyan",
-                "INFO": "green",
-                "WARNING": "yellow",
-                "ERROR": "red",
-                "CRITICAL": "bold_red",
-            }
-        )
-
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setFormatter(color_formatter)
-        logger.addHandler(console_handler)
-
-        file_formatter = logging.Formatter(
+# Pass as `extra=SAMPLED` on per-item debug logs to keep only `LOG_DEBUG_SAMPLE_RATE` of them.
+SAMPLED = {"sampled": True}
+
+RECORD_ATTRIBUTES = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "sampled"}
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line; fields passed through `extra` are included.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "function": record.funcName,
+            "line": record.lineno,
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        entry.update({key: value for key, value in record.__dict__.items() if key not in RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class DebugSampler(logging.Filter):
+    """
+    Lets through every `sample_every`-th DEBUG record marked with `extra=SAMPLED`; other records pass.
+
+    Each call site is counted separately, so neighbouring debug lines are sampled alike. Counting
+    instead of drawing random numbers keeps the filter cheap and the output reproducible.
+    """
+    def __init__(self, rate: float):
+        super().__init__()
+        self.sample_every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._counters: Dict[Tuple[str, int], Iterator[int]] = defaultdict(itertools.count)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != logging.DEBUG or not getattr(record, "sampled", False):
+            return True
+        if self.sample_every == 0:
+            return False
+        return next(self._counters[(record.pathname, record.lineno)]) % self.sample_every == 0
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    Hands records to the background listener; only the message arguments are merged on the calling
+    thread (so later changes to them cannot leak into the log), tracebacks are formatted by the listener.
+    """
+    def __init__(self, log_queue: "queue.SimpleQueue[logging.LogRecord]", log_path: Path):
+        super().__init__(log_queue)
+        self.log_path = log_path
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+def build_handlers(log_path: Path) -> List[logging.Handler]:
+    """
+    Builds the console handler and the rotating file handler that run on the background listener.
+
+    The file rotates by size (`LOG_MAX_BYTES`) or, with `LOG_ROTATION=time`, at `LOG_ROTATE_WHEN`,
+    keeping `LOG_BACKUP_COUNT` old files; `LOG_FORMAT=json` writes structured JSON lines.
+    """
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(ColoredFormatter(
+        fmt="%(log_color)s[%(asctime)s] %(levelname)s %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        log_colors={
+            "DEBUG": "cyan",
+            "INFO": "green",
+            "WARNING": "yellow",
+            "ERROR": "red",
+            "CRITICAL": "bold_red",
+        }
+    ))
+
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    if Config.LOG_ROTATION == "time":
+        file_handler = TimedRotatingFileHandler(log_path, when=Config.LOG_ROTATE_WHEN,
+                                                backupCount=Config.LOG_BACKUP_COUNT, encoding="utf-8")
+    else:
+        file_handler = RotatingFileHandler(log_path, maxBytes=Config.LOG_MAX_BYTES,
+                                           backupCount=Config.LOG_BACKUP_COUNT, encoding="utf-8")
+
+    if Config.LOG_FORMAT == "json":
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(
             "%(asctime)s - %(levelname)s - %(name)s - %(message)s",
             "%Y-%m-%d %H:%M:%S"
-        )
+        ))
+
+    return [console_handler, file_handler]
 
-        log_path.parent.mkdir(parents=True, exist_ok=True)
-        file_handler = logging.FileHandler(log_path, encoding="utf-8")
-        file_handler.setFormatter(file_formatter)
-        
-        logger.addHandler(file_handler)
+_listeners: Dict[str, QueueListener] = {}
+_listeners_lock = threading.Lock()
+
+def start_listener(log_name: str, log_queue: "queue.SimpleQueue[logging.LogRecord]", log_path: Path) -> None:
+    listener = QueueListener(log_queue, *build_handlers(log_path), respect_handler_level=True)
+    listener.start()
+    _listeners[log_name] = listener
+
+def stop_listeners() -> None:
+    """
+    Flushes the queued records and stops the background writers.
+    """
+    with _listeners_lock:
+        for listener in _listeners.values():
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+        _listeners.clear()
+
+def restart_listeners_after_fork() -> None:
+    """
+    Starts fresh writers in a forked child (e.g. a backfill worker), since threads do not survive fork().
+
+    Pool workers leave through `os._exit`, which skips atexit, so the queues are also flushed by a
+    multiprocessing finalizer.
+    """
+    global _listeners_lock
+    _listeners_lock = threading.Lock()
+    for log_name in list(_listeners):
+        for handler in logging.getLogger(log_name).handlers:
+            if isinstance(handler, BackgroundQueueHandler):
+                handler.queue = queue.SimpleQueue()
+                start_listener(log_name, handler.queue, handler.log_path)
+
+    if "multiprocessing" in sys.modules:
+        from multiprocessing.util import Finalize
+        Finalize(None, stop_listeners, exitpriority=0)
+
+def setup_logger(log_name: str, log_path: Path) -> logging.Logger:
+    """
+    Returns the named logger, configuring it on first use.
+
+    Records are put on an in-memory queue by a `QueueHandler` and written to the console and the
+    rotating log file by a background `QueueListener`, so logging calls never wait for terminal or disk I/O.
+    Use lazy %-style arguments (`logger.debug("Parsed %s", item)`) so messages are only formatted when emitted.
+
+    Args:
+        log_name (str): Name of the logger.
+        log_path (Path): Path of the log file.
+
+    Returns:
+        logging.Logger: The configured logger.
+    """
+    logger = logging.getLogger(log_name)
+    with _listeners_lock:
+        if logger.handlers:
+            return logger
+
+        logger.setLevel(Config.LOG_LEVEL)
+        logger.propagate = False
+        logger.addFilter(DebugSampler(Config.LOG_DEBUG_SAMPLE_RATE))
+
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        logger.addHandler(BackgroundQueueHandler(log_queue, log_path))
+        start_listener(log_name, log_queue, log_path)
 
     return logger
+
+atexit.register(stop_listeners)
+os.register_at_fork(after_in_child=restart_listeners_after_fork)
@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import inspect
+import time
+import resource
+import functools
+import threading
+import contextvars
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+from settings.config import Config
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+COUNTERS = ("rows", "bytes_in", "bytes_out", "retries")
+PROMETHEUS_METRICS = [
+    ("calls", "playlog_stage_calls_total", "counter", "Number of calls of the stage."),
+    ("errors", "playlog_stage_errors_total", "counter", "Number of calls of the stage that raised."),
+    ("seconds", "playlog_stage_duration_seconds_total", "counter", "Wall time spent in the stage."),
+    ("max_seconds", "playlog_stage_duration_seconds_max", "gauge", "Longest single call of the stage."),
+    ("rows", "playlog_stage_rows_total", "counter", "Rows or events processed by the stage."),
+    ("bytes_in", "playlog_stage_bytes_in_total", "counter", "Bytes read by the stage."),
+    ("bytes_out", "playlog_stage_bytes_out_total", "counter", "Bytes written by the stage."),
+    ("retries", "playlog_stage_retries_total", "counter", "Retried requests of the stage."),
+    ("peak_rss_growth_bytes", "playlog_stage_peak_rss_growth_bytes", "gauge",
+     "Largest rise of the process peak RSS during a single call of the stage."),
+]
+
+@dataclass
+class StageMetrics:
+    """
+    Aggregated measurements of one instrumented stage (function or block) in this process.
+
+    `peak_rss_growth_bytes` is how far a single call raised the peak RSS of the process. It is 0 when
+    the stage stayed below an earlier peak. Stages running at the same time share their growth.
+    """
+    calls: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    rows: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    retries: int = 0
+    peak_rss_growth_bytes: int = 0
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class MetricsRegistry:
+    """
+    Thread-safe, process-wide collection of `StageMetrics` by stage name.
+    """
+    def __init__(self):
+        self.started_at = datetime.now()
+        self._stages: Dict[str, StageMetrics] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, failed: bool, rss_growth: int = 0) -> None:
+        with self._lock:
+            metrics = self._stages.setdefault(stage, StageMetrics())
+            metrics.calls += 1
+            metrics.errors += failed
+            metrics.seconds += seconds
+            metrics.max_seconds = max(metrics.max_seconds, seconds)
+            metrics.peak_rss_growth_bytes = max(metrics.peak_rss_growth_bytes, rss_growth)
+
+    def add(self, stage: str, **counts: int) -> None:
+        with self._lock:
+            metrics = self._stages.setdefault(stage, StageMetrics())
+            for name, value in counts.items():
+                setattr(metrics, name, getattr(metrics, name) + value)
+
+    def snapshot(self) -> Dict[str, StageMetrics]:
+        with self._lock:
+            return {stage: StageMetrics(**asdict(metrics)) for stage, metrics in self._stages.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+            self.started_at = datetime.now()
+
+    def to_prometheus(self, labels: Optional[Dict[str, str]] = None) -> str:
+        """
+        Renders the stages and the process peak RSS in the Prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        extra = "".join(f',{name}="{value}"' for name, value in (labels or {}).items())
+        lines: List[str] = []
+        for field, metric, kind, description in PROMETHEUS_METRICS:
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for stage, metrics in sorted(snapshot.items()):
+                lines.append(f'{metric}{{stage="{stage}"{extra}}} {getattr(metrics, field):g}')
+        lines.append("# HELP playlog_process_peak_rss_bytes Peak RSS of the process since it started.")
+        lines.append("# TYPE playlog_process_peak_rss_bytes gauge")
+        process_labels = f"{{{extra.lstrip(',')}}}" if extra else ""
+        lines.append(f"playlog_process_peak_rss_bytes{process_labels} {peak_rss_bytes()}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, run_id: str) -> Dict[str, Any]:
+        """
+        Returns the JSON-serializable run summary of the stages.
+        """
+        return {
+            "run_id": run_id,
+            "pid": os.getpid(),
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+            "process_peak_rss_bytes": peak_rss_bytes(),
+            "stages": {stage: asdict(metrics) for stage, metrics in sorted(self.snapshot().items())},
+        }
+
+registry = MetricsRegistry()
+_current_stage: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("playlog_stage", default=None)
+
+def count(stage: Optional[str] = None, **counts: int) -> None:
+    """
+    Adds to the counters (`rows`, `bytes_in`, `bytes_out`, `retries`) of `stage`, or of the
+    innermost instrumented stage running in the current context. A no-op when metrics are disabled.
+    """
+    if not Config.METRICS_ENABLED:
+        return
+    stage = stage or _current_stage.get()
+    if stage is not None:
+        registry.add(stage, **counts)
+
+@contextmanager
+def measure(stage: str) -> Iterator[None]:
+    """
+    Times the enclosed block as `stage`; counters added with `count()` inside it are attributed to it.
+    """
+    if not Config.METRICS_ENABLED:
+        yield
+        return
+
+    token = _current_stage.set(stage)
+    rss_before = peak_rss_bytes()
+    started = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        registry.record(stage, time.perf_counter() - started, failed, peak_rss_bytes() - rss_before)
+        _current_stage.reset(token)
+
+def instrument(stage: Optional[str] = None) -> Callable[[F], F]:
+    """
+    Decorates a function so each call is measured as `stage` (default: "<module>.<function>").
+
+    For generator functions only the time spent producing items is measured, not the time the
+    consumer spends between them. When metrics are disabled at import time the function is
+    returned unchanged, so instrumentation costs nothing.
+    """
+    def decorator(func: F) -> F:
+        if not Config.METRICS_ENABLED:
+            return func
+        name = stage or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args: Any, **kwargs: Any) -> Any:
+                iterator = func(*args, **kwargs)
+                elapsed, rss_growth, failed = 0.0, 0, True
+                try:
+                    while True:
+                        token = _current_stage.set(name)
+                        rss_before = peak_rss_bytes()
+                        started = time.perf_counter()
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            failed = False
+                            return
+                        finally:
+                            elapsed += time.perf_counter() - started
+                            rss_growth += peak_rss_bytes() - rss_before
+                            _current_stage.reset(token)
+                        yield item
+                except GeneratorExit:
+                    failed = False
+                    iterator.close()
+                    raise
+                finally:
+                    registry.record(name, elapsed, failed, rss_growth)
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with measure(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def flush(label: str, run_id: Optional[str] = None, directory: Optional[Path] = None) -> Optional[Path]:
+    """
+    Writes the metrics of this process as `<label>.prom` (Prometheus textfile collector format)
+    and `runs/<run_id>/<label>.json` (run summary). A no-op when metrics are disabled.
+
+    Args:
+        label (str): Name of the process's part of the run, e.g. "extract" or "run".
+        run_id (Optional[str]): Identifier of the pipeline run; defaults to `Config.RUN_ID`
+                                (`PIPELINE_RUN_ID`, or the start time).
+        directory (Optional[Path]): Metrics output directory; defaults to `Config.METRICS_DIR`.
+
+    Returns:
+        Optional[Path]: Path of the run summary, or None when disabled.
+    """
+    if not Config.METRICS_ENABLED:
+        return None
+    run_id = Config.RUN_ID if run_id is None else run_id
+    directory = Config.METRICS_DIR if directory is None else directory
+
+    summary_path = directory / "runs" / run_id / f"{label}.json"
+    summary_path.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(directory / f"{label}.prom", registry.to_prometheus({"run": label}))
+    write_atomic(summary_path, json.dumps(registry.summary(run_id), indent=4))
+    return summary_path
+
+def write_atomic(path: Path, content: str) -> None:
+    temp_path = path.with_suffix(path.suffix + ".tmp")
+    temp_path.write_text(content, encoding="utf-8")
+    os.replace(temp_path, path)
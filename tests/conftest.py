@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Keep logs out of src/data; set before any project module creates its logger.
+os.environ.setdefault("LOG_PATH", str(Path(tempfile.mkdtemp(prefix="playlog-tests-")) / "tests.log"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from settings.config import Config  # noqa: E402
+
+# Process-wide instances created on first use, which would keep pointing at another test's files.
+SINGLETONS = ("pipeline.client._client", "pipeline.dedup._index", "pipeline.state._store", "pipeline.archive._archive",
+              "pipeline.enrich._cache", "pipeline.analytics._cache", "authentication.cache._cache")
+
+@pytest.fixture(autouse=True)
+def isolate(tmp_path, monkeypatch):
+    """
+    Points every file the pipeline writes at the test's `tmp_path` and drops the process-wide instances.
+    """
+    paths = {
+        "STATE_PATH": tmp_path / "state" / "pipeline_state.sqlite",
+        "BACKFILL_STATE_PATH": tmp_path / "state" / "backfill.json",
+        "TOKEN_DIR": tmp_path / "token",
+        "REFRESH_TOKEN_PATH": tmp_path / "token" / "refresh_token.json",
+        "TOKEN_CACHE_PATH": tmp_path / "token" / "token_cache.sqlite",
+        "METADATA_CACHE_PATH": tmp_path / "cache" / "metadata.sqlite",
+        "ARCHIVE_DIR": tmp_path / "archive",
+        "RUNS_DIR": tmp_path / "runs",
+        "METRICS_DIR": tmp_path / "metrics",
+    }
+    for name, path in paths.items():
+        monkeypatch.setattr(Config, name, path)
+    for singleton in SINGLETONS:
+        monkeypatch.setattr(singleton, None)
+    return tmp_path
@@ -0,0 +1,44 @@
+import time
+
+from pipeline.analytics import QueryCache
+from pipeline.state import get_watermark_store
+
+def test_invalidate_drops_only_the_results_of_the_given_users():
+    cache = QueryCache(max_entries=10, ttl=60, revalidate_interval=60)
+    cache.put(("top_tracks", "user", 10), None, [{"plays": 1}])
+    cache.put(("top_artists", "user", 10), None, [{"plays": 2}])
+    cache.put(("top_tracks", "other", 10), None, [{"plays": 3}])
+
+    assert cache.invalidate(["user"]) == 2
+    assert cache.get(("top_tracks", "user", 10)) is None
+    assert cache.get(("top_tracks", "other", 10)) == [{"plays": 3}]
+
+def test_results_expire_after_the_ttl():
+    cache = QueryCache(max_entries=10, ttl=0.05, revalidate_interval=60)
+    cache.put(("top_tracks", "user"), None, [])
+    assert cache.get(("top_tracks", "user")) == []
+
+    time.sleep(0.1)
+    assert cache.get(("top_tracks", "user")) is None
+
+def test_least_recently_used_result_is_evicted():
+    cache = QueryCache(max_entries=2, ttl=60, revalidate_interval=60)
+    cache.put(("q", "a"), None, [])
+    cache.put(("q", "b"), None, [])
+    cache.get(("q", "a"))
+    cache.put(("q", "c"), None, [])
+
+    assert cache.get(("q", "b")) is None
+    assert cache.get(("q", "a")) == []
+
+def test_loads_in_other_processes_are_picked_up_by_revalidation():
+    store = get_watermark_store()
+    store.advance({"user": 1_000, "other": 1_000})
+    cache = QueryCache(max_entries=10, ttl=60, revalidate_interval=0)
+    cache.put(("q", "user"), 1_000, [])
+    cache.put(("q", "other"), 1_000, [])
+
+    store.advance({"user": 2_000})
+
+    assert cache.get(("q", "user")) is None
+    assert cache.get(("q", "other")) == []
@@ -0,0 +1,44 @@
+from dataclasses import replace
+from datetime import date
+
+from sqlalchemy import create_engine, text
+
+from pipeline.archive import get_raw_archive, read_events, reprocess
+from pipeline.events import PlayEvent
+from pipeline.load import load_dataframe
+from pipeline.transform import transform_items
+
+DAY_MS = 86_400_000
+FIRST_DAY_MS = 1_767_225_600_000  # 2026-01-01T00:00:00Z
+
+def play(day, hour, user="user", duration_ms=200_000):
+    return PlayEvent(user, FIRST_DAY_MS + day * DAY_MS + hour * 3_600_000, f"track-{day}-{hour}", "Song",
+                     duration_ms, 50, "artist", "Artist")
+
+def test_events_are_archived_by_day_and_user():
+    archive = get_raw_archive()
+    events = [play(0, 10), play(0, 11), play(1, 9), play(0, 12, user="other")]
+    archive.write(events[:2])
+    archive.write(events[2:])
+
+    files = archive.files(date(2026, 1, 1), date(2026, 1, 3))
+    assert {day: sorted(user for user, _ in day_files) for day, day_files in files.items()} == {
+        "2026-01-01": ["other", "user"], "2026-01-02": ["user"]}
+    assert [(day, users, count) for day, users, count, _ in archive.summary()] == [("2026-01-01", 2, 3), ("2026-01-02", 1, 1)]
+    assert read_events(path for _, path in files["2026-01-01"]) == [events[3], events[0], events[1]]
+    assert archive.files(date(2026, 1, 1), date(2026, 1, 3), ["other"]) == {"2026-01-01": files["2026-01-01"][:1]}
+
+def test_reprocess_replaces_the_loaded_plays_and_rollups_of_archived_days(tmp_path):
+    url = f"sqlite:///{tmp_path / 'playlog.sqlite'}"
+    engine = create_engine(url)
+    events = [play(0, 10), play(0, 11), play(1, 9)]
+    get_raw_archive().write(events)
+    # A faulty transform stored wrong durations for the first day.
+    load_dataframe(transform_items([replace(event, duration_ms=1_000) for event in events[:2]]), "spotify_playlog", engine)
+
+    results = reprocess(date(2026, 1, 1), date(2026, 1, 3), replace=True, database_url=url)
+
+    assert results == {"2026-01-01": (2, 2, 2), "2026-01-02": (1, 1, 1)}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*), SUM(duration_ms) FROM spotify_playlog")).one() == (3, 600_000)
+        assert conn.execute(text("SELECT SUM(plays), SUM(duration_ms) FROM rollup_artist_daily")).one() == (3, 600_000)
@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from pipeline.backfill import BackfillCheckpoint, ChunkResult, split_range
+
+START, END = datetime(2026, 1, 1, tzinfo=timezone.utc), datetime(2026, 1, 4, 12, tzinfo=timezone.utc)
+
+def test_range_is_split_into_chunks_with_a_shorter_last_one():
+    chunks = split_range(START, END, chunk_days=2)
+
+    assert [(chunk.start.day, chunk.end.day, chunk.end.hour) for chunk in chunks] == [(1, 3, 0), (3, 4, 12)]
+
+def test_empty_range_is_rejected():
+    with pytest.raises(ValueError):
+        split_range(END, START)
+
+def test_checkpoint_resumes_the_finished_chunks_of_the_same_backfill(tmp_path):
+    path = tmp_path / "backfill.json"
+    first, second = split_range(START, END, chunk_days=2)
+    checkpoint = BackfillCheckpoint(path, START, END, ["b", "a"])
+    checkpoint.mark_done(first, ChunkResult(events=3, rows=3, inserted=2))
+
+    resumed = BackfillCheckpoint(path, START, END, ["a", "b"])
+    assert resumed.is_done(first)
+    assert not resumed.is_done(second)
+    assert resumed.done[first.key] == {"events": 3, "rows": 3, "inserted": 2}
+
+def test_checkpoint_of_another_backfill_is_replaced(tmp_path):
+    path = tmp_path / "backfill.json"
+    first, _ = split_range(START, END, chunk_days=2)
+    BackfillCheckpoint(path, START, END, ["a"]).mark_done(first, ChunkResult())
+
+    assert not BackfillCheckpoint(path, START, END, ["a", "b"]).is_done(first)
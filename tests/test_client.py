@@ -0,0 +1,106 @@
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from pipeline import client
+from pipeline.client import SpotifyClient, TokenBucket, parse_retry_after
+
+class FakeClock:
+    """
+    Monotonic clock that only moves when the code under test sleeps.
+    """
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        # Like a real sleep, always advances the clock, even when rounding left a wait of a few ulps.
+        self.sleeps.append(seconds)
+        self.now += max(seconds, 1e-6)
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(client, "time", SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep,
+                                                        time=lambda: clock.now))
+    return clock
+
+def response(status, headers=None):
+    result = requests.Response()
+    result.status_code = status
+    result.headers.update(headers or {})
+    result._content, result._content_consumed = b"{}", True
+    return result
+
+def test_bucket_hands_out_its_burst_and_then_waits_for_the_refill(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+def test_bucket_pause_blocks_until_it_ends_and_drains_the_tokens(clock):
+    bucket = TokenBucket(rate=10.0, capacity=10)
+    bucket.pause(5.0)
+    bucket.acquire()
+
+    assert sum(clock.sleeps) == pytest.approx(5.1)
+
+def test_backoff_is_capped_full_jitter():
+    http = SpotifyClient(backoff_factor=0.5, backoff_max=4.0)
+    for attempt in range(8):
+        delays = [http.backoff(attempt) for _ in range(200)]
+        assert all(0 <= delay <= min(4.0, 0.5 * 2 ** attempt) for delay in delays)
+
+def test_retry_after_is_read_as_seconds_or_http_date():
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after(format_datetime(later, usegmt=True)) == pytest.approx(30, abs=2)
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+def test_throttled_request_waits_retry_after_and_pauses_the_bucket(clock, monkeypatch):
+    http = SpotifyClient(max_retries=3, rate_limit=100.0, burst=100)
+    responses = iter([response(429, {"Retry-After": "2"}), response(200)])
+    monkeypatch.setattr(http.session, "request", lambda method, url, **kwargs: next(responses))
+
+    assert http.get("https://api.test/me").status_code == 200
+    assert clock.sleeps[0] == 2.0
+    assert clock.now >= 1002.0
+
+def test_request_gives_up_after_max_retries(clock, monkeypatch):
+    http = SpotifyClient(max_retries=2, backoff_factor=0.1, backoff_max=1.0)
+    calls = []
+
+    def fail(method, url, **kwargs):
+        calls.append(url)
+        return response(503)
+
+    monkeypatch.setattr(http.session, "request", fail)
+
+    assert http.get("https://api.test/me").status_code == 503
+    assert len(calls) == 3
+
+def test_request_without_retry_is_sent_once(clock, monkeypatch):
+    http = SpotifyClient(max_retries=5)
+    calls = []
+
+    def fail(method, url, **kwargs):
+        calls.append(url)
+        raise requests.ConnectionError("refused")
+
+    monkeypatch.setattr(http.session, "request", fail)
+
+    with pytest.raises(requests.ConnectionError):
+        http.post("https://accounts.test/api/token", retry=False)
+    assert len(calls) == 1
@@ -0,0 +1,33 @@
+import time
+
+from pipeline.dedup import SeenEventIndex, frame_keys, play_key
+from pipeline.events import PlayEvent
+from pipeline.transform import transform_items
+
+def play(minute, track="track", played_at_ms=None, user="user"):
+    played_at_ms = played_at_ms if played_at_ms is not None else 1_750_000_000_000 + minute * 60_000 + 123
+    return PlayEvent(user, played_at_ms, track, "Song", 200_000, 50, "artist", "Artist")
+
+def test_raw_events_are_seen_once_their_transformed_rows_are_recorded(tmp_path):
+    index = SeenEventIndex(tmp_path / "state.sqlite")
+    loaded = [play(0), play(1)]
+    index.add(frame_keys(transform_items(loaded)))
+
+    # The rows keep `played_at` to the second, the raw events to the millisecond; both hash alike.
+    fresh = index.unseen([play(0), play(1), play(2)])
+    assert fresh == [play(2)]
+
+def test_repeats_within_a_batch_are_dropped_but_replays_are_kept(tmp_path):
+    index = SeenEventIndex(tmp_path / "state.sqlite")
+    events = [play(0), play(0), play(5), play(0, user="other")]
+
+    assert index.unseen(events) == [play(0), play(5), play(0, user="other")]
+
+def test_prune_drops_only_keys_older_than_the_retention(tmp_path):
+    index = SeenEventIndex(tmp_path / "state.sqlite")
+    now_ms = int(time.time() * 1000)
+    old, recent = play(0, played_at_ms=now_ms - 40 * 86_400_000), play(0, played_at_ms=now_ms - 86_400_000)
+    index.add([play_key(old), play_key(recent)])
+
+    assert index.prune(retention_days=30) == 1
+    assert index.unseen([old, recent]) == [old]
@@ -0,0 +1,57 @@
+import copy
+
+import pytest
+
+from pipeline.events import (MalformedEventError, PlayEvent, decode_item, decode_items, decode_line,
+                             encode_event)
+
+ITEM = {
+    "played_at": "2025-06-27T10:15:30.500Z",
+    "track": {
+        "id": "track-1", "name": "Song", "duration_ms": 201_999, "popularity": 42,
+        "artists": [{"id": "feat", "name": "Featured"}, {"id": "main", "name": "Main"}],
+        "album": {"artists": [{"id": "main", "name": "Main"}], "available_markets": ["PL"]},
+    },
+}
+
+def test_item_is_decoded_with_the_album_artist():
+    event = decode_item(ITEM, "user")
+
+    assert event == PlayEvent("user", 1_751_019_330_500, "track-1", "Song", 201_999, 42, "main", "Main",
+                              ("feat", "main"))
+
+def test_played_at_without_offset_is_taken_as_utc():
+    item = {**ITEM, "played_at": "2025-06-27T10:15:30.500"}
+
+    assert decode_item(item, "user").played_at_ms == 1_751_019_330_500
+
+@pytest.mark.parametrize("path, value", [
+    (("track", "id"), None),
+    (("track", "duration_ms"), "201999"),
+    (("track", "popularity"), True),
+    (("track", "album", "artists"), []),
+    (("played_at",), "yesterday"),
+])
+def test_malformed_items_are_rejected(path, value):
+    item = copy.deepcopy(ITEM)
+    target = item
+    for key in path[:-1]:
+        target = target[key]
+    target[path[-1]] = value
+
+    with pytest.raises(MalformedEventError):
+        decode_item(item, "user")
+
+def test_missing_track_is_rejected():
+    with pytest.raises(MalformedEventError):
+        decode_item({"played_at": ITEM["played_at"]}, "user")
+
+def test_plays_of_local_files_are_skipped():
+    local = {"played_at": ITEM["played_at"], "track": {"is_local": True, "id": None}}
+
+    assert decode_items([local, ITEM], "user") == [decode_item(ITEM, "user")]
+
+def test_encoded_event_decodes_to_the_same_event():
+    event = decode_item(ITEM, "user")
+
+    assert decode_line(encode_event(event)) == event
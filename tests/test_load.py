@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from pipeline import load
+from pipeline.events import PlayEvent
+from pipeline.staging import StagingWriter, read_staged_data
+from pipeline.transform import transform_items
+
+def staged(tmp_path, suffix):
+    events = [PlayEvent("user", 1_750_000_000_000 + minute * 60_000, f"track-{minute}", "Song", 201_999, 50,
+                        "artist", "Artist") for minute in range(3)]
+    path = tmp_path / f"staged{suffix}"
+    with StagingWriter(path) as writer:
+        writer.write(transform_items(events))
+    return read_staged_data(path)
+
+@pytest.mark.parametrize("first, second", [(".parquet", ".csv"), (".csv", ".parquet")])
+def test_sqlite_load_counts_each_play_once_for_both_staging_formats(tmp_path, first, second):
+    engine = create_engine(f"sqlite:///{tmp_path / 'playlog.sqlite'}")
+
+    assert load.write_playlog(staged(tmp_path, first), "playlog", engine) == 3
+    assert load.write_playlog(staged(tmp_path, second), "playlog", engine) == 0
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM playlog")).scalar() == 3
+        assert conn.execute(text("SELECT SUM(plays), SUM(duration_ms) FROM rollup_track_daily")).one() == (3, 605_997)
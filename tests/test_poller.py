@@ -0,0 +1,17 @@
+import pytest
+
+from pipeline.poller import next_interval
+
+BOUNDS = {"min_interval": 60, "max_interval": 1200, "backoff": 2, "target_plays": 25}
+
+def test_idle_users_back_off_up_to_the_maximum():
+    assert next_interval(300, 0, 300, **BOUNDS) == 600
+    assert next_interval(900, 0, 900, **BOUNDS) == 1200
+
+def test_active_users_are_polled_sooner_down_to_the_minimum():
+    assert next_interval(600, 2, 600, **BOUNDS) == 300
+    assert next_interval(90, 2, 90, **BOUNDS) == 60
+
+def test_fast_listeners_are_polled_often_enough_to_keep_up():
+    # 40 plays in 400 s is one play every 10 s; 25 plays take 250 s.
+    assert next_interval(1200, 40, 400, **BOUNDS) == pytest.approx(250)
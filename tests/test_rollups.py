@@ -0,0 +1,46 @@
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import create_engine, select
+
+from pipeline import rollups
+
+def plays(user, *rows):
+    return pd.DataFrame([{"user_id": user, "artist_name": "Artist", "artist_id": "artist", "song_name": f"Song {track}",
+                          "track_id": track, "duration_ms": duration_ms, "played_at": played_at}
+                         for track, duration_ms, played_at in rows])
+
+def track_rollup(engine):
+    table = rollups.rollup_track_daily
+    with engine.connect() as conn:
+        rows = conn.execute(select(table.c.user_id, table.c.day, table.c.track_id, table.c.plays, table.c.duration_ms)
+                            .order_by(table.c.user_id, table.c.day, table.c.track_id))
+        return [tuple(row) for row in rows]
+
+def test_batches_add_up_to_the_rollups_of_a_rebuild(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'rollups.sqlite'}")
+    batches = [plays("user", ("a", 200_500, "2026-01-01 10:00:00"), ("b", None, "2026-01-01 11:00:00")),
+               plays("user", ("a", 200_500, "2026-01-01 12:00:00"), ("a", 199_999, "2026-01-02 09:00:00"))]
+    for batch in batches:
+        with engine.begin() as conn:
+            rollups.add_plays(conn, batch)
+
+    expected = [("user", date(2026, 1, 1), "a", 2, 401_000), ("user", date(2026, 1, 1), "b", 1, 0),
+                ("user", date(2026, 1, 2), "a", 1, 199_999)]
+    assert track_rollup(engine) == expected
+
+    with engine.begin() as conn:
+        pd.concat(batches).to_sql("playlog", conn, index=False)
+    assert rollups.rebuild_rollups(engine, "playlog") == 4
+    assert track_rollup(engine) == expected
+
+def test_delete_days_removes_only_the_given_users_and_days(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'rollups.sqlite'}")
+    with engine.begin() as conn:
+        rollups.add_plays(conn, plays("user", ("a", 1_000, "2026-01-01 10:00:00"), ("a", 1_000, "2026-01-02 10:00:00")))
+        rollups.add_plays(conn, plays("other", ("a", 1_000, "2026-01-01 10:00:00")))
+
+    with engine.begin() as conn:
+        rollups.delete_days(conn, ["user"], date(2026, 1, 1), date(2026, 1, 2))
+
+    assert track_rollup(engine) == [("other", date(2026, 1, 1), "a", 1, 1_000), ("user", date(2026, 1, 2), "a", 1, 1_000)]
@@ -0,0 +1,10 @@
+from pipeline.staging import StagingWriter, is_staged_empty, read_staged_data
+
+def test_empty_partitioned_run_is_staged_as_empty(tmp_path):
+    path = tmp_path / "staged"
+    with StagingWriter(path, partition_by_day=True):
+        pass
+
+    assert path.is_dir()
+    assert is_staged_empty(path)
+    assert read_staged_data(path).empty
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, select
+
+from pipeline import rollups, star
+
+def plays(*rows):
+    return pd.DataFrame([{"user_id": "user", "artist_name": f"Artist {artist}", "artist_id": artist,
+                          "song_name": f"Song {track}", "track_id": track, "duration_ms": 180_000,
+                          "popularity": 50, "played_at": played_at} for track, artist, played_at in rows])
+
+def stored_plays(engine):
+    query = (select(star.dim_track.c.track_id, star.fact_play.c.played_at)
+             .select_from(star.fact_play.join(star.dim_track, star.fact_play.c.track_key == star.dim_track.c.track_key))
+             .order_by(star.fact_play.c.played_at))
+    with engine.connect() as conn:
+        return [tuple(row) for row in conn.execute(query)]
+
+def test_rolled_back_load_does_not_cache_dimension_keys(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'star.sqlite'}")
+    first, second = datetime(2026, 1, 1, 10), datetime(2026, 1, 1, 11)
+
+    def fail(conn, df):
+        raise RuntimeError("load failed")
+
+    monkeypatch.setattr(rollups, "add_plays", fail)
+    with pytest.raises(RuntimeError):
+        star.load_star_schema(plays(("track-a", "artist-a", first)), engine)
+    assert stored_plays(engine) == []
+
+    # After the rollback the keys handed out to track-a are free again and go to track-b;
+    # a cache that kept them would attribute the retried play of track-a to track-b.
+    monkeypatch.undo()
+    inserted = star.load_star_schema(plays(("track-b", "artist-b", first), ("track-a", "artist-a", second)), engine)
+
+    assert inserted == 2
+    assert stored_plays(engine) == [("track-b", first), ("track-a", second)]
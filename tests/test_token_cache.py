@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+
+from authentication.cache import AccessToken, TokenCache
+
+def issuer(calls, delay=0.0):
+    def refresh(refresh_token):
+        calls.append(refresh_token)
+        time.sleep(delay)
+        return AccessToken(f"access-{len(calls)}", "rotated", time.time() + 3600)
+    return refresh
+
+@pytest.fixture
+def token_path(tmp_path):
+    path = tmp_path / "refresh_token.json"
+    path.write_text("{}")
+    return path
+
+def test_valid_token_is_reused_until_close_to_expiry(tmp_path, token_path):
+    cache = TokenCache(tmp_path / "tokens.sqlite", refresh_margin=300)
+    calls = []
+
+    assert cache.get_access_token("user", issuer(calls), token_path, lambda path: "from-file") == "access-1"
+    assert cache.get_access_token("user", issuer(calls), token_path, lambda path: "from-file") == "access-1"
+    assert calls == ["from-file"]
+
+    cache.store("user", AccessToken("expiring", "rotated", time.time() + 60))
+    assert cache.get_access_token("user", issuer(calls), token_path, lambda path: "from-file") == "access-2"
+    assert calls == ["from-file", "rotated"]
+
+def test_concurrent_workers_refresh_a_user_once(tmp_path, token_path):
+    cache = TokenCache(tmp_path / "tokens.sqlite", poll_interval=0.01)
+    calls, tokens = [], []
+    refresh = issuer(calls, delay=0.2)
+
+    def work():
+        tokens.append(cache.get_access_token("user", refresh, token_path, lambda path: "from-file"))
+
+    workers = [threading.Thread(target=work) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(calls) == 1
+    assert tokens == ["access-1"] * 4
+
+def test_failed_refresh_releases_the_lease(tmp_path, token_path):
+    cache = TokenCache(tmp_path / "tokens.sqlite", lease_seconds=60, poll_interval=0.01)
+
+    def fail(refresh_token):
+        raise RuntimeError("accounts service down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_access_token("user", fail, token_path, lambda path: "from-file")
+
+    calls = []
+    started = time.monotonic()
+    assert cache.get_access_token("user", issuer(calls), token_path, lambda path: "from-file") == "access-1"
+    assert time.monotonic() - started < 1
+
+def test_expired_lease_of_a_dead_worker_is_taken_over(tmp_path, token_path):
+    cache = TokenCache(tmp_path / "tokens.sqlite", lease_seconds=0.2, poll_interval=0.01)
+    with cache._transaction() as conn:
+        conn.execute("INSERT INTO tokens (user_id, lease_until) VALUES ('user', ?)", (time.time() + 0.2,))
+
+    calls = []
+    assert cache.get_access_token("user", issuer(calls), token_path, lambda path: "from-file") == "access-1"
+    assert calls == ["from-file"]